@@ -9,16 +9,21 @@ UC-OP-02: Store Performance Anomaly Detection -- ETL Pipeline Orchestrator
   Step 3:  opproduction     -> extract production metrics
   Step 4:  opempefficiency  -> extract staffing metrics
   Step 5:  opqualitycontrol -> extract quality metrics
-  Step 6:  Write all KPIs to test.store_kpi_daily
+           (steps 2-5 run concurrently; results are merged per store/day
+            and bulk-upserted into test.store_kpi_daily)
+  Step 6:  Compute derived per-labor-hour metrics
   Step 7:  Compute 28-day rolling stats + Z-scores
   Step 8:  Evaluate Western Electric rules
+           (--spc-engine python: steps 7-8 run in-process with pandas,
+            see spc_engine.py)
   Step 9:  Compute health scores
   Step 10: Generate alerts
   Step 11: Log pipeline execution
   Step 12: Verify row counts and data freshness
 
-Schedule: Daily at 07:00 EST (after UC-SC-01's 06:00 EST run)
-Dependencies: PyMySQL, python-dotenv
+Schedule: Daily at 07:00 EST (after UC-SC-01's 06:00 EST run);
+          --intraday hourly at :05
+Dependencies: PyMySQL, python-dotenv (numpy, pandas for --spc-engine python)
 
 Usage:
   # Daily run (yesterday's data)
@@ -27,22 +32,50 @@ Usage:
   # Specific date
   python run_pipeline.py --date 2026-02-14
 
-  # Backfill a date range
+  # Backfill / replay a date range (one extraction, one vectorized scoring pass)
   python run_pipeline.py --backfill-from 2026-01-01 --backfill-to 2026-02-14
 
+  # Backfill by running the full pipeline once per day (old behaviour)
+  python run_pipeline.py --backfill-from 2026-01-01 --backfill-to 2026-02-14 --backfill-per-day
+
+  # Ignore extraction watermarks and re-extract LOOKBACK_DAYS
+  python run_pipeline.py --full-refresh
+
+  # Check that source queries range-scan (shop_dept_id, time) indexes
+  python run_pipeline.py --explain
+
+  # Z-scores + WE rules in-process (pandas) instead of SQL self-joins
+  python run_pipeline.py --spc-engine python
+
+  # Add peer-group (area type + store age) median/MAD scores
+  python run_pipeline.py --peer-scores
+
+  # Compare the pandas engine against the SQL results already stored for a date
+  python run_pipeline.py --spc-parity --date 2026-02-14
+
+  # Intraday: hourly KPIs scored vs. same hour / same weekday (run hourly)
+  python run_pipeline.py --intraday
+  python run_pipeline.py --intraday --backfill-from 2026-01-01 --backfill-to 2026-02-14  # seed
+
 Author:  Data Engineering / BI Team
 Created: 2026-02-15
 """
 
 import os
 import sys
+import csv
+import json
 import uuid
 import argparse
 import logging
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 
+import spc_engine
+
 try:
     import pymysql
     import pymysql.cursors
@@ -75,8 +108,10 @@ log = logging.getLogger('uc-op-02')
 # CONSTANTS
 # ---------------------------------------------------------------------------
 
-# Active store IDs (dept_id from t_shop_info)
-ACTIVE_STORES = {
+# Fallback store list (dept_id from t_shop_info). The live list comes from
+# the store registry (load_store_registry); this is only used when opshop
+# and the registry cache are both unavailable.
+FALLBACK_STORES = {
     1131:  ('US00000', 'NJ Test Kitchen'),
     1127:  ('US00001', '8th & Broadway'),
     1128:  ('US00002', '28th & 6th'),
@@ -88,14 +123,19 @@ ACTIVE_STORES = {
     20008: ('US00008', '33rd & 10th'),
     20046: ('US99998', 'Shanghai Test Kitchen'),
 }
-STORE_IDS = tuple(ACTIVE_STORES.keys())
+STORE_CODE_PREFIX = os.getenv('STORE_CODE_PREFIX', 'US')       # t_shop_info.dept_code LIKE 'US%'
+STORE_REGISTRY_CACHE = os.getenv(
+    'STORE_REGISTRY_CACHE', os.path.join(tempfile.gettempdir(), 'uc-op-02-store-registry.json'))
+STORE_REGISTRY_TTL = int(os.getenv('STORE_REGISTRY_TTL', '3600'))  # seconds before re-reading opshop
+STORE_EXCLUDE_IDS = {int(s) for s in os.getenv('STORE_EXCLUDE_IDS', '').split(',') if s.strip()}
+STORE_ID_TABLE = 'tmp_store_ids'   # session TEMPORARY table of store ids joined by source queries
 
 # SPC Constants
 ROLLING_WINDOW = 28   # days for rolling statistics
 DOW_WEEKS = 8         # weeks for day-of-week comparison
 SIGMA_WARNING = 2     # sigma threshold for WARNING
 SIGMA_CRITICAL = 3    # sigma threshold for CRITICAL
-HEALTH_WEIGHTS = {
+HEALTH_WEIGHTS = {     # defaults; test.store_health_weights overrides per dimension
     'revenue':  0.40,
     'ops':      0.20,
     'quality':  0.15,
@@ -103,6 +143,21 @@ HEALTH_WEIGHTS = {
     'customer': 0.10,
 }
 LOOKBACK_DAYS = int(os.getenv('LOOKBACK_DAYS', '3'))
+LATE_ARRIVAL_HOURS = int(os.getenv('LATE_ARRIVAL_HOURS', '6'))  # re-read window behind each source watermark
+SPC_ENGINE = os.getenv('SPC_ENGINE', 'sql')   # 'sql' (steps 7-8 in MySQL) or 'python' (pandas)
+PEER_SCORES = os.getenv('PEER_SCORES', '0') == '1'   # cross-sectional peer-group scoring
+PEER_MIN_GROUP = int(os.getenv('PEER_MIN_GROUP', '3'))  # min stores in a peer group for a baseline
+PEER_AGE_BUCKETS = ((ROLLING_WINDOW, 'new'), (180, 'ramping'))  # days open -> bucket, else 'mature'
+STORE_AREA_TYPES_CSV = os.getenv('STORE_AREA_TYPES_CSV', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..',
+    'site-selection-platform', 'data', 'active_stores_performance.csv'))
+SPC_METRICS = [
+    'revenue', 'order_count', 'aov',
+    'production_count', 'avg_production_time_sec',
+    'scheduled_hours', 'employee_count',
+    'inspection_count', 'avg_quality_score',
+    'revenue_per_labor_hour', 'orders_per_labor_hour',
+]
 
 
 # ---------------------------------------------------------------------------
@@ -187,61 +242,232 @@ def log_step(conn, run_id: str, step_num: int, step_name: str,
 
 
 # ---------------------------------------------------------------------------
-# STEP 1: STORE MASTER DATA
+# STORE REGISTRY
 # ---------------------------------------------------------------------------
-
-def step_01_store_master(run_id: str, run_date: str) -> dict:
-    """Extract store list from opshop.t_shop_info.
-
-    Returns dict keyed by dept_id -> {store_code, store_name, ...}.
-    """
-    t0 = time.time()
-    log.info("STEP 1: Extracting store master data ...")
-    stores = {}
+# Stores come from opshop.t_shop_info, cached as JSON for STORE_REGISTRY_TTL
+# seconds. Lifecycle (relative to the run date):
+#   PRE_OPEN  set_up_time after the run date      -> not extracted
+#   NEW       open < ROLLING_WINDOW days           -> extracted, thin baseline
+#   ACTIVE    open >= ROLLING_WINDOW days          -> extracted
+#   CLOSED    t_shop_info.status != 1              -> not extracted
+#             (status 0: from update_time, the closing date; open before it)
+# Stores in STORE_EXCLUDE_IDS are never extracted. Range runs extract the
+# stores that were NEW or ACTIVE on any day of the range (stores_active_between).
+STORE_LIFECYCLE_EXTRACTED = ('NEW', 'ACTIVE')
+
+_store_registry = None   # {dept_id -> store dict}, loaded once per process
+
+
+def _fetch_store_registry() -> dict:
+    """Read every STORE_CODE_PREFIX store from opshop.t_shop_info."""
     conn = None
     try:
         conn = get_connection('opshop')
-        placeholders = ','.join(['%s'] * len(STORE_IDS))
-        sql = f"""
-            SELECT dept_id, dept_code, dept_name, address, status
-            FROM t_shop_info
-            WHERE dept_id IN ({placeholders})
-        """
         with conn.cursor() as cur:
-            cur.execute(sql, STORE_IDS)
+            cur.execute("""
+                SELECT dept_id, dept_code, dept_name, address, status, set_up_time, update_time
+                FROM t_shop_info
+                WHERE dept_code LIKE %s
+            """, (STORE_CODE_PREFIX + '%',))
             rows = cur.fetchall()
-
-        for row in rows:
-            dept_id, dept_code, dept_name, address, status = row
-            stores[dept_id] = {
-                'dept_code': dept_code,
-                'dept_name': dept_name,
-                'address': address,
-                'status': status,
-            }
-        log.info("  -> Extracted %d stores from opshop", len(stores))
-
     finally:
         if conn:
             conn.close()
 
-    # Fallback: fill from ACTIVE_STORES dict for any missing
-    for dept_id, (code, name) in ACTIVE_STORES.items():
-        if dept_id not in stores:
-            stores[dept_id] = {
-                'dept_code': code,
-                'dept_name': name,
-                'address': None,
-                'status': 1,
+    return {
+        int(dept_id): {
+            'store_code': dept_code,
+            'store_name': dept_name,
+            'address': address,
+            'status': status,
+            'opened': set_up_time.date().isoformat() if set_up_time else None,
+            # status 0 (closed): the last update is taken as the closing date
+            'closed': update_time.date().isoformat() if status == 0 and update_time else None,
+        }
+        for dept_id, dept_code, dept_name, address, status, set_up_time, update_time in rows
+    }
+
+
+def load_store_registry(refresh: bool = False) -> dict:
+    """Return {dept_id -> store} from cache, opshop, or FALLBACK_STORES.
+
+    The JSON cache is used while younger than STORE_REGISTRY_TTL (unless
+    refresh). If opshop cannot be read, a stale cache is preferred over
+    the hard-coded fallback list.
+    """
+    global _store_registry
+    if _store_registry is not None and not refresh:
+        return _store_registry
+
+    cached, age = None, None
+    try:
+        with open(STORE_REGISTRY_CACHE) as fh:
+            payload = json.load(fh)
+        cached = {int(k): v for k, v in payload['stores'].items()}
+        age = time.time() - payload['loaded_at']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if cached and not refresh and age < STORE_REGISTRY_TTL:
+        log.debug("Store registry: %d stores from cache (%.0fs old)", len(cached), age)
+        _store_registry = cached
+        return cached
+
+    try:
+        stores = _fetch_store_registry()
+        try:
+            with open(STORE_REGISTRY_CACHE, 'w') as fh:
+                json.dump({'loaded_at': time.time(), 'stores': stores}, fh)
+        except OSError as exc:
+            log.warning("Could not write store registry cache %s: %s", STORE_REGISTRY_CACHE, exc)
+    except Exception as exc:
+        if cached:
+            log.warning("Store registry refresh failed (%s); using cache (%.0fs old)", exc, age)
+            stores = cached
+        else:
+            log.warning("Store registry refresh failed (%s); using FALLBACK_STORES", exc)
+            stores = {
+                dept_id: {'store_code': code, 'store_name': name, 'address': None,
+                          'status': 1, 'opened': None}
+                for dept_id, (code, name) in FALLBACK_STORES.items()
             }
 
-    duration = time.time() - t0
-    # Log step to dbatest
+    _store_registry = stores
+    return stores
+
+
+def store_lifecycle(store: dict, as_of) -> str:
+    """PRE_OPEN / NEW / ACTIVE / CLOSED for a registry entry on date as_of."""
+    as_of = date.fromisoformat(as_of) if isinstance(as_of, str) else as_of
+    if store.get('status') != 1:
+        closed = store.get('closed')
+        if not closed or as_of >= date.fromisoformat(closed):
+            return 'CLOSED'
+    if not store.get('opened'):
+        return 'ACTIVE'
+    age_days = (as_of - date.fromisoformat(store['opened'])).days
+    if age_days < 0:
+        return 'PRE_OPEN'
+    return 'NEW' if age_days < ROLLING_WINDOW else 'ACTIVE'
+
+
+def active_stores(as_of) -> dict:
+    """{dept_id -> (store_code, store_name)} for stores extracted on as_of."""
+    return {
+        dept_id: (s['store_code'], s['store_name'])
+        for dept_id, s in sorted(load_store_registry().items())
+        if store_lifecycle(s, as_of) in STORE_LIFECYCLE_EXTRACTED
+        and dept_id not in STORE_EXCLUDE_IDS
+    }
+
+
+def stores_active_between(start, end) -> dict:
+    """active_stores() for every day in [start, end], merged.
+
+    Range runs use this so a store that opened or closed part-way through
+    the range is still extracted for the days it was open.
+    """
+    start = date.fromisoformat(start) if isinstance(start, str) else start
+    end = date.fromisoformat(end) if isinstance(end, str) else end
+    stores = {}
+    day = start
+    while day <= end:
+        stores.update(active_stores(day))
+        day += timedelta(days=1)
+    return dict(sorted(stores.items()))
+
+
+def store_label(store_id: int) -> tuple:
+    """(store_code, store_name) for any registry store."""
+    s = load_store_registry().get(store_id)
+    return (s['store_code'], s['store_name']) if s else ('UNKNOWN', 'Unknown Store')
+
+
+def load_store_id_table(conn, store_ids) -> None:
+    """(Re)create the session TEMPORARY table STORE_ID_TABLE with store_ids.
+
+    Source queries join to it instead of an IN (...) list, so the SQL text
+    and plan stay the same as the store count grows.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {STORE_ID_TABLE}")
+        cur.execute(f"""
+            CREATE TEMPORARY TABLE {STORE_ID_TABLE} (
+                dept_id BIGINT NOT NULL PRIMARY KEY
+            ) ENGINE=MEMORY
+        """)
+        if store_ids:
+            cur.executemany(f"INSERT INTO {STORE_ID_TABLE} (dept_id) VALUES (%s)",
+                            [(int(s),) for s in store_ids])
+
+
+# ---------------------------------------------------------------------------
+# STEP 1: STORE MASTER DATA
+# ---------------------------------------------------------------------------
+
+# test.dim_store is shared with UC-SC-01, which joins it for store names in
+# forecast_accuracy_daily. NULL attributes never overwrite known ones.
+UPSERT_STORE_DIMENSION = """
+    INSERT INTO test.dim_store
+        (store_id, store_code, store_name, address, status, opened_date, area_type)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        store_code  = COALESCE(VALUES(store_code), store_code),
+        store_name  = VALUES(store_name),
+        address     = COALESCE(VALUES(address), address),
+        status      = VALUES(status),
+        opened_date = COALESCE(VALUES(opened_date), opened_date),
+        area_type   = COALESCE(VALUES(area_type), area_type)
+"""
+
+
+def sync_store_dimension(conn) -> int:
+    """Upsert the store registry into test.dim_store.
+
+    area_type comes from STORE_AREA_TYPES_CSV. Unchanged stores are not
+    rewritten. Returns MySQL's affected-row count (1 per new store, 2 per
+    changed store, 0 when nothing changed).
+    """
+    area_types = load_store_area_types()
+    rows = []
+    for store_id, s in sorted(load_store_registry().items()):
+        area_type, csv_opened = area_types.get(s['store_code'], (None, None))
+        rows.append((store_id, s['store_code'], s['store_name'], s.get('address'),
+                     s['status'], s.get('opened') or csv_opened, area_type))
+    with conn.cursor() as cur:
+        cur.executemany(UPSERT_STORE_DIMENSION, rows)
+        changed = cur.rowcount
+    conn.commit()
+    return changed
+
+
+def step_01_store_master(run_id: str, run_date: str) -> dict:
+    """Load the store registry from opshop.t_shop_info (or its cache)
+    and sync it into the shared test.dim_store.
+
+    Returns {dept_id -> (store_code, store_name)} for the stores extracted
+    on run_date (lifecycle NEW or ACTIVE).
+    """
+    t0 = time.time()
+    log.info("STEP 1: Loading store registry ...")
+    registry = load_store_registry()
+    lifecycle_counts = {}
+    for store in registry.values():
+        status = store_lifecycle(store, run_date)
+        lifecycle_counts[status] = lifecycle_counts.get(status, 0) + 1
+    stores = active_stores(run_date)
+    lifecycle = ', '.join(f'{k}={v}' for k, v in sorted(lifecycle_counts.items()))
+    log.info("  -> %d registry stores (%s); %d extracted", len(registry), lifecycle, len(stores))
+
     db = None
     try:
         db = get_connection('dbatest')
+        changed = sync_store_dimension(db)
+        log.info("  -> test.dim_store synced (%d rows affected)", changed)
+        duration = time.time() - t0
         log_step(db, run_id, 1, 'store_master',
-                 f'Extracted {len(stores)} stores from opshop',
+                 f'Store registry: {len(registry)} stores ({lifecycle}), {len(stores)} extracted, '
+                 f'dim_store {changed} rows affected',
                  'SUCCESS', rows=len(stores), duration=duration)
     finally:
         if db:
@@ -252,323 +478,486 @@ def step_01_store_master(run_id: str, run_date: str) -> dict:
 
 
 # ---------------------------------------------------------------------------
-# STEP 2: REVENUE KPIs
+# STEPS 2-5: SOURCE KPI EXTRACTION (concurrent, one connection per source)
 # ---------------------------------------------------------------------------
 
-def step_02_revenue_kpis(run_id: str, run_date: str) -> int:
-    """Extract daily revenue, order_count, AOV from salesorder.t_order.
+def _extract_rows(server_name: str, sql: str, params: list, store_ids) -> list:
+    """Run one aggregation query on a source server and return all rows.
 
-    Writes INTO test.store_kpi_daily (INSERT ... ON DUPLICATE KEY UPDATE).
-    Returns number of rows upserted.
+    store_ids are loaded into STORE_ID_TABLE on the same session first.
     """
-    t0 = time.time()
-    log.info("STEP 2: Extracting revenue KPIs from salesorder ...")
-    placeholders = ','.join(['%s'] * len(STORE_IDS))
-    start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
+    conn = None
+    try:
+        conn = get_connection(server_name)
+        load_store_id_table(conn, store_ids)
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return list(cur.fetchall())
+    finally:
+        if conn:
+            conn.close()
+
 
-    # -- Extract from salesorder --
-    extract_sql = f"""
+def day_range(start_date: str, end_date: str) -> tuple:
+    """Half-open [start_date 00:00:00, end_date + 1 day 00:00:00) bounds.
+
+    Comparing the raw timestamp column against these (instead of
+    DATE(col) >= ... AND DATE(col) <= ...) keeps the predicate sargable,
+    so MySQL can range-scan an index on (shop_dept_id, <time column>).
+    """
+    end_exclusive = date.fromisoformat(end_date) + timedelta(days=1)
+    return f"{start_date} 00:00:00", f"{end_exclusive.isoformat()} 00:00:00"
+
+
+def revenue_kpi_query(start_date: str, end_date: str) -> tuple:
+    """Daily revenue, order_count, AOV from salesorder.t_order.
+
+    Rows: (kpi_date, store_id, revenue, order_count, aov, max_ts)
+    """
+    sql = f"""
         SELECT
             DATE(create_time)                         AS kpi_date,
             shop_dept_id                              AS store_id,
             ROUND(SUM(total_price), 2)                AS revenue,
             COUNT(DISTINCT order_id)                  AS order_count,
             ROUND(SUM(total_price) / NULLIF(COUNT(DISTINCT order_id), 0), 2)
-                                                      AS aov
-        FROM t_order
-        WHERE DATE(create_time) >= %s
-          AND DATE(create_time) <= %s
-          AND shop_dept_id IN ({placeholders})
+                                                      AS aov,
+            MAX(create_time)                          AS max_ts
+        FROM t_order o
+        INNER JOIN {STORE_ID_TABLE} ts ON ts.dept_id = o.shop_dept_id
+        WHERE create_time >= %s
+          AND create_time <  %s
           AND order_status NOT IN (5, 6)
         GROUP BY DATE(create_time), shop_dept_id
         ORDER BY kpi_date, store_id
     """
-    params = [start_date, run_date] + list(STORE_IDS)
+    return sql, list(day_range(start_date, end_date))
 
-    conn_src = None
-    data = []
-    try:
-        conn_src = get_connection('salesorder')
-        with conn_src.cursor() as cur:
-            cur.execute(extract_sql, params)
-            data = cur.fetchall()
-        log.info("  -> Extracted %d revenue rows", len(data))
-    finally:
-        if conn_src:
-            conn_src.close()
-
-    if not data:
-        log.warning("  No revenue data found for %s to %s", start_date, run_date)
-
-    # -- Load into dbatest --
-    upsert_sql = """
-        INSERT INTO test.store_kpi_daily (
-            kpi_date, store_id, store_code, store_name,
-            revenue, order_count, aov
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            revenue     = VALUES(revenue),
-            order_count = VALUES(order_count),
-            aov         = VALUES(aov),
-            updated_at  = NOW()
-    """
-    rows_upserted = 0
-    conn_dst = None
-    try:
-        conn_dst = get_connection('dbatest')
-        with conn_dst.cursor() as cur:
-            for row in data:
-                kpi_date, store_id, revenue, order_count, aov = row
-                info = ACTIVE_STORES.get(store_id, ('UNKNOWN', 'Unknown Store'))
-                cur.execute(upsert_sql, (
-                    kpi_date, store_id, info[0], info[1],
-                    revenue, order_count, aov,
-                ))
-                rows_upserted += 1
-        conn_dst.commit()
-        log.info("  -> Upserted %d rows into store_kpi_daily", rows_upserted)
 
-        duration = time.time() - t0
-        log_step(conn_dst, run_id, 2, 'revenue_kpis',
-                 f'Extracted {len(data)} revenue rows, upserted {rows_upserted}',
-                 'SUCCESS', rows=rows_upserted, duration=duration)
-    finally:
-        if conn_dst:
-            conn_dst.close()
-
-    log.info("  Step 2 complete (%.1fs)", time.time() - t0)
-    return rows_upserted
-
-
-# ---------------------------------------------------------------------------
-# STEP 3: PRODUCTION KPIs
-# ---------------------------------------------------------------------------
+def production_kpi_query(start_date: str, end_date: str) -> tuple:
+    """Daily production_count, avg_production_time_sec from
+    opproduction.t_production.
 
-def step_03_production_kpis(run_id: str, run_date: str) -> int:
-    """Extract production_count, avg_production_time_sec from
-    opproduction.t_production. UPDATE test.store_kpi_daily.
+    Rows: (kpi_date, store_id, production_count, avg_production_time_sec, max_ts)
     """
-    t0 = time.time()
-    log.info("STEP 3: Extracting production KPIs from opproduction ...")
-    placeholders = ','.join(['%s'] * len(STORE_IDS))
-    start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
-
-    extract_sql = f"""
+    sql = f"""
         SELECT
             DATE(create_time)               AS kpi_date,
             shop_dept_id                    AS store_id,
             COUNT(*)                        AS production_count,
             ROUND(AVG(
                 TIMESTAMPDIFF(SECOND, create_time, complete_time)
-            ), 1)                           AS avg_production_time_sec
-        FROM t_production
-        WHERE DATE(create_time) >= %s
-          AND DATE(create_time) <= %s
-          AND shop_dept_id IN ({placeholders})
+            ), 1)                           AS avg_production_time_sec,
+            MAX(create_time)                AS max_ts
+        FROM t_production p
+        INNER JOIN {STORE_ID_TABLE} ts ON ts.dept_id = p.shop_dept_id
+        WHERE create_time >= %s
+          AND create_time <  %s
           AND complete_time IS NOT NULL
         GROUP BY DATE(create_time), shop_dept_id
         ORDER BY kpi_date, store_id
     """
-    params = [start_date, run_date] + list(STORE_IDS)
+    return sql, list(day_range(start_date, end_date))
 
-    conn_src = None
-    data = []
-    try:
-        conn_src = get_connection('production')
-        with conn_src.cursor() as cur:
-            cur.execute(extract_sql, params)
-            data = cur.fetchall()
-        log.info("  -> Extracted %d production rows", len(data))
-    finally:
-        if conn_src:
-            conn_src.close()
 
-    update_sql = """
-        UPDATE test.store_kpi_daily
-        SET production_count         = %s,
-            avg_production_time_sec  = %s,
-            updated_at               = NOW()
-        WHERE kpi_date = %s AND store_id = %s
-    """
-    rows_updated = 0
-    conn_dst = None
-    try:
-        conn_dst = get_connection('dbatest')
-        with conn_dst.cursor() as cur:
-            for row in data:
-                kpi_date, store_id, prod_count, avg_time = row
-                cur.execute(update_sql, (prod_count, avg_time, kpi_date, store_id))
-                rows_updated += cur.rowcount
-        conn_dst.commit()
-        log.info("  -> Updated %d rows in store_kpi_daily", rows_updated)
+def staffing_kpi_query(start_date: str, end_date: str) -> tuple:
+    """Daily scheduled_hours, employee_count from
+    opempefficiency.t_emp_scheduling.
 
-        duration = time.time() - t0
-        log_step(conn_dst, run_id, 3, 'production_kpis',
-                 f'Extracted {len(data)} production rows, updated {rows_updated}',
-                 'SUCCESS', rows=rows_updated, duration=duration)
-    finally:
-        if conn_dst:
-            conn_dst.close()
-
-    log.info("  Step 3 complete (%.1fs)", time.time() - t0)
-    return rows_updated
-
-
-# ---------------------------------------------------------------------------
-# STEP 4: STAFFING KPIs
-# ---------------------------------------------------------------------------
-
-def step_04_staffing_kpis(run_id: str, run_date: str) -> int:
-    """Extract scheduled_hours, employee_count from
-    opempefficiency.t_emp_scheduling. UPDATE test.store_kpi_daily.
+    Rows: (kpi_date, store_id, scheduled_hours, employee_count, max_ts)
     """
-    t0 = time.time()
-    log.info("STEP 4: Extracting staffing KPIs from opempefficiency ...")
-    placeholders = ','.join(['%s'] * len(STORE_IDS))
-    start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
-
-    extract_sql = f"""
+    end_exclusive = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()
+    sql = f"""
         SELECT
             schedule_date                           AS kpi_date,
             shop_dept_id                            AS store_id,
             ROUND(SUM(
                 TIMESTAMPDIFF(MINUTE, start_time, end_time) / 60.0
             ), 2)                                   AS scheduled_hours,
-            COUNT(DISTINCT employee_id)             AS employee_count
-        FROM t_emp_scheduling
+            COUNT(DISTINCT employee_id)             AS employee_count,
+            MAX(schedule_date)                      AS max_ts
+        FROM t_emp_scheduling es
+        INNER JOIN {STORE_ID_TABLE} ts ON ts.dept_id = es.shop_dept_id
         WHERE schedule_date >= %s
-          AND schedule_date <= %s
-          AND shop_dept_id IN ({placeholders})
+          AND schedule_date <  %s
         GROUP BY schedule_date, shop_dept_id
         ORDER BY kpi_date, store_id
     """
-    params = [start_date, run_date] + list(STORE_IDS)
+    return sql, [start_date, end_exclusive]
 
-    conn_src = None
-    data = []
-    try:
-        conn_src = get_connection('empeff')
-        with conn_src.cursor() as cur:
-            cur.execute(extract_sql, params)
-            data = cur.fetchall()
-        log.info("  -> Extracted %d staffing rows", len(data))
-    finally:
-        if conn_src:
-            conn_src.close()
 
-    update_sql = """
-        UPDATE test.store_kpi_daily
-        SET scheduled_hours   = %s,
-            employee_count    = %s,
-            updated_at        = NOW()
-        WHERE kpi_date = %s AND store_id = %s
-    """
-    rows_updated = 0
-    conn_dst = None
-    try:
-        conn_dst = get_connection('dbatest')
-        with conn_dst.cursor() as cur:
-            for row in data:
-                kpi_date, store_id, sched_hours, emp_count = row
-                cur.execute(update_sql, (sched_hours, emp_count, kpi_date, store_id))
-                rows_updated += cur.rowcount
-        conn_dst.commit()
-        log.info("  -> Updated %d rows in store_kpi_daily", rows_updated)
+def quality_kpi_query(start_date: str, end_date: str) -> tuple:
+    """Daily inspection_count, avg_quality_score from
+    opqualitycontrol.t_shopcheck_report.
 
-        duration = time.time() - t0
-        log_step(conn_dst, run_id, 4, 'staffing_kpis',
-                 f'Extracted {len(data)} staffing rows, updated {rows_updated}',
-                 'SUCCESS', rows=rows_updated, duration=duration)
-    finally:
-        if conn_dst:
-            conn_dst.close()
-
-    log.info("  Step 4 complete (%.1fs)", time.time() - t0)
-    return rows_updated
-
-
-# ---------------------------------------------------------------------------
-# STEP 5: QUALITY KPIs
-# ---------------------------------------------------------------------------
-
-def step_05_quality_kpis(run_id: str, run_date: str) -> int:
-    """Extract inspection_count, avg_quality_score from
-    opqualitycontrol.t_shopcheck_report. UPDATE test.store_kpi_daily.
+    Rows: (kpi_date, store_id, inspection_count, avg_quality_score, max_ts)
     """
-    t0 = time.time()
-    log.info("STEP 5: Extracting quality KPIs from opqualitycontrol ...")
-    placeholders = ','.join(['%s'] * len(STORE_IDS))
-    start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
-
-    extract_sql = f"""
+    sql = f"""
         SELECT
             DATE(check_time)                        AS kpi_date,
             shop_dept_id                            AS store_id,
             COUNT(*)                                AS inspection_count,
-            ROUND(AVG(total_score), 2)              AS avg_quality_score
-        FROM t_shopcheck_report
-        WHERE DATE(check_time) >= %s
-          AND DATE(check_time) <= %s
-          AND shop_dept_id IN ({placeholders})
+            ROUND(AVG(total_score), 2)              AS avg_quality_score,
+            MAX(check_time)                         AS max_ts
+        FROM t_shopcheck_report r
+        INNER JOIN {STORE_ID_TABLE} ts ON ts.dept_id = r.shop_dept_id
+        WHERE check_time >= %s
+          AND check_time <  %s
         GROUP BY DATE(check_time), shop_dept_id
         ORDER BY kpi_date, store_id
     """
-    params = [start_date, run_date] + list(STORE_IDS)
+    return sql, list(day_range(start_date, end_date))
+
+
+# (step_num, name, server, query builder, KPI columns after kpi_date/store_id)
+KPI_SOURCES = [
+    (2, 'revenue',    'salesorder', revenue_kpi_query,
+     ('revenue', 'order_count', 'aov')),
+    (3, 'production', 'production', production_kpi_query,
+     ('production_count', 'avg_production_time_sec')),
+    (4, 'staffing',   'empeff',     staffing_kpi_query,
+     ('scheduled_hours', 'employee_count')),
+    (5, 'quality',    'quality',    quality_kpi_query,
+     ('inspection_count', 'avg_quality_score')),
+]
+# Source table, its alias in the query (EXPLAIN reports the alias) and the
+# index each query wants: equality (join) on shop_dept_id, then a range on
+# the time column. Used by --explain.
+KPI_SOURCE_INDEXES = {
+    'revenue':    ('t_order',            'o',  ('shop_dept_id', 'create_time')),
+    'production': ('t_production',       'p',  ('shop_dept_id', 'create_time')),
+    'staffing':   ('t_emp_scheduling',   'es', ('shop_dept_id', 'schedule_date')),
+    'quality':    ('t_shopcheck_report', 'r',  ('shop_dept_id', 'check_time')),
+}
+KPI_COLUMNS = tuple(col for *_, cols in KPI_SOURCES for col in cols)
+KPI_STAGE_TABLE = 'tmp_store_kpi_stage'   # session-scoped TEMPORARY table on dbatest
+STAGE_BATCH_SIZE = 1000                   # rows per multi-row INSERT into staging
+
+
+def merge_kpi_rows(source_rows: dict) -> dict:
+    """Merge per-source rows into one KPI record per (kpi_date, store_id).
 
-    conn_src = None
-    data = []
+    source_rows: {source name -> rows from its extractor}
+    Returns {(kpi_date, store_id): {column: value}}; columns a source did
+    not report for that key are absent (written as NULL, then COALESCEd).
+    """
+    frame = {}
+    for _, name, _, _, columns in KPI_SOURCES:
+        for row in source_rows.get(name, []):
+            kpi_date, store_id = row[0], row[1]
+            record = frame.setdefault((kpi_date, store_id), {})
+            record.update(zip(columns, row[2:2 + len(columns)]))
+    return frame
+
+
+def upsert_kpi_frame(conn, frame: dict) -> int:
+    """Write a merged KPI frame to test.store_kpi_daily via a staging table.
+
+    1. CREATE TEMPORARY TABLE shaped like store_kpi_daily (session-local)
+    2. Bulk-load the frame with multi-row INSERTs (STAGE_BATCH_SIZE rows each)
+    3. One INSERT ... SELECT ... ON DUPLICATE KEY UPDATE into the target
+
+    Columns missing from a record keep their existing value
+    (COALESCE(VALUES(col), col)), matching the old per-source UPDATE
+    behaviour when a source has no row for that store/date. As before,
+    only revenue creates rows: a store/date without revenue and without
+    an existing row is skipped, so production/staffing/quality alone never
+    add revenue-less days to SPC and health scoring.
+    """
+    columns = ('kpi_date', 'store_id', 'store_code', 'store_name') + KPI_COLUMNS
+    rows = []
+    for (kpi_date, store_id), record in sorted(frame.items()):
+        info = store_label(store_id)
+        rows.append(
+            (kpi_date, store_id, info[0], info[1])
+            + tuple(record.get(c) for c in KPI_COLUMNS)
+        )
+
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    merge_sql = f"""
+        INSERT INTO test.store_kpi_daily ({', '.join(columns)})
+        SELECT {', '.join(f's.{c}' for c in columns)}
+        FROM {KPI_STAGE_TABLE} s
+        WHERE s.revenue IS NOT NULL
+           OR EXISTS (SELECT 1 FROM test.store_kpi_daily t
+                      WHERE t.kpi_date = s.kpi_date AND t.store_id = s.store_id)
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{c} = COALESCE(VALUES({c}), test.store_kpi_daily.{c})' for c in KPI_COLUMNS)},
+            updated_at = NOW()
+    """
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {KPI_STAGE_TABLE}")
+        cur.execute(f"""
+            CREATE TEMPORARY TABLE {KPI_STAGE_TABLE}
+            SELECT {', '.join(columns)}
+            FROM test.store_kpi_daily
+            WHERE 1 = 0
+        """)
+
+        for i in range(0, len(rows), STAGE_BATCH_SIZE):
+            batch = rows[i:i + STAGE_BATCH_SIZE]
+            cur.execute(
+                f"INSERT INTO {KPI_STAGE_TABLE} ({', '.join(columns)}) VALUES "
+                + ', '.join([row_placeholder] * len(batch)),
+                [v for row in batch for v in row],
+            )
+
+        cur.execute(merge_sql)
+        cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {KPI_STAGE_TABLE}")
+    conn.commit()
+    return len(rows)
+
+
+def read_watermarks(conn) -> dict:
+    """Return {source name -> watermark datetime} from test.store_kpi_watermark.
+
+    Missing table or rows mean "no watermark" (full LOOKBACK_DAYS window).
+    """
     try:
-        conn_src = get_connection('quality')
-        with conn_src.cursor() as cur:
-            cur.execute(extract_sql, params)
-            data = cur.fetchall()
-        log.info("  -> Extracted %d quality rows", len(data))
-    finally:
-        if conn_src:
-            conn_src.close()
+        with conn.cursor() as cur:
+            cur.execute("SELECT source_name, watermark_ts FROM test.store_kpi_watermark")
+            return {name: ts for name, ts in cur.fetchall() if ts}
+    except pymysql.MySQLError as exc:
+        log.warning("  Could not read store_kpi_watermark (%s); using full lookback", exc)
+        return {}
 
-    update_sql = """
-        UPDATE test.store_kpi_daily
-        SET inspection_count    = %s,
-            avg_quality_score   = %s,
-            updated_at          = NOW()
-        WHERE kpi_date = %s AND store_id = %s
+
+def source_window_start(watermark, run_date: str) -> str:
+    """First kpi_date to re-aggregate for a source.
+
+    KPIs are daily aggregates, so the window is widened to whole days:
+    date(watermark - LATE_ARRIVAL_HOURS), clamped to [.., run_date]. With
+    no watermark the classic LOOKBACK_DAYS window is used. A stale
+    watermark (missed runs) widens the window to catch up.
     """
-    rows_updated = 0
+    lookback_start = date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)
+    if watermark is None:
+        return lookback_start.isoformat()
+    if not isinstance(watermark, datetime):
+        watermark = datetime.combine(watermark, datetime.min.time())
+    start = (watermark - timedelta(hours=LATE_ARRIVAL_HOURS)).date()
+    return min(start, date.fromisoformat(run_date)).isoformat()
+
+
+def update_watermarks(conn, run_id: str, run_date: str, source_rows: dict):
+    """Advance each successful source's watermark to the max time column it
+    returned. Called only after the KPI merge has been committed; a
+    watermark never moves backwards (GREATEST).
+    """
+    params = []
+    for name, rows in source_rows.items():
+        marks = [row[-1] for row in rows if row[-1] is not None]
+        if not marks:
+            continue
+        mark = max(marks)
+        if not isinstance(mark, datetime):
+            mark = datetime.combine(mark, datetime.min.time())
+        params.append((name, mark, run_id, run_date, len(rows)))
+    if not params:
+        return
+    with conn.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO test.store_kpi_watermark (
+                source_name, watermark_ts, last_run_id, last_run_date, last_rows
+            ) VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                watermark_ts  = GREATEST(watermark_ts, VALUES(watermark_ts)),
+                last_run_id   = VALUES(last_run_id),
+                last_run_date = VALUES(last_run_date),
+                last_rows     = VALUES(last_rows),
+                updated_at    = NOW()
+        """, params)
+    conn.commit()
+
+
+def step_02_05_source_kpis(run_id: str, run_date: str, full_refresh: bool = False,
+                           start_date: str = None) -> dict:
+    """Extract revenue, production, staffing and quality KPIs concurrently.
+
+    Each source runs in its own thread with its own connection; results
+    are merged per (kpi_date, store_id), bulk-loaded into a staging table
+    and merged into test.store_kpi_daily with one INSERT ... SELECT.
+
+    Extraction is incremental: each source only re-aggregates the days
+    from its watermark (minus LATE_ARRIVAL_HOURS) to run_date. With
+    full_refresh the watermarks are ignored and LOOKBACK_DAYS is used.
+    An explicit start_date (range mode) extracts start_date..run_date from
+    every source in one pass, ignoring the watermarks.
+
+    Returns {source name -> rows extracted, or 'FAILED'} plus 'upserted'.
+    A failed source is logged and skipped; the others are still written.
+    """
+    t0 = time.time()
+    log.info("STEPS 2-5: Extracting source KPIs concurrently (%d sources) ...",
+             len(KPI_SOURCES))
+
+    watermarks = {}
+    if not full_refresh and start_date is None:
+        conn_wm = None
+        try:
+            conn_wm = get_connection('dbatest')
+            watermarks = read_watermarks(conn_wm)
+        finally:
+            if conn_wm:
+                conn_wm.close()
+    start_dates = {
+        name: start_date or source_window_start(watermarks.get(name), run_date)
+        for _, name, _, _, _ in KPI_SOURCES
+    }
+    for _, name, _, _, _ in KPI_SOURCES:
+        log.info("  %-10s window %s .. %s (watermark: %s)", name, start_dates[name], run_date,
+                 watermarks.get(name, 'none' if not full_refresh and start_date is None
+                                else 'ignored'))
+
+    source_rows = {}
+    source_errors = {}
+    source_durations = {}
+
+    store_ids = list(stores_active_between(min(start_dates.values()), run_date))
+
+    def _timed(name, server, build_query):
+        t_src = time.time()
+        rows = _extract_rows(server, *build_query(start_dates[name], run_date), store_ids)
+        return rows, time.time() - t_src
+
+    with ThreadPoolExecutor(max_workers=len(KPI_SOURCES)) as pool:
+        futures = {
+            pool.submit(_timed, name, server, build_query): name
+            for _, name, server, build_query, _ in KPI_SOURCES
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                rows, duration = future.result()
+                source_rows[name] = rows
+                source_durations[name] = duration
+                log.info("  -> %-10s %5d rows (%.1fs)", name, len(rows), duration)
+            except Exception as exc:
+                source_errors[name] = exc
+                log.error("  -> %-10s FAILED: %s", name, exc, exc_info=True)
+
+    if not source_rows.get('revenue'):
+        log.warning("  No revenue data found for %s to %s", start_dates['revenue'], run_date)
+
+    frame = merge_kpi_rows(source_rows)
+    results = {}
     conn_dst = None
     try:
         conn_dst = get_connection('dbatest')
-        with conn_dst.cursor() as cur:
-            for row in data:
-                kpi_date, store_id, insp_count, avg_score = row
-                cur.execute(update_sql, (insp_count, avg_score, kpi_date, store_id))
-                rows_updated += cur.rowcount
-        conn_dst.commit()
-        log.info("  -> Updated %d rows in store_kpi_daily", rows_updated)
-
-        duration = time.time() - t0
-        log_step(conn_dst, run_id, 5, 'quality_kpis',
-                 f'Extracted {len(data)} quality rows, updated {rows_updated}',
-                 'SUCCESS', rows=rows_updated, duration=duration)
+        rows_upserted = upsert_kpi_frame(conn_dst, frame) if frame else 0
+        log.info("  -> Upserted %d merged rows into store_kpi_daily", rows_upserted)
+        # Only after the merge is committed, so a failed write is re-read next run
+        update_watermarks(conn_dst, run_id, run_date, source_rows)
+
+        for step_num, name, server, _, _ in KPI_SOURCES:
+            if name in source_errors:
+                results[name] = 'FAILED'
+                log_step(conn_dst, run_id, step_num, f'{name}_kpis',
+                         f'Extraction from {server} failed',
+                         'FAILED', duration=0, error=str(source_errors[name]))
+            else:
+                results[name] = len(source_rows[name])
+                log_step(conn_dst, run_id, step_num, f'{name}_kpis',
+                         f'Extracted {len(source_rows[name])} {name} rows from {server} '
+                         f'({start_dates[name]}..{run_date}); merged upsert wrote {rows_upserted} rows',
+                         'SUCCESS', rows=len(source_rows[name]),
+                         duration=source_durations[name])
     finally:
         if conn_dst:
             conn_dst.close()
 
-    log.info("  Step 5 complete (%.1fs)", time.time() - t0)
-    return rows_updated
+    results['upserted'] = rows_upserted
+    log.info("  Steps 2-5 complete (%.1fs)", time.time() - t0)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# EXPLAIN ADVISOR (--explain)
+# ---------------------------------------------------------------------------
+
+def explain_source_queries(run_date: str) -> bool:
+    """EXPLAIN each source KPI query on its server and check index usage.
+
+    For every source, reports the access type, chosen key and estimated
+    rows from EXPLAIN, and whether an index leading with
+    (shop_dept_id, <time column>) exists and is the one being used.
+    Missing indexes are reported with suggested DDL; nothing is changed.
+
+    Returns True if every query uses its recommended index.
+    """
+    start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
+    log.info("EXPLAIN ADVISOR: source KPI queries for %s to %s", start_date, run_date)
+    all_ok = True
+    store_ids = list(stores_active_between(start_date, run_date))
+
+    for _, name, server, build_query, _ in KPI_SOURCES:
+        table, alias, wanted = KPI_SOURCE_INDEXES[name]
+        sql, params = build_query(start_date, run_date)
+        conn = None
+        try:
+            conn = get_connection(server)
+            load_store_id_table(conn, store_ids)
+            with conn.cursor(pymysql.cursors.DictCursor) as cur:
+                cur.execute("EXPLAIN " + sql, params)
+                plan = [r for r in cur.fetchall() if r.get('table') == alias]
+                cur.execute(f"SHOW INDEX FROM {table}")
+                index_rows = cur.fetchall()
+        except Exception as exc:
+            log.error("  [%s] %s.%s: EXPLAIN failed: %s", name, server, table, exc)
+            all_ok = False
+            continue
+        finally:
+            if conn:
+                conn.close()
+
+        # key name -> ordered column list
+        indexes = {}
+        for r in sorted(index_rows, key=lambda r: (r['Key_name'], r['Seq_in_index'])):
+            indexes.setdefault(r['Key_name'], []).append(r['Column_name'])
+        matching = [k for k, cols in indexes.items() if tuple(cols[:len(wanted)]) == wanted]
+
+        row = plan[0] if plan else {}
+        key_used = row.get('key')
+        extra = row.get('Extra') or ''
+        log.info("  [%s] %s.%s: type=%s key=%s rows=%s%s",
+                 name, server, table, row.get('type'), key_used, row.get('rows'),
+                 f" ({extra})" if extra else '')
+
+        if key_used and key_used in matching:
+            covering = 'Using index' in extra and 'Using index condition' not in extra
+            log.info("    OK: uses (%s) via %s%s", ', '.join(wanted), key_used,
+                     ' [covering]' if covering else '')
+        elif matching:
+            all_ok = False
+            log.warning("    WARN: index %s on (%s) exists but optimizer chose %s",
+                        ', '.join(matching), ', '.join(wanted), key_used or 'a full scan')
+        else:
+            all_ok = False
+            log.warning("    WARN: no index on (%s); suggested DDL (run off-peak):", ', '.join(wanted))
+            log.warning("      ALTER TABLE %s ADD INDEX idx_%s (%s);",
+                        table, '_'.join(c.replace('_id', '') for c in wanted), ', '.join(wanted))
+
+    log.info("EXPLAIN ADVISOR: %s", "all source queries use their index" if all_ok
+             else "see warnings above")
+    return all_ok
 
 
 # ---------------------------------------------------------------------------
 # STEP 6: DERIVED METRICS
 # ---------------------------------------------------------------------------
 
-def step_06_derived_metrics(run_id: str, run_date: str) -> int:
+def step_06_derived_metrics(run_id: str, run_date: str, start_date: str = None) -> int:
     """Compute revenue_per_labor_hour and orders_per_labor_hour
     on dbatest from existing store_kpi_daily data.
+
+    Covers the LOOKBACK_DAYS window ending at run_date, or
+    start_date..run_date in range mode.
     """
     t0 = time.time()
     log.info("STEP 6: Computing derived metrics ...")
-    start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
+    if start_date is None:
+        start_date = (date.fromisoformat(run_date) - timedelta(days=LOOKBACK_DAYS - 1)).isoformat()
 
     update_sql = """
         UPDATE test.store_kpi_daily
@@ -620,13 +1009,7 @@ def step_07_anomaly_zscores(run_id: str, run_date: str) -> int:
     t0 = time.time()
     log.info("STEP 7: Computing 28-day rolling Z-scores ...")
 
-    metrics = [
-        'revenue', 'order_count', 'aov',
-        'production_count', 'avg_production_time_sec',
-        'scheduled_hours', 'employee_count',
-        'inspection_count', 'avg_quality_score',
-        'revenue_per_labor_hour', 'orders_per_labor_hour',
-    ]
+    metrics = SPC_METRICS
 
     # Build a SELECT that computes mean/stddev over trailing 28 days
     # and produces Z-score = (today_value - mean) / stddev
@@ -825,7 +1208,7 @@ def step_08_western_electric(run_id: str, run_date: str) -> int:
                 ) hit ON hit.store_id = sc.store_id
                 SET sc.we_rule5 = 1,
                     sc.anomaly_severity = CASE
-                        WHEN sc.anomaly_severity IS NOT NULL THEN sc.anomaly_severity
+                        WHEN sc.anomaly_severity IN ('CRITICAL', 'WARNING') THEN sc.anomaly_severity
                         ELSE 'INFO'
                     END
                 WHERE sc.score_date = %s
@@ -848,11 +1231,177 @@ def step_08_western_electric(run_id: str, run_date: str) -> int:
     return rows_updated
 
 
+def step_07_08_spc_python(run_id: str, run_date: str, start_date: str = None) -> tuple:
+    """Steps 7-8 in-process: Z-scores and WE rules with the pandas engine.
+
+    Reads the KPI window from test.store_kpi_daily once, scores
+    run_date (or every date in start_date..run_date, in date order) for
+    all stores and metrics, and bulk-upserts
+    test.store_anomaly_scores (flags and severity are rewritten, not
+    only set). Returns (score rows, rule-hit rows).
+    """
+    t0 = time.time()
+    log.info("STEPS 7-8: Z-scores + Western Electric rules (python engine) ...")
+
+    conn = None
+    try:
+        conn = get_connection('dbatest')
+        scores = spc_engine.score_range(conn, SPC_METRICS, start_date or run_date, run_date,
+                                        ROLLING_WINDOW, SIGMA_WARNING, SIGMA_CRITICAL)
+        written = spc_engine.write_scores(conn, scores, SPC_METRICS)
+        hits = {f'R{i}': int(scores[f'we_rule{i}'].sum()) if written else 0 for i in range(1, 6)}
+        log.info("  -> Upserted %d anomaly score rows; WE rules %s", written,
+                 ' '.join(f'{k}={v}' for k, v in hits.items()))
+
+        duration = time.time() - t0
+        log_step(conn, run_id, 7, 'anomaly_zscores',
+                 f'Computed Z-scores for {len(SPC_METRICS)} metrics, {written} store-days (python engine)',
+                 'SUCCESS', rows=written, duration=duration)
+        log_step(conn, run_id, 8, 'western_electric',
+                 'WE rules evaluated (python engine): '
+                 + ' '.join(f'{k}={v}' for k, v in hits.items()),
+                 'SUCCESS', rows=sum(hits.values()), duration=duration)
+    finally:
+        if conn:
+            conn.close()
+
+    log.info("  Steps 7-8 complete (%.1fs)", time.time() - t0)
+    return written, sum(hits.values())
+
+
+def load_store_area_types() -> dict:
+    """{store_code -> (area_type, opened)} from STORE_AREA_TYPES_CSV.
+
+    The site-selection store table (shop_no, area_type, opened). Missing
+    file or stores -> area type 'unknown'.
+    """
+    try:
+        with open(STORE_AREA_TYPES_CSV, newline='') as fh:
+            return {
+                row['shop_no']: (row.get('area_type') or 'unknown', row.get('opened') or None)
+                for row in csv.DictReader(fh) if row.get('shop_no')
+            }
+    except OSError as exc:
+        log.warning("  Could not read %s (%s); all stores in area 'unknown'",
+                    STORE_AREA_TYPES_CSV, exc)
+        return {}
+
+
+def peer_group_keys() -> dict:
+    """{store_id -> (area_type, opened)} for every registry store.
+
+    opened is an ISO date or None; the age bucket (PEER_AGE_BUCKETS) is
+    derived per score date in spc_engine.compute_peer_scores.
+    """
+    area_types = load_store_area_types()
+    keys = {}
+    for store_id, store in load_store_registry().items():
+        area_type, csv_opened = area_types.get(store['store_code'], ('unknown', None))
+        keys[store_id] = (area_type, store.get('opened') or csv_opened)
+    return keys
+
+
+def step_07_peer_scores(run_id: str, run_date: str, start_date: str = None) -> int:
+    """Cross-sectional peer-group scores (spc_engine.compute_peer_scores).
+
+    Compares every store with same-day peers (area type + store age, then
+    area type, then fleet) using median/MAD, so new stores without a
+    28-day history and fleet-wide shifts (weather, holidays) still get a
+    meaningful score. Writes peer_group, peer_group_size and
+    peer_z_<metric> columns of test.store_anomaly_scores.
+    """
+    t0 = time.time()
+    log.info("STEP 7 (peer): Computing peer-group robust Z-scores ...")
+
+    conn = None
+    try:
+        conn = get_connection('dbatest')
+        kpi = spc_engine.load_kpi_frame(conn, SPC_METRICS, start_date or run_date, run_date)
+        peers = spc_engine.compute_peer_scores(kpi, SPC_METRICS, peer_group_keys(),
+                                               PEER_AGE_BUCKETS, PEER_MIN_GROUP)
+        written = spc_engine.write_peer_scores(conn, peers, SPC_METRICS)
+        scored = int(peers['peer_group'].notna().sum()) if written else 0
+        log.info("  -> Upserted %d peer score rows (%d with a peer group of >= %d)",
+                 written, scored, PEER_MIN_GROUP)
+
+        log_step(conn, run_id, 7, 'peer_scores',
+                 f'Peer-group Z-scores for {written} store-days ({scored} with a peer baseline)',
+                 'SUCCESS', rows=written, duration=time.time() - t0)
+    finally:
+        if conn:
+            conn.close()
+
+    log.info("  Peer scores complete (%.1fs)", time.time() - t0)
+    return written
+
+
+def check_spc_parity(run_date: str, tolerance: float = 1e-3) -> bool:
+    """Compare the pandas engine with the SQL results stored for run_date.
+
+    Run after a normal (--spc-engine sql) pipeline run for the date.
+    Nothing is written. Returns True when every store matches on
+    z/mean/std (within tolerance), we_rule1..5 and anomaly_severity.
+    """
+    stat_cols = [f'{p}_{m}' for m in SPC_METRICS for p in ('z', 'mean', 'std')]
+    rule_cols = ['we_rule1', 'we_rule2', 'we_rule3', 'we_rule4', 'we_rule5', 'anomaly_severity']
+
+    conn = None
+    try:
+        conn = get_connection('dbatest')
+        scores = spc_engine.score_range(conn, SPC_METRICS, run_date, run_date,
+                                        ROLLING_WINDOW, SIGMA_WARNING, SIGMA_CRITICAL)
+        with conn.cursor(pymysql.cursors.DictCursor) as cur:
+            cur.execute(f"""
+                SELECT store_id, {', '.join(stat_cols + rule_cols)}
+                FROM test.store_anomaly_scores
+                WHERE score_date = %s
+            """, (run_date,))
+            stored = {r['store_id']: r for r in cur.fetchall()}
+    finally:
+        if conn:
+            conn.close()
+
+    computed = {int(r['store_id']): r for r in scores.to_dict('records')}
+    diffs = spc_engine.compare_scores(stored, computed, SPC_METRICS, tolerance)
+    for store_id, col, a, b in diffs:
+        if col is None:
+            log.warning("  store %s: only in %s results", store_id, 'SQL' if a else 'python')
+        else:
+            log.warning("  store %s %-32s sql=%s python=%s", store_id, col, a, b)
+    mismatches = len(diffs)
+
+    log.info("SPC parity %s: %d stores, %d mismatches", run_date,
+             len(set(stored) | set(computed)), mismatches)
+    return mismatches == 0
+
+
 # ---------------------------------------------------------------------------
 # STEP 9: HEALTH SCORES
 # ---------------------------------------------------------------------------
 
-def step_09_health_scores(run_id: str, run_date: str) -> int:
+def read_health_weights(conn) -> dict:
+    """Return {dimension -> weight} from test.store_health_weights.
+
+    Dimensions missing from the table (or a missing table) fall back to
+    HEALTH_WEIGHTS, so weights can be tuned with an UPDATE instead of a
+    code change.
+    """
+    weights = dict(HEALTH_WEIGHTS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT dimension, weight FROM test.store_health_weights")
+            for dimension, weight in cur.fetchall():
+                if dimension in weights and weight is not None:
+                    weights[dimension] = float(weight)
+    except pymysql.MySQLError as exc:
+        log.warning("  Could not read store_health_weights (%s); using HEALTH_WEIGHTS", exc)
+    total = sum(weights.values())
+    if abs(total - 1.0) > 0.001:
+        log.warning("  Health weights sum to %.3f (expected 1.0): %s", total, weights)
+    return weights
+
+
+def step_09_health_scores(run_id: str, run_date: str, start_date: str = None) -> int:
     """Compute composite health scores with weighted formula.
 
     INSERT INTO test.store_health_scores.
@@ -860,12 +1409,14 @@ def step_09_health_scores(run_id: str, run_date: str) -> int:
     Health score (0-100) = weighted combination of per-dimension scores.
     Each dimension score is derived from its Z-score:
       dimension_score = MAX(0, 100 - ABS(z) * 20)
+    Dimension scores are computed once in a derived table; the composite
+    and grade are derived from them. Weights come from
+    test.store_health_weights (see read_health_weights). Range mode
+    scores every date in start_date..run_date in the same statement.
     """
     t0 = time.time()
     log.info("STEP 9: Computing health scores ...")
 
-    w = HEALTH_WEIGHTS
-
     sql = """
         INSERT INTO test.store_health_scores (
             score_date, store_id, store_code, store_name,
@@ -874,89 +1425,51 @@ def step_09_health_scores(run_id: str, run_date: str) -> int:
             composite_score, health_grade, created_at
         )
         SELECT
-            s.score_date,
-            s.store_id,
-            s.store_code,
-            s.store_name,
-
-            -- revenue dimension: based on z_revenue and z_aov
-            ROUND(GREATEST(0, 100 - (ABS(COALESCE(s.z_revenue, 0))
-                  + ABS(COALESCE(s.z_aov, 0))) / 2.0 * 20), 1)
-                AS revenue_score,
-
-            -- ops dimension: based on z_production_count, z_avg_production_time_sec
-            ROUND(GREATEST(0, 100 - (ABS(COALESCE(s.z_production_count, 0))
-                  + ABS(COALESCE(s.z_avg_production_time_sec, 0))) / 2.0 * 20), 1)
-                AS ops_score,
-
-            -- quality dimension: based on z_avg_quality_score
-            ROUND(GREATEST(0, 100 - ABS(COALESCE(s.z_avg_quality_score, 0)) * 20), 1)
-                AS quality_score,
-
-            -- staffing dimension: based on z_scheduled_hours, z_employee_count
-            ROUND(GREATEST(0, 100 - (ABS(COALESCE(s.z_scheduled_hours, 0))
-                  + ABS(COALESCE(s.z_employee_count, 0))) / 2.0 * 20), 1)
-                AS staffing_score,
-
-            -- customer dimension: based on z_order_count, z_orders_per_labor_hour
-            ROUND(GREATEST(0, 100 - (ABS(COALESCE(s.z_order_count, 0))
-                  + ABS(COALESCE(s.z_orders_per_labor_hour, 0))) / 2.0 * 20), 1)
-                AS customer_score,
-
-            -- composite weighted score
-            ROUND(
-                {w_rev} * GREATEST(0, 100 - (ABS(COALESCE(s.z_revenue, 0))
-                          + ABS(COALESCE(s.z_aov, 0))) / 2.0 * 20)
-              + {w_ops} * GREATEST(0, 100 - (ABS(COALESCE(s.z_production_count, 0))
-                          + ABS(COALESCE(s.z_avg_production_time_sec, 0))) / 2.0 * 20)
-              + {w_qua} * GREATEST(0, 100 - ABS(COALESCE(s.z_avg_quality_score, 0)) * 20)
-              + {w_sta} * GREATEST(0, 100 - (ABS(COALESCE(s.z_scheduled_hours, 0))
-                          + ABS(COALESCE(s.z_employee_count, 0))) / 2.0 * 20)
-              + {w_cus} * GREATEST(0, 100 - (ABS(COALESCE(s.z_order_count, 0))
-                          + ABS(COALESCE(s.z_orders_per_labor_hour, 0))) / 2.0 * 20)
-            , 1) AS composite_score,
-
-            -- health grade
+            h.score_date, h.store_id, h.store_code, h.store_name,
+            ROUND(h.revenue_dim, 1),
+            ROUND(h.ops_dim, 1),
+            ROUND(h.quality_dim, 1),
+            ROUND(h.staffing_dim, 1),
+            ROUND(h.customer_dim, 1),
+            h.composite_score,
             CASE
-                WHEN ROUND(
-                    {w_rev} * GREATEST(0, 100 - (ABS(COALESCE(s.z_revenue, 0))
-                              + ABS(COALESCE(s.z_aov, 0))) / 2.0 * 20)
-                  + {w_ops} * GREATEST(0, 100 - (ABS(COALESCE(s.z_production_count, 0))
-                              + ABS(COALESCE(s.z_avg_production_time_sec, 0))) / 2.0 * 20)
-                  + {w_qua} * GREATEST(0, 100 - ABS(COALESCE(s.z_avg_quality_score, 0)) * 20)
-                  + {w_sta} * GREATEST(0, 100 - (ABS(COALESCE(s.z_scheduled_hours, 0))
-                              + ABS(COALESCE(s.z_employee_count, 0))) / 2.0 * 20)
-                  + {w_cus} * GREATEST(0, 100 - (ABS(COALESCE(s.z_order_count, 0))
-                              + ABS(COALESCE(s.z_orders_per_labor_hour, 0))) / 2.0 * 20)
-                , 1) >= 90 THEN 'A'
-                WHEN ROUND(
-                    {w_rev} * GREATEST(0, 100 - (ABS(COALESCE(s.z_revenue, 0))
-                              + ABS(COALESCE(s.z_aov, 0))) / 2.0 * 20)
-                  + {w_ops} * GREATEST(0, 100 - (ABS(COALESCE(s.z_production_count, 0))
-                              + ABS(COALESCE(s.z_avg_production_time_sec, 0))) / 2.0 * 20)
-                  + {w_qua} * GREATEST(0, 100 - ABS(COALESCE(s.z_avg_quality_score, 0)) * 20)
-                  + {w_sta} * GREATEST(0, 100 - (ABS(COALESCE(s.z_scheduled_hours, 0))
-                              + ABS(COALESCE(s.z_employee_count, 0))) / 2.0 * 20)
-                  + {w_cus} * GREATEST(0, 100 - (ABS(COALESCE(s.z_order_count, 0))
-                              + ABS(COALESCE(s.z_orders_per_labor_hour, 0))) / 2.0 * 20)
-                , 1) >= 75 THEN 'B'
-                WHEN ROUND(
-                    {w_rev} * GREATEST(0, 100 - (ABS(COALESCE(s.z_revenue, 0))
-                              + ABS(COALESCE(s.z_aov, 0))) / 2.0 * 20)
-                  + {w_ops} * GREATEST(0, 100 - (ABS(COALESCE(s.z_production_count, 0))
-                              + ABS(COALESCE(s.z_avg_production_time_sec, 0))) / 2.0 * 20)
-                  + {w_qua} * GREATEST(0, 100 - ABS(COALESCE(s.z_avg_quality_score, 0)) * 20)
-                  + {w_sta} * GREATEST(0, 100 - (ABS(COALESCE(s.z_scheduled_hours, 0))
-                              + ABS(COALESCE(s.z_employee_count, 0))) / 2.0 * 20)
-                  + {w_cus} * GREATEST(0, 100 - (ABS(COALESCE(s.z_order_count, 0))
-                              + ABS(COALESCE(s.z_orders_per_labor_hour, 0))) / 2.0 * 20)
-                , 1) >= 60 THEN 'C'
+                WHEN h.composite_score >= 90 THEN 'A'
+                WHEN h.composite_score >= 75 THEN 'B'
+                WHEN h.composite_score >= 60 THEN 'C'
                 ELSE 'D'
-            END AS health_grade,
-
+            END,
             NOW()
-        FROM test.store_anomaly_scores s
-        WHERE s.score_date = %s
+        FROM (
+            SELECT
+                d.*,
+                ROUND(%s * d.revenue_dim + %s * d.ops_dim + %s * d.quality_dim
+                      + %s * d.staffing_dim + %s * d.customer_dim, 1) AS composite_score
+            FROM (
+                SELECT
+                    s.score_date, s.store_id, s.store_code, s.store_name,
+
+                    -- revenue dimension: based on z_revenue and z_aov
+                    GREATEST(0, 100 - (ABS(COALESCE(s.z_revenue, 0))
+                        + ABS(COALESCE(s.z_aov, 0))) / 2.0 * 20)                 AS revenue_dim,
+
+                    -- ops dimension: based on z_production_count, z_avg_production_time_sec
+                    GREATEST(0, 100 - (ABS(COALESCE(s.z_production_count, 0))
+                        + ABS(COALESCE(s.z_avg_production_time_sec, 0))) / 2.0 * 20) AS ops_dim,
+
+                    -- quality dimension: based on z_avg_quality_score
+                    GREATEST(0, 100 - ABS(COALESCE(s.z_avg_quality_score, 0)) * 20) AS quality_dim,
+
+                    -- staffing dimension: based on z_scheduled_hours, z_employee_count
+                    GREATEST(0, 100 - (ABS(COALESCE(s.z_scheduled_hours, 0))
+                        + ABS(COALESCE(s.z_employee_count, 0))) / 2.0 * 20)       AS staffing_dim,
+
+                    -- customer dimension: based on z_order_count, z_orders_per_labor_hour
+                    GREATEST(0, 100 - (ABS(COALESCE(s.z_order_count, 0))
+                        + ABS(COALESCE(s.z_orders_per_labor_hour, 0))) / 2.0 * 20) AS customer_dim
+                FROM test.store_anomaly_scores s
+                WHERE s.score_date BETWEEN %s AND %s
+            ) d
+        ) h
         ON DUPLICATE KEY UPDATE
             revenue_score   = VALUES(revenue_score),
             ops_score       = VALUES(ops_score),
@@ -966,17 +1479,16 @@ def step_09_health_scores(run_id: str, run_date: str) -> int:
             composite_score = VALUES(composite_score),
             health_grade    = VALUES(health_grade),
             created_at      = NOW()
-    """.format(
-        w_rev=w['revenue'], w_ops=w['ops'], w_qua=w['quality'],
-        w_sta=w['staffing'], w_cus=w['customer'],
-    )
+    """
 
     rows_upserted = 0
     conn = None
     try:
         conn = get_connection('dbatest')
+        w = read_health_weights(conn)
         with conn.cursor() as cur:
-            cur.execute(sql, (run_date,))
+            cur.execute(sql, (w['revenue'], w['ops'], w['quality'],
+                              w['staffing'], w['customer'], start_date or run_date, run_date))
             rows_upserted = cur.rowcount
         conn.commit()
         log.info("  -> Upserted %d health score rows", rows_upserted)
@@ -997,11 +1509,11 @@ def step_09_health_scores(run_id: str, run_date: str) -> int:
 # STEP 10: GENERATE ALERTS
 # ---------------------------------------------------------------------------
 
-def step_10_alerts(run_id: str, run_date: str) -> int:
+def step_10_alerts(run_id: str, run_date: str, start_date: str = None) -> int:
     """Generate alerts based on anomaly severity and health grades.
 
     INSERT INTO test.store_anomaly_alerts with description_en and
-    description_cn (bilingual).
+    description_cn (bilingual). Range mode covers start_date..run_date.
     """
     t0 = time.time()
     log.info("STEP 10: Generating alerts ...")
@@ -1092,7 +1604,7 @@ def step_10_alerts(run_id: str, run_date: str) -> int:
         LEFT JOIN test.store_kpi_daily k
             ON  k.kpi_date  = sc.score_date
             AND k.store_id  = sc.store_id
-        WHERE sc.score_date = %s
+        WHERE sc.score_date BETWEEN %s AND %s
           AND (
               sc.anomaly_severity IS NOT NULL
               OR h.health_grade = 'D'
@@ -1115,7 +1627,7 @@ def step_10_alerts(run_id: str, run_date: str) -> int:
     try:
         conn = get_connection('dbatest')
         with conn.cursor() as cur:
-            cur.execute(sql, (run_date,))
+            cur.execute(sql, (start_date or run_date, run_date))
             rows_inserted = cur.rowcount
         conn.commit()
         log.info("  -> Generated %d alerts", rows_inserted)
@@ -1241,28 +1753,346 @@ def step_12_verify(run_id: str, run_date: str) -> bool:
     return ok
 
 
+# ---------------------------------------------------------------------------
+# INTRADAY: HOURLY KPIs + SAME-HOUR / SAME-WEEKDAY SCORING
+# ---------------------------------------------------------------------------
+
+INTRADAY_METRICS = ('revenue', 'order_count', 'production_count')
+MIN_INTRADAY_BASELINE = 4   # need >= 4 of the DOW_WEEKS same-hour samples to score
+
+
+def revenue_hourly_query(start_ts: str, end_ts: str) -> tuple:
+    """Hourly revenue, order_count, AOV from salesorder.t_order for [start_ts, end_ts).
+
+    Rows: (kpi_date, kpi_hour, store_id, revenue, order_count, aov)
+    """
+    sql = f"""
+        SELECT
+            DATE(create_time)                         AS kpi_date,
+            HOUR(create_time)                         AS kpi_hour,
+            shop_dept_id                              AS store_id,
+            ROUND(SUM(total_price), 2)                AS revenue,
+            COUNT(DISTINCT order_id)                  AS order_count,
+            ROUND(SUM(total_price) / NULLIF(COUNT(DISTINCT order_id), 0), 2)
+                                                      AS aov
+        FROM t_order o
+        INNER JOIN {STORE_ID_TABLE} ts ON ts.dept_id = o.shop_dept_id
+        WHERE create_time >= %s
+          AND create_time <  %s
+          AND order_status NOT IN (5, 6)
+        GROUP BY DATE(create_time), HOUR(create_time), shop_dept_id
+    """
+    return sql, [start_ts, end_ts]
+
+
+def production_hourly_query(start_ts: str, end_ts: str) -> tuple:
+    """Hourly production_count, avg_production_time_sec from
+    opproduction.t_production for [start_ts, end_ts).
+
+    Rows: (kpi_date, kpi_hour, store_id, production_count, avg_production_time_sec)
+    """
+    sql = f"""
+        SELECT
+            DATE(create_time)               AS kpi_date,
+            HOUR(create_time)               AS kpi_hour,
+            shop_dept_id                    AS store_id,
+            COUNT(*)                        AS production_count,
+            ROUND(AVG(
+                TIMESTAMPDIFF(SECOND, create_time, complete_time)
+            ), 1)                           AS avg_production_time_sec
+        FROM t_production p
+        INNER JOIN {STORE_ID_TABLE} ts ON ts.dept_id = p.shop_dept_id
+        WHERE create_time >= %s
+          AND create_time <  %s
+          AND complete_time IS NOT NULL
+        GROUP BY DATE(create_time), HOUR(create_time), shop_dept_id
+    """
+    return sql, [start_ts, end_ts]
+
+
+# (name, server, query builder, KPI columns after kpi_date/kpi_hour/store_id, zero-fill columns)
+HOURLY_KPI_SOURCES = [
+    ('revenue',    'salesorder', revenue_hourly_query,
+     ('revenue', 'order_count', 'aov'), ('revenue', 'order_count')),
+    ('production', 'production', production_hourly_query,
+     ('production_count', 'avg_production_time_sec'), ('production_count',)),
+]
+HOURLY_KPI_COLUMNS = tuple(col for _, _, _, cols, _ in HOURLY_KPI_SOURCES for col in cols)
+
+
+def load_hourly_kpis(run_id: str, start_dt: datetime, end_dt: datetime) -> int:
+    """Extract hourly KPIs for [start_dt, end_dt) and upsert test.store_kpi_hourly.
+
+    Both sources are queried concurrently. Every store active on any day
+    of the window is extracted, and every (hour, store active that day) gets
+    a row: a store with no orders in an hour is written as 0 orders / 0
+    revenue (the outage signal), but only for sources that succeeded -- a
+    failed source leaves its columns untouched rather than zero-filled.
+    """
+    t0 = time.time()
+    start_ts = start_dt.strftime('%Y-%m-%d %H:00:00')
+    end_ts = end_dt.strftime('%Y-%m-%d %H:00:00')
+    log.info("INTRADAY: Extracting hourly KPIs for [%s, %s) ...", start_ts, end_ts)
+
+    stores = stores_active_between(start_dt.date(), (end_dt - timedelta(hours=1)).date())
+    source_rows = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(HOURLY_KPI_SOURCES)) as pool:
+        futures = {
+            pool.submit(_extract_rows, server, *build_query(start_ts, end_ts), list(stores)): name
+            for name, server, build_query, _, _ in HOURLY_KPI_SOURCES
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                source_rows[name] = future.result()
+                log.info("  -> %-10s %5d rows", name, len(source_rows[name]))
+            except Exception as exc:
+                failed.append(name)
+                log.error("  -> %-10s FAILED: %s", name, exc, exc_info=True)
+
+    # Zero-fill every hour x store for the sources that answered
+    zero_cols = [c for name, _, _, _, zcols in HOURLY_KPI_SOURCES
+                 if name in source_rows for c in zcols]
+    frame = {}
+    open_on = {}
+    hour = start_dt
+    while hour < end_dt:
+        if hour.date() not in open_on:
+            open_on[hour.date()] = active_stores(hour.date())
+        for store_id in open_on[hour.date()]:
+            frame[(hour.date(), hour.hour, store_id)] = dict.fromkeys(zero_cols, 0)
+        hour += timedelta(hours=1)
+    for name, _, _, columns, _ in HOURLY_KPI_SOURCES:
+        for row in source_rows.get(name, []):
+            key = (row[0], int(row[1]), row[2])
+            frame.setdefault(key, {}).update(zip(columns, row[3:]))
+
+    columns = ('kpi_date', 'kpi_hour', 'store_id', 'store_code', 'store_name') + HOURLY_KPI_COLUMNS
+    params = []
+    for (kpi_date, kpi_hour, store_id), record in sorted(frame.items()):
+        info = store_label(store_id)
+        params.append((kpi_date, kpi_hour, store_id, info[0], info[1])
+                      + tuple(record.get(c) for c in HOURLY_KPI_COLUMNS))
+
+    upsert_sql = f"""
+        INSERT INTO test.store_kpi_hourly ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{c} = COALESCE(VALUES({c}), {c})' for c in HOURLY_KPI_COLUMNS)},
+            updated_at = NOW()
+    """
+    conn = None
+    try:
+        conn = get_connection('dbatest')
+        with conn.cursor() as cur:
+            for i in range(0, len(params), STAGE_BATCH_SIZE):
+                cur.executemany(upsert_sql, params[i:i + STAGE_BATCH_SIZE])
+        conn.commit()
+        log.info("  -> Upserted %d rows into store_kpi_hourly", len(params))
+        log_step(conn, run_id, 2, 'intraday_kpis',
+                 f'Hourly KPIs [{start_ts}, {end_ts}): {len(params)} rows'
+                 + (f'; failed sources: {", ".join(failed)}' if failed else ''),
+                 'FAILED' if failed else 'SUCCESS', rows=len(params),
+                 duration=time.time() - t0)
+    finally:
+        if conn:
+            conn.close()
+
+    if failed:
+        raise RuntimeError(f"Hourly extraction failed for: {', '.join(failed)}")
+    return len(params)
+
+
+def score_intraday_hour(run_id: str, hour_start: datetime) -> int:
+    """Score one hour against the same hour on the same weekday of the
+    previous DOW_WEEKS weeks, then raise alerts for WARNING/CRITICAL hours.
+
+    Writes test.store_intraday_scores and test.store_anomaly_alerts
+    (alert_type INTRADAY_ANOMALY, metric_name e.g. 'order_count@08h').
+    """
+    t0 = time.time()
+    score_date = hour_start.date()
+    score_hour = hour_start.hour
+    baseline_dates = [score_date - timedelta(weeks=w) for w in range(1, DOW_WEEKS + 1)]
+    log.info("INTRADAY: Scoring %s %02d:00 against %d prior %ss ...",
+             score_date, score_hour, DOW_WEEKS, score_date.strftime('%A'))
+
+    m = INTRADAY_METRICS
+    score_sql = f"""
+        INSERT INTO test.store_intraday_scores (
+            score_date, score_hour, store_id, store_code, store_name,
+            {', '.join(f'{x}, z_{x}, mean_{x}, std_{x}' for x in m)},
+            baseline_weeks, anomaly_severity, created_at
+        )
+        SELECT
+            k.kpi_date, k.kpi_hour, k.store_id, k.store_code, k.store_name,
+            {', '.join(f'k.{x}, ROUND((k.{x} - b.avg_{x}) / NULLIF(b.std_{x}, 0), 4), b.avg_{x}, b.std_{x}' for x in m)},
+            b.n, NULL, NOW()
+        FROM test.store_kpi_hourly k
+        INNER JOIN (
+            SELECT
+                hist.store_id,
+                {', '.join(f'ROUND(AVG(hist.{x}), 4) AS avg_{x}, ROUND(STDDEV(hist.{x}), 4) AS std_{x}' for x in m)},
+                COUNT(*) AS n
+            FROM test.store_kpi_hourly hist
+            WHERE hist.kpi_hour = %s
+              AND hist.kpi_date IN ({', '.join(['%s'] * len(baseline_dates))})
+            GROUP BY hist.store_id
+            HAVING COUNT(*) >= %s
+        ) b ON b.store_id = k.store_id
+        WHERE k.kpi_date = %s AND k.kpi_hour = %s
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{x} = VALUES({x}), z_{x} = VALUES(z_{x}), mean_{x} = VALUES(mean_{x}), std_{x} = VALUES(std_{x})' for x in m)},
+            baseline_weeks = VALUES(baseline_weeks),
+            anomaly_severity = NULL,
+            created_at = NOW()
+    """
+    severity_sql = """
+        UPDATE test.store_intraday_scores
+        SET anomaly_severity = CASE
+                WHEN GREATEST(ABS(COALESCE(z_revenue, 0)), ABS(COALESCE(z_order_count, 0))) >= %s
+                    THEN 'CRITICAL'
+                WHEN GREATEST(ABS(COALESCE(z_revenue, 0)), ABS(COALESCE(z_order_count, 0))) >= %s
+                    THEN 'WARNING'
+                ELSE NULL
+            END
+        WHERE score_date = %s AND score_hour = %s
+    """
+    alert_sql = """
+        INSERT INTO test.store_anomaly_alerts (
+            alert_date, store_id, store_code, store_name,
+            alert_type, severity, metric_name, metric_value,
+            z_score, threshold,
+            description_en, description_cn,
+            we_rules_triggered, health_grade, composite_score,
+            is_acknowledged, created_at
+        )
+        SELECT
+            sc.score_date,
+            sc.store_id,
+            sc.store_code,
+            sc.store_name,
+            'INTRADAY_ANOMALY',
+            sc.anomaly_severity,
+            CONCAT('order_count@', LPAD(sc.score_hour, 2, '0'), 'h'),
+            sc.order_count,
+            sc.z_order_count,
+            CASE WHEN sc.anomaly_severity = 'CRITICAL' THEN %s ELSE %s END,
+            CONCAT(
+                sc.store_name, ': ', sc.anomaly_severity, ' intraday anomaly at ',
+                LPAD(sc.score_hour, 2, '0'), ':00. Orders=', sc.order_count,
+                ' (usual ', ROUND(sc.mean_order_count, 1), ', Z=', COALESCE(ROUND(sc.z_order_count, 2), 'n/a'),
+                '), revenue Z=', COALESCE(ROUND(sc.z_revenue, 2), 'n/a'), '.'
+            ),
+            CONCAT(
+                sc.store_name, ': ', LPAD(sc.score_hour, 2, '0'), ':00 时段异常(',
+                IF(sc.anomaly_severity = 'CRITICAL', '严重', '警告'), ')。订单数=', sc.order_count,
+                '(同期均值', ROUND(sc.mean_order_count, 1), ', Z=', COALESCE(ROUND(sc.z_order_count, 2), 'n/a'),
+                '), 营收Z=', COALESCE(ROUND(sc.z_revenue, 2), 'n/a')
+            ),
+            NULL, NULL, NULL,
+            0,
+            NOW()
+        FROM test.store_intraday_scores sc
+        WHERE sc.score_date = %s AND sc.score_hour = %s
+          AND sc.anomaly_severity IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            severity       = VALUES(severity),
+            metric_value   = VALUES(metric_value),
+            z_score        = VALUES(z_score),
+            description_en = VALUES(description_en),
+            description_cn = VALUES(description_cn),
+            created_at     = NOW()
+    """
+
+    conn = None
+    try:
+        conn = get_connection('dbatest')
+        with conn.cursor() as cur:
+            cur.execute(score_sql, [score_hour] + baseline_dates
+                        + [MIN_INTRADAY_BASELINE, score_date, score_hour])
+            scored = cur.rowcount
+            cur.execute(severity_sql, (SIGMA_CRITICAL, SIGMA_WARNING, score_date, score_hour))
+            cur.execute(alert_sql, (SIGMA_CRITICAL, SIGMA_WARNING, score_date, score_hour))
+            alerts = cur.rowcount
+        conn.commit()
+        log.info("  -> Scored %d store-hours, %d intraday alerts", scored, alerts)
+        log_step(conn, run_id, 10, 'intraday_scores',
+                 f'Intraday {score_date} {score_hour:02d}h: scored {scored}, alerts {alerts}',
+                 'SUCCESS', rows=scored, duration=time.time() - t0)
+    finally:
+        if conn:
+            conn.close()
+    return alerts
+
+
+def run_intraday(hour_start: datetime = None):
+    """Hourly entry point: load and score only the newest completed hour.
+
+    Hours are in the source databases' local time (same clock as
+    create_time).
+    """
+    if hour_start is None:
+        hour_start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    run_id = str(uuid.uuid4())[:12]
+    log.info("=" * 72)
+    log.info("UC-OP-02  INTRADAY RUN  %s  hour %s", run_id, hour_start.strftime('%Y-%m-%d %H:00'))
+    log.info("=" * 72)
+
+    failed = False
+    try:
+        load_hourly_kpis(run_id, hour_start, hour_start + timedelta(hours=1))
+    except Exception as exc:
+        log.error("INTRADAY EXTRACT FAILED: %s", exc, exc_info=True)
+        failed = True
+    try:
+        score_intraday_hour(run_id, hour_start)
+    except Exception as exc:
+        log.error("INTRADAY SCORING FAILED: %s", exc, exc_info=True)
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
 # ---------------------------------------------------------------------------
 # MAIN PIPELINE ORCHESTRATOR
 # ---------------------------------------------------------------------------
 
-def run_pipeline(run_date: str = None):
+def run_pipeline(run_date: str = None, full_refresh: bool = False, engine: str = None,
+                 start_date: str = None, peer_scores: bool = None):
     """Main entry point. Execute all 12 steps with error handling.
 
+    full_refresh ignores the per-source extraction watermarks and
+    re-extracts the whole LOOKBACK_DAYS window. engine selects where
+    steps 7-8 run: 'sql' (MySQL self-joins) or 'python' (spc_engine).
+
+    Range mode (start_date given): sources are extracted once for
+    start_date..run_date, then Z-scores/WE rules (python engine), health
+    and alerts are computed for every date of the range in one pass.
+
+    peer_scores (default PEER_SCORES) adds cross-sectional peer-group
+    scores after step 8.
+
     Each step is wrapped in try/except: on failure the error is logged
     and execution continues to the next step.
     """
     if run_date is None:
         run_date = (date.today() - timedelta(days=1)).isoformat()
 
+    engine = 'python' if start_date else (engine or SPC_ENGINE)
+    peer_scores = PEER_SCORES if peer_scores is None else peer_scores
     run_id = str(uuid.uuid4())[:12]
     pipeline_start = time.time()
 
     log.info("=" * 72)
     log.info("UC-OP-02  STORE PERFORMANCE ANOMALY DETECTION PIPELINE")
     log.info("Run ID:   %s", run_id)
-    log.info("Run date: %s", run_date)
-    log.info("Lookback: %d days", LOOKBACK_DAYS)
-    log.info("Stores:   %d active", len(ACTIVE_STORES))
+    log.info("Run date: %s", f"{start_date} .. {run_date} (range mode)" if start_date else run_date)
+    if start_date is None:
+        log.info("Lookback: %s", f"{LOOKBACK_DAYS} days (full refresh)" if full_refresh
+                 else f"incremental from source watermarks (-{LATE_ARRIVAL_HOURS}h late window)")
+    log.info("SPC:      %s engine", engine)
     log.info("=" * 72)
 
     step_results = {}
@@ -1276,74 +2106,74 @@ def run_pipeline(run_date: str = None):
         log.error("STEP 1 FAILED: %s", exc, exc_info=True)
         failed_steps.append(1)
         step_results['step01_stores'] = 'FAILED'
-        stores = dict(ACTIVE_STORES)  # fallback
+        stores = dict(FALLBACK_STORES)  # fallback
 
-    # -- Step 2: Revenue KPIs --
+    # -- Steps 2-5: Source KPIs (concurrent extraction, merged upsert) --
     try:
-        rev_rows = step_02_revenue_kpis(run_id, run_date)
-        step_results['step02_revenue'] = rev_rows
+        kpi_results = step_02_05_source_kpis(run_id, run_date, full_refresh=full_refresh,
+                                             start_date=start_date)
+        for step_num, name, *_ in KPI_SOURCES:
+            step_results[f'step{step_num:02d}_{name}'] = kpi_results[name]
+            if kpi_results[name] == 'FAILED':
+                failed_steps.append(step_num)
     except Exception as exc:
-        log.error("STEP 2 FAILED: %s", exc, exc_info=True)
-        failed_steps.append(2)
-        step_results['step02_revenue'] = 'FAILED'
-
-    # -- Step 3: Production KPIs --
-    try:
-        prod_rows = step_03_production_kpis(run_id, run_date)
-        step_results['step03_production'] = prod_rows
-    except Exception as exc:
-        log.error("STEP 3 FAILED: %s", exc, exc_info=True)
-        failed_steps.append(3)
-        step_results['step03_production'] = 'FAILED'
-
-    # -- Step 4: Staffing KPIs --
-    try:
-        staff_rows = step_04_staffing_kpis(run_id, run_date)
-        step_results['step04_staffing'] = staff_rows
-    except Exception as exc:
-        log.error("STEP 4 FAILED: %s", exc, exc_info=True)
-        failed_steps.append(4)
-        step_results['step04_staffing'] = 'FAILED'
-
-    # -- Step 5: Quality KPIs --
-    try:
-        qual_rows = step_05_quality_kpis(run_id, run_date)
-        step_results['step05_quality'] = qual_rows
-    except Exception as exc:
-        log.error("STEP 5 FAILED: %s", exc, exc_info=True)
-        failed_steps.append(5)
-        step_results['step05_quality'] = 'FAILED'
+        log.error("STEPS 2-5 FAILED: %s", exc, exc_info=True)
+        for step_num, name, *_ in KPI_SOURCES:
+            failed_steps.append(step_num)
+            step_results[f'step{step_num:02d}_{name}'] = 'FAILED'
 
     # -- Step 6: Derived metrics --
     try:
-        derived_rows = step_06_derived_metrics(run_id, run_date)
+        derived_rows = step_06_derived_metrics(run_id, run_date, start_date=start_date)
         step_results['step06_derived'] = derived_rows
     except Exception as exc:
         log.error("STEP 6 FAILED: %s", exc, exc_info=True)
         failed_steps.append(6)
         step_results['step06_derived'] = 'FAILED'
 
-    # -- Step 7: Z-scores --
-    try:
-        zscore_rows = step_07_anomaly_zscores(run_id, run_date)
-        step_results['step07_zscores'] = zscore_rows
-    except Exception as exc:
-        log.error("STEP 7 FAILED: %s", exc, exc_info=True)
-        failed_steps.append(7)
-        step_results['step07_zscores'] = 'FAILED'
-
-    # -- Step 8: Western Electric rules --
-    try:
-        we_rows = step_08_western_electric(run_id, run_date)
-        step_results['step08_western_electric'] = we_rows
-    except Exception as exc:
-        log.error("STEP 8 FAILED: %s", exc, exc_info=True)
-        failed_steps.append(8)
-        step_results['step08_western_electric'] = 'FAILED'
+    if engine == 'python':
+        # -- Steps 7-8: Z-scores + WE rules in-process --
+        try:
+            zscore_rows, we_rows = step_07_08_spc_python(run_id, run_date, start_date=start_date)
+            step_results['step07_zscores'] = zscore_rows
+            step_results['step08_western_electric'] = we_rows
+        except Exception as exc:
+            log.error("STEPS 7-8 FAILED: %s", exc, exc_info=True)
+            failed_steps.extend([7, 8])
+            step_results['step07_zscores'] = 'FAILED'
+            step_results['step08_western_electric'] = 'FAILED'
+    else:
+        # -- Step 7: Z-scores --
+        try:
+            zscore_rows = step_07_anomaly_zscores(run_id, run_date)
+            step_results['step07_zscores'] = zscore_rows
+        except Exception as exc:
+            log.error("STEP 7 FAILED: %s", exc, exc_info=True)
+            failed_steps.append(7)
+            step_results['step07_zscores'] = 'FAILED'
+
+        # -- Step 8: Western Electric rules --
+        try:
+            we_rows = step_08_western_electric(run_id, run_date)
+            step_results['step08_western_electric'] = we_rows
+        except Exception as exc:
+            log.error("STEP 8 FAILED: %s", exc, exc_info=True)
+            failed_steps.append(8)
+            step_results['step08_western_electric'] = 'FAILED'
+
+    # -- Peer-group scores (optional, after step 8) --
+    if peer_scores:
+        try:
+            step_results['step07_peer_scores'] = step_07_peer_scores(run_id, run_date,
+                                                                     start_date=start_date)
+        except Exception as exc:
+            log.error("PEER SCORES FAILED: %s", exc, exc_info=True)
+            failed_steps.append(7)
+            step_results['step07_peer_scores'] = 'FAILED'
 
     # -- Step 9: Health scores --
     try:
-        health_rows = step_09_health_scores(run_id, run_date)
+        health_rows = step_09_health_scores(run_id, run_date, start_date=start_date)
         step_results['step09_health'] = health_rows
     except Exception as exc:
         log.error("STEP 9 FAILED: %s", exc, exc_info=True)
@@ -1352,7 +2182,7 @@ def run_pipeline(run_date: str = None):
 
     # -- Step 10: Alerts --
     try:
-        alert_rows = step_10_alerts(run_id, run_date)
+        alert_rows = step_10_alerts(run_id, run_date, start_date=start_date)
         step_results['step10_alerts'] = alert_rows
     except Exception as exc:
         log.error("STEP 10 FAILED: %s", exc, exc_info=True)
@@ -1383,7 +2213,7 @@ def run_pipeline(run_date: str = None):
     else:
         log.info("PIPELINE COMPLETE SUCCESSFULLY")
     log.info("  Run ID:   %s", run_id)
-    log.info("  Run date: %s", run_date)
+    log.info("  Run date: %s", f"{start_date} .. {run_date}" if start_date else run_date)
     log.info("  Duration: %.1f seconds", total_duration)
     for k, v in step_results.items():
         log.info("  %-30s %s", k, v)
@@ -1407,6 +2237,12 @@ Examples:
   python run_pipeline.py                          # Yesterday's data
   python run_pipeline.py --date 2026-02-14        # Specific date
   python run_pipeline.py --backfill-from 2026-01-01 --backfill-to 2026-02-14
+  python run_pipeline.py --explain                # Check source query index usage
+  python run_pipeline.py --spc-engine python      # Steps 7-8 with pandas
+  python run_pipeline.py --peer-scores            # + peer-group scores
+  python run_pipeline.py --spc-parity --date 2026-02-14
+  python run_pipeline.py --intraday               # Score the last completed hour
+  python run_pipeline.py --hour "2026-02-14 08"   # Score a specific hour
         """,
     )
     parser.add_argument("--date", type=str,
@@ -1415,6 +2251,29 @@ Examples:
                         help="Start date for backfill (YYYY-MM-DD)")
     parser.add_argument("--backfill-to", type=str,
                         help="End date for backfill (YYYY-MM-DD)")
+    parser.add_argument("--backfill-per-day", action="store_true",
+                        help="Backfill by running the whole pipeline once per date instead of "
+                             "one range extraction + vectorized pass")
+    parser.add_argument("--intraday", action="store_true",
+                        help="Hourly mode: load and score the last completed hour "
+                             "(with --backfill-from/--backfill-to: only load hourly KPIs "
+                             "for the range, to seed the baseline)")
+    parser.add_argument("--hour", type=str,
+                        help="Intraday hour to process, 'YYYY-MM-DD HH' (implies --intraday)")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Ignore extraction watermarks and re-extract LOOKBACK_DAYS per source")
+    parser.add_argument("--explain", action="store_true",
+                        help="EXPLAIN the source KPI queries and report index usage, then exit "
+                             "(no data is written)")
+    parser.add_argument("--spc-engine", choices=("sql", "python"), default=None,
+                        help="Where steps 7-8 run: sql (MySQL) or python (pandas). "
+                             "Default: SPC_ENGINE env or sql")
+    parser.add_argument("--peer-scores", action="store_true", default=None,
+                        help="Also compute cross-sectional peer-group (median/MAD) scores "
+                             "(default: PEER_SCORES env)")
+    parser.add_argument("--spc-parity", action="store_true",
+                        help="Recompute --date with the python engine and compare against the "
+                             "stored SQL results, then exit (no data is written)")
     parser.add_argument("--env-file", type=str, default=None,
                         help="Path to .env file (default: ./orchestrator/.env)")
     parser.add_argument("--verbose", "-v", action="store_true",
@@ -1429,6 +2288,39 @@ Examples:
         load_dotenv(args.env_file, override=True)
         log.info("Loaded env from %s", args.env_file)
 
+    # Intraday mode
+    if args.intraday or args.hour:
+        if args.backfill_from and args.backfill_to:
+            try:
+                d_start = date.fromisoformat(args.backfill_from)
+                d_end = date.fromisoformat(args.backfill_to)
+            except ValueError as exc:
+                log.error("Invalid date format: %s", exc)
+                sys.exit(1)
+            start_dt = datetime.combine(d_start, datetime.min.time())
+            end_dt = datetime.combine(d_end + timedelta(days=1), datetime.min.time())
+            load_hourly_kpis(str(uuid.uuid4())[:12], start_dt, end_dt)
+            return
+        hour_start = None
+        if args.hour:
+            try:
+                hour_start = datetime.strptime(args.hour, '%Y-%m-%d %H')
+            except ValueError as exc:
+                log.error("Invalid --hour (expected 'YYYY-MM-DD HH'): %s", exc)
+                sys.exit(1)
+        run_intraday(hour_start)
+        return
+
+    # Advisor mode: read-only EXPLAIN of the source queries
+    if args.explain:
+        run_date = args.date or (date.today() - timedelta(days=1)).isoformat()
+        sys.exit(0 if explain_source_queries(run_date) else 1)
+
+    # Parity check: pandas SPC engine vs. stored SQL results
+    if args.spc_parity:
+        run_date = args.date or (date.today() - timedelta(days=1)).isoformat()
+        sys.exit(0 if check_spc_parity(run_date) else 1)
+
     # Backfill mode
     if args.backfill_from and args.backfill_to:
         try:
@@ -1444,13 +2336,24 @@ Examples:
             sys.exit(1)
 
         total_days = (d_end - d_start).days + 1
-        log.info("BACKFILL MODE: %d days from %s to %s",
-                 total_days, d_start, d_end)
+        per_day = args.backfill_per_day
+        if not per_day and spc_engine.pd is None:
+            log.warning("numpy/pandas not installed; range backfill needs the python SPC "
+                        "engine -- falling back to --backfill-per-day")
+            per_day = True
+        log.info("BACKFILL MODE: %d days from %s to %s (%s)", total_days, d_start, d_end,
+                 'per day' if per_day else 'range')
+
+        if not per_day:
+            run_pipeline(d_end.isoformat(), full_refresh=args.full_refresh,
+                         start_date=d_start.isoformat(), peer_scores=args.peer_scores)
+            return
 
         current = d_start
         while current <= d_end:
             log.info("--- Backfill: %s ---", current.isoformat())
-            run_pipeline(current.isoformat())
+            run_pipeline(current.isoformat(), full_refresh=args.full_refresh,
+                         engine=args.spc_engine, peer_scores=args.peer_scores)
             current += timedelta(days=1)
         return
 
@@ -1461,9 +2364,11 @@ Examples:
         except ValueError as exc:
             log.error("Invalid date format: %s", exc)
             sys.exit(1)
-        run_pipeline(args.date)
+        run_pipeline(args.date, full_refresh=args.full_refresh, engine=args.spc_engine,
+                     peer_scores=args.peer_scores)
     else:
-        run_pipeline()  # defaults to yesterday
+        run_pipeline(full_refresh=args.full_refresh, engine=args.spc_engine,
+                     peer_scores=args.peer_scores)  # defaults to yesterday
 
 
 if __name__ == '__main__':
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+UC-OP-02: In-process SPC engine (Z-scores + Western Electric rules)
+进程内SPC引擎（Z分数 + 西电规则）
+
+Vectorized replacement for the SQL self-join in step 7 and the five
+UPDATE ... JOIN passes in step 8. The KPI history needed for a scoring
+range is read from test.store_kpi_daily once; rolling statistics,
+Z-scores and WE rules 1-5 are computed with pandas for every store and
+metric at once, and the results are bulk-upserted into
+test.store_anomaly_scores.
+
+Semantics match the SQL engine:
+  - rolling window  = the ROLLING_WINDOW calendar days before the score
+                      date (score date excluded); NULLs are skipped
+  - std             = population standard deviation (MySQL STDDEV)
+  - mean/std/z      = rounded to 4 decimals, z uses the rounded mean/std
+  - std = 0         -> z is NULL
+  - no history rows -> no score row
+  - WE rule windows are calendar-day windows over z_revenue
+    (rule 1 also checks z_order_count), severity precedence as in step 8
+
+Dependencies: numpy, pandas (only needed when --spc-engine python)
+"""
+
+import logging
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
+
+log = logging.getLogger('uc-op-02')
+
+WRITE_BATCH_SIZE = 500
+WE_RULE_LOOKBACK = 7   # widest WE rule window (rule 4: 8 days incl. score date)
+PEER_MAD_SCALE = 1.4826  # MAD -> standard deviation for normally distributed data
+
+
+def require_pandas():
+    """Raise a clear error when the python engine is selected without pandas."""
+    if pd is None or np is None:
+        raise RuntimeError(
+            "numpy/pandas not installed -- required for --spc-engine python. "
+            "Run: pip install numpy pandas")
+
+
+def load_kpi_frame(conn, metrics: list, start_date: str, end_date: str):
+    """Read store_kpi_daily rows in [start_date, end_date] into a DataFrame.
+
+    One query for the whole window; DECIMAL columns become float64 and
+    NULLs become NaN.
+    """
+    require_pandas()
+    sql = f"""
+        SELECT kpi_date, store_id, store_code, store_name, {', '.join(metrics)}
+        FROM test.store_kpi_daily
+        WHERE kpi_date BETWEEN %s AND %s
+        ORDER BY store_id, kpi_date
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, (start_date, end_date))
+        rows = cur.fetchall()
+
+    frame = pd.DataFrame(list(rows),
+                         columns=['kpi_date', 'store_id', 'store_code', 'store_name'] + list(metrics))
+    frame['kpi_date'] = pd.to_datetime(frame['kpi_date'])
+    for m in metrics:
+        frame[m] = pd.to_numeric(frame[m], errors='coerce').astype('float64')
+    return frame
+
+
+def compute_zscores(kpi, metrics: list, window_days: int):
+    """Rolling mean/std and Z-scores for every store/day in ``kpi``.
+
+    Returns one row per (store_id, kpi_date) that has at least one history
+    row in its window, with score_date, store_id, store_code, store_name
+    and z_/mean_/std_ columns per metric.
+    """
+    require_pandas()
+    kpi = kpi.sort_values(['store_id', 'kpi_date']).reset_index(drop=True)
+    kpi['_hist'] = 1.0
+
+    rolling = (kpi.set_index('kpi_date')
+                  .groupby('store_id')[list(metrics) + ['_hist']]
+                  .rolling(f'{window_days}D', closed='left'))
+    mean = rolling.mean().round(4).reset_index(drop=True)
+    std = rolling.std(ddof=0).round(4).reset_index(drop=True)
+    hist_rows = rolling['_hist'].sum().fillna(0).reset_index(drop=True)
+
+    out = pd.DataFrame({
+        'score_date': kpi['kpi_date'],
+        'store_id': kpi['store_id'],
+        'store_code': kpi['store_code'],
+        'store_name': kpi['store_name'],
+    })
+    for m in metrics:
+        out[f'z_{m}'] = ((kpi[m] - mean[m]) / std[m].replace(0.0, np.nan)).round(4)
+        out[f'mean_{m}'] = mean[m]
+        out[f'std_{m}'] = std[m]
+    return out[hist_rows.to_numpy() > 0].reset_index(drop=True)
+
+
+def _rolling_by_store(scores, values, days: int, agg: str):
+    """Trailing ``days``-calendar-day aggregate (score date included) per store."""
+    frame = pd.DataFrame({'store_id': scores['store_id'],
+                          'score_date': scores['score_date'],
+                          'v': values}).set_index('score_date')
+    rolled = getattr(frame.groupby('store_id')['v'].rolling(f'{days}D'), agg)()
+    return rolled.reset_index(drop=True)
+
+
+def evaluate_we_rules(scores, sigma_warning: float, sigma_critical: float):
+    """Add we_rule1..we_rule5 and anomaly_severity columns to ``scores``.
+
+    ``scores`` must hold every scored day in the rule windows (up to
+    WE_RULE_LOOKBACK days before the first date that will be written).
+    """
+    require_pandas()
+    scores = scores.sort_values(['store_id', 'score_date']).reset_index(drop=True)
+    z = scores['z_revenue']
+    z_abs = z.abs()
+
+    # Comparisons against NULL stay NULL so SUM() skips them, as in SQL
+    beyond_warning = (z_abs >= sigma_warning).astype('float64').where(z.notna())
+    beyond_one = (z_abs >= 1).astype('float64').where(z.notna())
+
+    rule1 = (z_abs >= sigma_critical) | (scores['z_order_count'].abs() >= sigma_critical)
+    rule2 = _rolling_by_store(scores, beyond_warning, 3, 'sum') >= 2
+    rule3 = _rolling_by_store(scores, beyond_one, 5, 'sum') >= 4
+    rule4 = ((_rolling_by_store(scores, pd.Series(1.0, index=scores.index), 8, 'sum') >= 8)
+             & ((_rolling_by_store(scores, z, 8, 'min') > 0)
+                | (_rolling_by_store(scores, z, 8, 'max') < 0)))
+
+    # Rule 5: deltas between consecutive rows inside [d-5, d]; the first
+    # row of the window has no predecessor in it, so its delta is dropped
+    grouped = scores.groupby('store_id')
+    delta = grouped['z_revenue'].diff()
+    window_start = scores['score_date'] - pd.Timedelta(days=5)
+    n_delta = pd.Series(0, index=scores.index)
+    d_min = pd.Series(np.inf, index=scores.index)
+    d_max = pd.Series(-np.inf, index=scores.index)
+    for k in range(5):
+        prev_date = grouped['score_date'].shift(k + 1)
+        d_k = delta if k == 0 else delta.groupby(scores['store_id']).shift(k)
+        counted = d_k.notna() & (prev_date >= window_start)
+        n_delta += counted.astype(int)
+        d_min = d_min.where(~counted, np.minimum(d_min, d_k))
+        d_max = d_max.where(~counted, np.maximum(d_max, d_k))
+    rule5 = (n_delta >= 5) & ((d_min > 0) | (d_max < 0))
+
+    severity = pd.Series('NONE', index=scores.index, dtype='object')
+    severity[rule1] = 'CRITICAL'
+    severity[rule2 & (severity != 'CRITICAL')] = 'WARNING'
+    severity[(rule3 | rule4) & (severity == 'NONE')] = 'WARNING'
+    severity[rule5 & (severity == 'NONE')] = 'INFO'
+
+    scores['we_rule1'] = rule1.astype(int)
+    scores['we_rule2'] = rule2.astype(int)
+    scores['we_rule3'] = rule3.astype(int)
+    scores['we_rule4'] = rule4.astype(int)
+    scores['we_rule5'] = rule5.astype(int)
+    scores['anomaly_severity'] = severity
+    return scores
+
+
+def score_range(conn, metrics: list, start_date: str, end_date: str,
+                window_days: int, sigma_warning: float, sigma_critical: float):
+    """Compute Z-scores and WE rules for every store/day in [start_date, end_date].
+
+    Reads the KPI window once: window_days + WE_RULE_LOOKBACK days of
+    history before start_date, so the rule windows of the first date are
+    evaluated on Z-scores computed the same way.
+    """
+    require_pandas()
+    first = date.fromisoformat(start_date) - timedelta(days=window_days + WE_RULE_LOOKBACK)
+    kpi = load_kpi_frame(conn, metrics, first.isoformat(), end_date)
+    if kpi.empty:
+        return kpi
+
+    scores = compute_zscores(kpi, metrics, window_days)
+    first_scored = pd.Timestamp(start_date) - pd.Timedelta(days=WE_RULE_LOOKBACK)
+    scores = scores[scores['score_date'] >= first_scored]
+    scores = evaluate_we_rules(scores, sigma_warning, sigma_critical)
+    return scores[scores['score_date'] >= pd.Timestamp(start_date)].reset_index(drop=True)
+
+
+def write_scores(conn, scores, metrics: list) -> int:
+    """Bulk-upsert scored rows into test.store_anomaly_scores.
+
+    WE flags and severity are written explicitly (0/1, 'NONE') so a re-run
+    replaces earlier results instead of only ever setting flags.
+    """
+    if scores is None or len(scores) == 0:
+        return 0
+    stat_cols = [f'{p}_{m}' for m in metrics for p in ('z', 'mean', 'std')]
+    rule_cols = ['we_rule1', 'we_rule2', 'we_rule3', 'we_rule4', 'we_rule5', 'anomaly_severity']
+    cols = ['score_date', 'store_id', 'store_code', 'store_name'] + stat_cols + rule_cols
+
+    sql = f"""
+        INSERT INTO test.store_anomaly_scores (
+            {', '.join(cols)}, created_at
+        ) VALUES ({', '.join(['%s'] * len(cols))}, NOW())
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{c} = VALUES({c})' for c in stat_cols + rule_cols)},
+            created_at = NOW()
+    """
+
+    frame = scores[cols].astype('object')
+    frame = frame.where(frame.notna(), None)
+    frame['score_date'] = scores['score_date'].dt.date
+    frame['store_id'] = scores['store_id'].astype(int)
+    for c in rule_cols[:5]:
+        frame[c] = scores[c].astype(int)
+    values = [tuple(r) for r in frame.itertuples(index=False, name=None)]
+
+    written = 0
+    with conn.cursor() as cur:
+        for i in range(0, len(values), WRITE_BATCH_SIZE):
+            batch = values[i:i + WRITE_BATCH_SIZE]
+            cur.executemany(sql, batch)
+            written += len(batch)
+    conn.commit()
+    return written
+
+
+def compare_scores(expected: dict, computed: dict, metrics: list, tolerance: float = 1e-3) -> list:
+    """Differences between two sets of score rows (SQL vs python engine).
+
+    expected/computed: {key -> row dict}, e.g. keyed by store_id or
+    (store_id, score_date). z/mean/std must match within tolerance (NULL
+    only matches NULL); we_rule1..5 and anomaly_severity exactly. Returns
+    (key, column, expected, computed) tuples; column None means the key
+    is missing on one side.
+    """
+    stat_cols = [f'{p}_{m}' for m in metrics for p in ('z', 'mean', 'std')]
+    rule_cols = ['we_rule1', 'we_rule2', 'we_rule3', 'we_rule4', 'we_rule5', 'anomaly_severity']
+    diffs = []
+    for key in sorted(set(expected) | set(computed)):
+        exp_row, py_row = expected.get(key), computed.get(key)
+        if exp_row is None or py_row is None:
+            diffs.append((key, None, exp_row is not None, py_row is not None))
+            continue
+        for col in stat_cols + rule_cols:
+            a, b = exp_row[col], py_row[col]
+            a = None if a is None else (a if col == 'anomaly_severity' else float(a))
+            b = None if b is None or b != b else b
+            if col == 'anomaly_severity' or col.startswith('we_rule'):
+                same = a == b
+            else:
+                same = (a is None and b is None) or (
+                    a is not None and b is not None and abs(a - b) <= tolerance)
+            if not same:
+                diffs.append((key, col, a, b))
+    return diffs
+
+
+def compute_peer_scores(kpi, metrics: list, peer_keys: dict, age_buckets, min_group: int):
+    """Cross-sectional robust Z-scores against same-day peer stores.
+
+    kpi:         store_kpi_daily rows (load_kpi_frame) for the dates to score
+    peer_keys:   {store_id -> (area_type, opened ISO date or None)}
+    age_buckets: ((max_days_open, name), ...) in ascending order; the
+                 bucket is taken on each kpi_date, older stores and stores
+                 without an opening date are 'mature'
+    Each store/day is compared with the median and MAD of its peers on
+    the same day, using the first level with at least min_group stores:
+    area_type + age bucket, then area_type, then the whole fleet.
+
+        peer_z = (value - median) / (PEER_MAD_SCALE * MAD)
+
+    Returns score_date, store_id, store_code, store_name, peer_group,
+    peer_group_size and peer_z_<metric> columns. Rows with no level of
+    min_group stores keep NULL peer values.
+    """
+    require_pandas()
+    frame = kpi.reset_index(drop=True)
+    keys = frame['store_id'].map(lambda s: peer_keys.get(int(s), ('unknown', None)))
+    frame['area_type'] = keys.str[0]
+    age_days = (frame['kpi_date'] - pd.to_datetime(keys.str[1])).dt.days
+    frame['age_bucket'] = np.select([age_days < max_days for max_days, _ in age_buckets],
+                                    [name for _, name in age_buckets], default='mature')
+    values = frame[list(metrics)]
+
+    levels = [
+        (['kpi_date', 'area_type', 'age_bucket'], frame['area_type'] + ':' + frame['age_bucket']),
+        (['kpi_date', 'area_type'], frame['area_type']),
+        (['kpi_date'], pd.Series('fleet', index=frame.index)),
+    ]
+    median = pd.DataFrame(np.nan, index=frame.index, columns=list(metrics))
+    mad = median.copy()
+    group = pd.Series(None, index=frame.index, dtype='object')
+    group_size = pd.Series(np.nan, index=frame.index)
+
+    for cols, label in levels:
+        by = [frame[c] for c in cols]
+        size = frame.groupby(by)['store_id'].transform('size')
+        use = (size >= min_group) & group.isna()
+        if not use.any():
+            continue
+        level_median = values.groupby(by).transform('median')
+        level_mad = (values - level_median).abs().groupby(by).transform('median')
+        median[use] = level_median[use]
+        mad[use] = level_mad[use]
+        group[use] = label[use]
+        group_size[use] = size[use]
+
+    out = pd.DataFrame({
+        'score_date': frame['kpi_date'],
+        'store_id': frame['store_id'],
+        'store_code': frame['store_code'],
+        'store_name': frame['store_name'],
+        'peer_group': group,
+        'peer_group_size': group_size,
+    })
+    for m in metrics:
+        out[f'peer_z_{m}'] = ((values[m] - median[m])
+                              / (PEER_MAD_SCALE * mad[m].replace(0.0, np.nan))).round(4)
+    return out
+
+
+def write_peer_scores(conn, peers, metrics: list) -> int:
+    """Upsert peer columns into test.store_anomaly_scores.
+
+    Inserts a row for store/days that step 7 skipped (e.g. new stores with
+    no own history), so they are still scored against their peers.
+    """
+    if peers is None or len(peers) == 0:
+        return 0
+    peer_cols = ['peer_group', 'peer_group_size'] + [f'peer_z_{m}' for m in metrics]
+    cols = ['score_date', 'store_id', 'store_code', 'store_name'] + peer_cols
+    sql = f"""
+        INSERT INTO test.store_anomaly_scores (
+            {', '.join(cols)}, created_at
+        ) VALUES ({', '.join(['%s'] * len(cols))}, NOW())
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{c} = VALUES({c})' for c in peer_cols)}
+    """
+
+    frame = peers[cols].astype('object')
+    frame = frame.where(frame.notna(), None)
+    frame['score_date'] = peers['score_date'].dt.date
+    frame['store_id'] = peers['store_id'].astype(int)
+    frame['peer_group_size'] = pd.Series(
+        [None if v is None else int(v) for v in frame['peer_group_size']],
+        index=frame.index, dtype='object')
+    values = [tuple(r) for r in frame.itertuples(index=False, name=None)]
+
+    with conn.cursor() as cur:
+        for i in range(0, len(values), WRITE_BATCH_SIZE):
+            cur.executemany(sql, values[i:i + WRITE_BATCH_SIZE])
+    conn.commit()
+    return len(values)
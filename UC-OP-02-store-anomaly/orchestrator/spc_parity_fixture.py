@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+UC-OP-02: Offline SQL/python SPC parity check on a synthetic KPI fixture
+SPC引擎离线一致性校验（合成KPI数据，无需数据库）
+
+Builds a synthetic store_kpi_daily window whose stores trigger each Western
+Electric rule (plus gaps, NULL values, a constant metric and a store with
+little history). Then it checks spc_engine.score_range against the results
+steps 7 and 8 of run_pipeline.py would store. The expected side is a
+row-by-row transcription of that SQL:
+
+  step 7  AVG/STDDEV over hist.kpi_date in [d - 28, d), rounded to 4 dp;
+          z from the rounded mean/std; no history rows -> no score row
+  step 8  the five UPDATEs in order on a fresh row (severity 'NONE'),
+          each with its severity CASE, rule 5 included
+
+No database is needed; exits 0 when every row matches. Run it after
+changing spc_engine.py or the step 7/8 SQL:
+
+  python spc_parity_fixture.py
+
+Dependencies: numpy, pandas
+"""
+
+import math
+import random
+import sys
+from datetime import date, timedelta
+
+import spc_engine
+
+# Same values as run_pipeline.py (not imported: it needs pymysql)
+ROLLING_WINDOW = 28
+SIGMA_WARNING = 2
+SIGMA_CRITICAL = 3
+SPC_METRICS = [
+    'revenue', 'order_count', 'aov',
+    'production_count', 'avg_production_time_sec',
+    'scheduled_hours', 'employee_count',
+    'inspection_count', 'avg_quality_score',
+    'revenue_per_labor_hour', 'orders_per_labor_hour',
+]
+
+FIRST_DAY = date(2026, 1, 1)
+HISTORY_DAYS = 45               # days before the scored range
+SCORE_DAYS = 14                 # days scored (start_date..end_date)
+
+
+# ---------------------------------------------------------------------------
+# FIXTURE
+# ---------------------------------------------------------------------------
+
+def _revenue(store_id: int, day: int, rng) -> float:
+    """Revenue pattern per store; day 0 is the first scored date."""
+    noise = rng.gauss(0, 100)
+    if store_id == 1:                                   # rule 1: single 3-sigma spike
+        return 5000 + noise + (1500 if day == 6 else 0)
+    if store_id == 2:                                   # rule 2: 2 of 3 beyond 2 sigma
+        return 5000 + noise + (260 if day in (9, 11) else 0)
+    if store_id == 3:                                   # rule 5 only: six small rises
+        if day == 6:
+            return 4800.0
+        return 5000 + 20 * (day - 6) if 7 <= day <= 12 else 5000 + noise
+    if store_id == 4:                                   # rules 3/4: level shift
+        return 5000 + noise / 4 + (250 if day >= 2 else 0)
+    return 5000 + noise
+
+
+def build_kpi_rows(seed: int = 7) -> list:
+    """store_kpi_daily rows (kpi_date, store_id, store_code, store_name, *SPC_METRICS)."""
+    rng = random.Random(seed)
+    rows = []
+    for store_id in range(1, 7):
+        for offset in range(HISTORY_DAYS + SCORE_DAYS):
+            day = offset - HISTORY_DAYS
+            kpi_date = FIRST_DAY + timedelta(days=offset)
+            if store_id == 5 and offset % 5 == 2:               # gaps
+                continue
+            if store_id == 6 and day < -3:                      # new store: short history
+                continue
+            values = {
+                'revenue': round(_revenue(store_id, day, rng), 2),
+                'order_count': rng.randint(380, 420),
+                'aov': round(rng.uniform(11.5, 13.5), 2),
+                'production_count': rng.randint(400, 460),
+                'avg_production_time_sec': round(rng.uniform(80, 120), 2),
+                'scheduled_hours': 64.0,                        # constant -> std 0, z NULL
+                'employee_count': rng.randint(7, 9),
+                'inspection_count': rng.choice([None, 0, 1]),   # mostly NULL/sparse
+                'avg_quality_score': None if offset % 3 else round(rng.uniform(85, 99), 2),
+                'revenue_per_labor_hour': round(rng.uniform(70, 90), 2),
+                'orders_per_labor_hour': round(rng.uniform(5.5, 7.0), 2),
+            }
+            if store_id == 5 and offset % 7 == 3:               # NULL revenue
+                values['revenue'] = None
+            rows.append((kpi_date, store_id, f'US{store_id:05d}', f'Store {store_id}')
+                        + tuple(values[m] for m in SPC_METRICS))
+    return rows
+
+
+class FixtureConnection:
+    """Answers load_kpi_frame's single SELECT from the fixture rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        start, end = (date.fromisoformat(p) for p in params)
+        self._result = sorted((r for r in self.rows if start <= r[0] <= end),
+                              key=lambda r: (r[1], r[0]))
+
+    def fetchall(self):
+        return self._result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# ---------------------------------------------------------------------------
+# EXPECTED RESULTS (step 7/8 SQL, row by row)
+# ---------------------------------------------------------------------------
+
+def _round(value, digits: int = 4):
+    """MySQL ROUND (half away from zero); None stays None."""
+    if value is None:
+        return None
+    scale = 10 ** digits
+    return math.copysign(math.floor(abs(value) * scale + 0.5), value) / scale
+
+
+def sql_step_07(rows: list) -> dict:
+    """{(store_id, score_date) -> z/mean/std row} as step 7 inserts them."""
+    by_store = {}
+    for r in rows:
+        by_store.setdefault(r[1], []).append(r)
+    scores = {}
+    for store_id, store_rows in by_store.items():
+        for r in store_rows:
+            d = r[0]
+            hist = [h for h in store_rows if d - timedelta(days=ROLLING_WINDOW) <= h[0] < d]
+            if not hist:                                # INNER JOIN: no rolling row
+                continue
+            row = {}
+            for i, m in enumerate(SPC_METRICS):
+                values = [h[4 + i] for h in hist if h[4 + i] is not None]
+                mean = std = None
+                if values:
+                    mean = _round(sum(values) / len(values))
+                    std = _round(math.sqrt(sum((v - sum(values) / len(values)) ** 2
+                                               for v in values) / len(values)))
+                x = r[4 + i]
+                z = None
+                if x is not None and mean is not None and std:  # NULLIF(std, 0)
+                    z = _round((x - mean) / std)
+                row[f'z_{m}'], row[f'mean_{m}'], row[f'std_{m}'] = z, mean, std
+            scores[(store_id, d)] = row
+    return scores
+
+
+def sql_step_08(scores: dict, run_date: date) -> None:
+    """Apply the five step 8 UPDATEs for run_date to fresh score rows."""
+    def window(store_id, days):
+        return [(d, s) for (sid, d), s in sorted(scores.items())
+                if sid == store_id and run_date - timedelta(days=days) <= d <= run_date]
+
+    for (store_id, d), row in scores.items():
+        if d != run_date:
+            continue
+        row.update(we_rule1=0, we_rule2=0, we_rule3=0, we_rule4=0, we_rule5=0,
+                   anomaly_severity='NONE')
+
+        zr, zo = row['z_revenue'], row['z_order_count']
+        if (zr is not None and abs(zr) >= SIGMA_CRITICAL) or (
+                zo is not None and abs(zo) >= SIGMA_CRITICAL):
+            row['we_rule1'], row['anomaly_severity'] = 1, 'CRITICAL'
+
+        z2 = [s['z_revenue'] for _, s in window(store_id, 2) if s['z_revenue'] is not None]
+        if z2 and sum(abs(z) >= SIGMA_WARNING for z in z2) >= 2:
+            row['we_rule2'] = 1
+            if row['anomaly_severity'] != 'CRITICAL':
+                row['anomaly_severity'] = 'WARNING'
+
+        z3 = [s['z_revenue'] for _, s in window(store_id, 4) if s['z_revenue'] is not None]
+        if z3 and sum(abs(z) >= 1 for z in z3) >= 4:
+            row['we_rule3'] = 1
+            if row['anomaly_severity'] not in ('CRITICAL', 'WARNING'):
+                row['anomaly_severity'] = 'WARNING'
+
+        w4 = window(store_id, 7)
+        z4 = [s['z_revenue'] for _, s in w4 if s['z_revenue'] is not None]
+        if len(w4) >= 8 and z4 and (min(z4) > 0 or max(z4) < 0):
+            row['we_rule4'] = 1
+            if row['anomaly_severity'] not in ('CRITICAL', 'WARNING'):
+                row['anomaly_severity'] = 'WARNING'
+
+        z5 = [s['z_revenue'] for _, s in window(store_id, 5)]
+        deltas = [b - a for a, b in zip(z5, z5[1:]) if a is not None and b is not None]
+        if len(deltas) >= 5 and (min(deltas) > 0 or max(deltas) < 0):
+            row['we_rule5'] = 1
+            if row['anomaly_severity'] not in ('CRITICAL', 'WARNING'):
+                row['anomaly_severity'] = 'INFO'
+
+
+def expected_scores(rows: list, start: date, end: date) -> dict:
+    scores = sql_step_07(rows)
+    day = start
+    while day <= end:
+        sql_step_08(scores, day)
+        day += timedelta(days=1)
+    return {k: v for k, v in scores.items() if start <= k[1] <= end}
+
+
+# ---------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------
+
+def main() -> int:
+    rows = build_kpi_rows()
+    start = FIRST_DAY + timedelta(days=HISTORY_DAYS)
+    end = start + timedelta(days=SCORE_DAYS - 1)
+
+    expected = expected_scores(rows, start, end)
+    scores = spc_engine.score_range(FixtureConnection(rows), SPC_METRICS,
+                                    start.isoformat(), end.isoformat(),
+                                    ROLLING_WINDOW, SIGMA_WARNING, SIGMA_CRITICAL)
+    computed = {(int(r['store_id']), r['score_date'].date()): r
+                for r in scores.to_dict('records')}
+
+    # The fixture only guards the rules it exercises
+    fired = {col: sum(r[col] for r in expected.values())
+             for col in ('we_rule1', 'we_rule2', 'we_rule3', 'we_rule4', 'we_rule5')}
+    severities = {r['anomaly_severity'] for r in expected.values()}
+    missing = [col for col, n in fired.items() if not n]
+    missing += [s for s in ('CRITICAL', 'WARNING', 'INFO') if s not in severities]
+
+    diffs = spc_engine.compare_scores(expected, computed, SPC_METRICS)
+    for key, col, a, b in diffs[:50]:
+        if col is None:
+            print(f"  {key}: only in {'SQL' if a else 'python'} results")
+        else:
+            print(f"  {key} {col:<32} sql={a} python={b}")
+
+    print(f"SPC parity fixture: {len(expected)} store-days, rules fired "
+          f"{', '.join(f'{c[3:]}={n}' for c, n in fired.items())}, {len(diffs)} mismatches")
+    if missing:
+        print(f"Fixture does not exercise: {', '.join(missing)}")
+    return 0 if not diffs and not missing else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
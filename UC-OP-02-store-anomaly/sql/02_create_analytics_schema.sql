@@ -13,6 +13,11 @@
 --   3. test.store_health_scores      - Composite health per store/day / 门店综合健康评分
 --   4. test.store_anomaly_alerts     - Alert records / 异常预警记录
 --   5. test.store_anomaly_pipeline_log - Execution tracking / 管道执行日志
+--   6. test.store_kpi_hourly         - Hourly KPI fact table / 每店每小时KPI事实表
+--   7. test.store_intraday_scores    - Same-hour/same-weekday Z-scores / 日内同时段异常评分
+--   8. test.store_kpi_watermark      - Per-source extraction watermark / 源库增量抽取水位
+--   9. test.store_health_weights     - Health score dimension weights / 健康评分维度权重
+--  10. test.dim_store                - Store dimension shared with UC-SC-01 / 共享门店维度
 --
 -- Usage:    Execute this script once to initialize the schema.
 --           Re-running is safe (uses DROP IF EXISTS + CREATE IF NOT EXISTS).
@@ -337,6 +342,230 @@ CREATE TABLE IF NOT EXISTS test.store_anomaly_pipeline_log (
   COMMENT='UC-OP-02: 管道执行日志 / SPC anomaly detection pipeline execution tracking';
 
 
+-- ============================================================
+-- TABLE 6: store_kpi_hourly
+-- 每店每小时KPI指标表 / Hourly KPI fact table
+-- ============================================================
+-- One row per (store, date, hour), loaded by
+-- `run_pipeline.py --intraday`, which touches only the newest
+-- completed hour on each run. Hours with no orders are zero-filled
+-- so that an outage shows up as 0 orders, not as a missing row.
+-- 每个门店每小时一行，由 --intraday 模式每小时增量写入（仅最新
+-- 一个完整小时）。无订单的小时补0，使停业/故障表现为0而非缺行。
+-- ============================================================
+
+DROP TABLE IF EXISTS test.store_kpi_hourly;
+
+CREATE TABLE IF NOT EXISTS test.store_kpi_hourly (
+    id                      BIGINT          AUTO_INCREMENT PRIMARY KEY
+                                                            COMMENT '自增主键 / Auto-increment primary key',
+    kpi_date                DATE            NOT NULL        COMMENT '业务日期 / Business date',
+    kpi_hour                TINYINT         NOT NULL        COMMENT '小时 0-23 (源库本地时间) / Hour of day, source local time',
+    store_id                BIGINT          NOT NULL        COMMENT '门店ID (dept_id) / Store ID',
+    store_code              VARCHAR(20)                     COMMENT '门店编号 e.g. US00001 / Shop number',
+    store_name              VARCHAR(100)                    COMMENT '门店名称 / Shop name',
+
+    -- Revenue KPIs (t_order) / 收入KPI
+    revenue                 DECIMAL(12,2)                   COMMENT '小时收入(USD) / Hourly revenue in USD',
+    order_count             INT                             COMMENT '小时订单数 / Hourly order count',
+    aov                     DECIMAL(10,2)                   COMMENT '平均订单金额 / Average order value',
+
+    -- Operations KPIs (t_production) / 运营KPI
+    production_count        INT                             COMMENT '小时出品数 / Hourly items produced',
+    avg_production_time_sec DECIMAL(10,2)                   COMMENT '平均出品时间(秒) / Avg seconds per production',
+
+    -- Metadata / 元数据
+    created_at              TIMESTAMP       DEFAULT CURRENT_TIMESTAMP
+                                                            COMMENT '记录创建时间 / Row creation timestamp',
+    updated_at              TIMESTAMP       DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                                                            COMMENT '记录更新时间 / Row last update timestamp',
+
+    -- Constraints & Indexes / 约束和索引
+    UNIQUE KEY uk_date_hour_store (kpi_date, kpi_hour, store_id),
+    INDEX idx_store_hour_date     (store_id, kpi_hour, kpi_date)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COMMENT='UC-OP-02: 每店每小时KPI指标 / Hourly KPI metrics per store';
+
+
+-- ============================================================
+-- TABLE 7: store_intraday_scores
+-- 日内异常评分表 / Intraday Z-scores per store/hour
+-- ============================================================
+-- Each hour is compared with the same hour on the same weekday
+-- over the previous DOW_WEEKS (8) weeks. A store/hour is scored
+-- only when at least 4 baseline samples exist.
+-- 每个小时与过去8周同一星期几的同一小时比较；基线样本不少于4个
+-- 才计算评分。
+-- ============================================================
+
+DROP TABLE IF EXISTS test.store_intraday_scores;
+
+CREATE TABLE IF NOT EXISTS test.store_intraday_scores (
+    id                      BIGINT          AUTO_INCREMENT PRIMARY KEY
+                                                            COMMENT '自增主键 / Auto-increment primary key',
+    score_date              DATE            NOT NULL        COMMENT '评分日期 / Score date',
+    score_hour              TINYINT         NOT NULL        COMMENT '小时 0-23 / Hour of day',
+    store_id                BIGINT          NOT NULL        COMMENT '门店ID / Store ID',
+    store_code              VARCHAR(20)                     COMMENT '门店编号 / Shop number',
+    store_name              VARCHAR(100)                    COMMENT '门店名称 / Store name',
+
+    revenue                 DECIMAL(12,2)                   COMMENT '小时收入 / Hourly revenue',
+    z_revenue               DECIMAL(8,4)                    COMMENT '收入Z分数 / Revenue Z-score vs same hour/weekday',
+    mean_revenue            DECIMAL(14,4)                   COMMENT '同时段收入均值 / Baseline mean',
+    std_revenue             DECIMAL(14,4)                   COMMENT '同时段收入标准差 / Baseline std',
+
+    order_count             INT                             COMMENT '小时订单数 / Hourly orders',
+    z_order_count           DECIMAL(8,4)                    COMMENT '订单数Z分数 / Order count Z-score',
+    mean_order_count        DECIMAL(14,4)                   COMMENT '同时段订单均值 / Baseline mean',
+    std_order_count         DECIMAL(14,4)                   COMMENT '同时段订单标准差 / Baseline std',
+
+    production_count        INT                             COMMENT '小时出品数 / Hourly productions',
+    z_production_count      DECIMAL(8,4)                    COMMENT '出品数Z分数 / Production count Z-score',
+    mean_production_count   DECIMAL(14,4)                   COMMENT '同时段出品均值 / Baseline mean',
+    std_production_count    DECIMAL(14,4)                   COMMENT '同时段出品标准差 / Baseline std',
+
+    baseline_weeks          TINYINT                         COMMENT '基线样本数(周) / Baseline samples used',
+    anomaly_severity        ENUM('WARNING','CRITICAL')      NULL
+                                                            COMMENT '异常严重度 / max(|z_revenue|, |z_order_count|) >= 2 / 3',
+
+    -- Metadata / 元数据
+    created_at              TIMESTAMP       DEFAULT CURRENT_TIMESTAMP
+                                                            COMMENT '记录创建时间 / Row creation timestamp',
+
+    -- Constraints & Indexes / 约束和索引
+    UNIQUE KEY uk_date_hour_store (score_date, score_hour, store_id),
+    INDEX idx_severity            (anomaly_severity, score_date)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COMMENT='UC-OP-02: 日内同时段异常评分 / Intraday same-hour anomaly scores';
+
+
+-- ============================================================
+-- TABLE 8: store_kpi_watermark
+-- 源库增量抽取水位表 / Per-source extraction high-watermark
+-- ============================================================
+-- One row per KPI source (revenue, production, staffing, quality).
+-- watermark_ts is the max time column (create_time / schedule_date
+-- / check_time) seen by the last successful run. It only moves
+-- forward, and only after that run's KPI merge is committed. The
+-- next run re-aggregates from DATE(watermark_ts - LATE_ARRIVAL_HOURS)
+-- to the run date instead of the full LOOKBACK_DAYS window.
+-- 每个源一行；记录已处理的最大时间。下次运行只重新汇总
+-- 水位(减去迟到窗口)所在日期至运行日期的数据。
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS test.store_kpi_watermark (
+    source_name             VARCHAR(30)     NOT NULL PRIMARY KEY
+                                                            COMMENT '源名称 revenue/production/staffing/quality / KPI source',
+    watermark_ts            DATETIME        NOT NULL        COMMENT '已处理的最大时间 / Max source time column processed',
+    last_run_id             VARCHAR(36)                     COMMENT '最近运行ID / Last pipeline run id',
+    last_run_date           DATE                            COMMENT '最近运行日期 / Last run date',
+    last_rows               INT                             COMMENT '最近抽取行数 / Rows extracted by last run',
+    updated_at              TIMESTAMP       DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                                                            COMMENT '更新时间 / Last update timestamp'
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COMMENT='UC-OP-02: 源库增量抽取水位 / Incremental extraction watermarks';
+
+
+-- ============================================================
+-- TABLE 9: store_health_weights
+-- 健康评分维度权重表 / Health score dimension weights
+-- ============================================================
+-- Read by step 9 on every run, so weights are tuned with an
+-- UPDATE instead of a code change. Dimensions missing here fall
+-- back to HEALTH_WEIGHTS in run_pipeline.py. Weights should sum
+-- to 1.0 (the pipeline logs a warning otherwise).
+-- 步骤9每次运行读取该表；调整权重只需UPDATE，无需改代码。
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS test.store_health_weights (
+    dimension               VARCHAR(20)     NOT NULL PRIMARY KEY
+                                                            COMMENT '维度 revenue/ops/quality/staffing/customer / Health dimension',
+    weight                  DECIMAL(5,4)    NOT NULL        COMMENT '权重 / Weight in composite score',
+    updated_at              TIMESTAMP       DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                                                            COMMENT '更新时间 / Last update timestamp'
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COMMENT='UC-OP-02: 健康评分维度权重 / Health score weights';
+
+-- Seed defaults (matches HEALTH_WEIGHTS); existing tuned rows are kept
+-- 初始权重（与HEALTH_WEIGHTS一致）；已调整的权重不会被覆盖
+INSERT IGNORE INTO test.store_health_weights (dimension, weight) VALUES
+    ('revenue',  0.40),
+    ('ops',      0.20),
+    ('quality',  0.15),
+    ('staffing', 0.15),
+    ('customer', 0.10);
+
+
+-- ============================================================
+-- TABLE 10: dim_store
+-- 门店维度表（与UC-SC-01共享）/ Store dimension shared with UC-SC-01
+-- ============================================================
+-- Shared by UC-SC-01 and UC-OP-02 (both DDL files define it identically;
+-- never dropped by either). Each pipeline upserts its cached opshop store
+-- registry at the start of a run; attributes a pipeline does not know
+-- (address, area_type from UC-SC-01) are left as they are. UC-SC-01 joins
+-- it in COMPUTE_ACCURACY so forecast_accuracy_daily is written with
+-- shop_name in a single pass.
+-- 两个项目共用的门店维度，由各自管道在运行开始时从门店注册表同步。
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS test.dim_store (
+    store_id            BIGINT          NOT NULL    COMMENT '门店ID (t_shop_info.dept_id) / Store ID',
+    store_code          VARCHAR(32)                 COMMENT '门店编号 e.g. US00001 / Store code (dept_code)',
+    store_name          VARCHAR(200)                COMMENT '门店名称 / Store name (dept_name)',
+    address             VARCHAR(500)                COMMENT '门店地址 / Address (UC-OP-02 only)',
+    status              INT                         COMMENT '门店状态 1=营业 / t_shop_info.status (1 = open)',
+    opened_date         DATE                        COMMENT '开业日期 / set_up_time',
+    area_type           VARCHAR(50)                 COMMENT '商圈类型 / Area type (UC-OP-02, site-selection CSV)',
+    updated_at          TIMESTAMP       DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                                                    COMMENT '更新时间 / Changed only when an attribute changes',
+
+    PRIMARY KEY (store_id),
+    INDEX idx_store_code (store_code)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci
+  COMMENT='UC-SC-01 / UC-OP-02: 共享门店维度 / Shared store dimension';
+
+
+
+-- ============================================================
+-- MIGRATION: store_anomaly_scores peer-group columns
+-- 迁移：store_anomaly_scores 同类组评分列
+-- ============================================================
+-- Written by the optional peer-score step (--peer-scores /
+-- PEER_SCORES=1). peer_z_<metric> = (x - median) / (1.4826 * MAD)
+-- across same-day stores in the same area type and age bucket
+-- (falling back to area type, then the whole fleet). Run once;
+-- re-running fails with "Duplicate column name" and can be ignored.
+-- 同类组稳健Z分数：按商圈类型+店龄分组的当日中位数/MAD。仅需执行一次。
+-- ============================================================
+
+ALTER TABLE test.store_anomaly_scores
+    ADD COLUMN peer_group                     VARCHAR(60)  NULL COMMENT '同类组 area_type:age_bucket / area_type / fleet / Peer group used',
+    ADD COLUMN peer_group_size                INT          NULL COMMENT '同类组门店数 / Stores in the peer group that day',
+    ADD COLUMN peer_z_revenue                 DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (revenue)',
+    ADD COLUMN peer_z_order_count             DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (order_count)',
+    ADD COLUMN peer_z_aov                     DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (aov)',
+    ADD COLUMN peer_z_production_count        DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (production_count)',
+    ADD COLUMN peer_z_avg_production_time_sec DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (avg_production_time_sec)',
+    ADD COLUMN peer_z_scheduled_hours         DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (scheduled_hours)',
+    ADD COLUMN peer_z_employee_count          DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (employee_count)',
+    ADD COLUMN peer_z_inspection_count        DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (inspection_count)',
+    ADD COLUMN peer_z_avg_quality_score       DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (avg_quality_score)',
+    ADD COLUMN peer_z_revenue_per_labor_hour  DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (revenue_per_labor_hour)',
+    ADD COLUMN peer_z_orders_per_labor_hour   DECIMAL(8,4) NULL COMMENT '同类稳健Z / Peer robust Z (orders_per_labor_hour)';
+
+
 -- ============================================================
 -- VERIFICATION QUERIES
 -- 验证查询 — Run after table creation to confirm success
@@ -354,7 +583,12 @@ WHERE  TABLE_SCHEMA = 'test'
            'store_anomaly_scores',
            'store_health_scores',
            'store_anomaly_alerts',
-           'store_anomaly_pipeline_log'
+           'store_anomaly_pipeline_log',
+           'store_kpi_hourly',
+           'store_intraday_scores',
+           'store_kpi_watermark',
+           'store_health_weights',
+           'dim_store'
        )
 ORDER BY TABLE_NAME;
 
@@ -364,8 +598,13 @@ DESCRIBE test.store_anomaly_scores;
 DESCRIBE test.store_health_scores;
 DESCRIBE test.store_anomaly_alerts;
 DESCRIBE test.store_anomaly_pipeline_log;
+DESCRIBE test.store_kpi_hourly;
+DESCRIBE test.store_intraday_scores;
+DESCRIBE test.store_kpi_watermark;
+DESCRIBE test.store_health_weights;
+DESCRIBE test.dim_store;
 
--- 3. Count tables created (expect 5) / 统计已创建的表数（预期5张）
+-- 3. Count tables created (expect 9) / 统计已创建的表数（预期9张）
 SELECT COUNT(*) AS tables_created
 FROM   information_schema.TABLES
 WHERE  TABLE_SCHEMA = 'test'
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+UC-SC-01: Parquet archive and local query helper for forecast accuracy history
+预测准确性历史的Parquet归档与本地查询
+
+The pipeline (step 6b, see run_pipeline.archive_daily) writes every processed
+day of test.forecast_accuracy_daily to a Hive-partitioned Parquet dataset:
+
+  $ARCHIVE_DIR/forecast_accuracy_daily/accuracy_date=2026-02-14/part-0.parquet
+
+A re-run of a day replaces its partition (write to a temp file, then rename),
+so the archive stays in step with MySQL. Long-range analyses then run
+locally with DuckDB instead of scanning the dbatest instance:
+
+  python archive.py "SELECT goods_code, AVG(absolute_pct_error) AS mape
+                     FROM forecast_accuracy_daily
+                     WHERE accuracy_date >= DATE '2025-03-01'
+                     GROUP BY 1 ORDER BY 2 DESC LIMIT 20"
+
+  # or from Python / a notebook
+  from archive import connect
+  con = connect()
+  df = con.sql("SELECT ... FROM forecast_accuracy_daily ...").df()
+
+Backfill the archive for existing history with
+  python run_pipeline.py --start-date 2025-08-01 --end-date 2026-02-14 --archive-only
+
+The same Parquet writer backs the spill files of --resume checkpoints
+(spill_chunks / read_spill): rows extracted from a source server are
+kept so a resumed run does not query the source again.
+
+Dependencies: pyarrow (writing, spill files), duckdb (querying)
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "")   # empty = archive disabled in the pipeline
+DAILY_DATASET = "forecast_accuracy_daily"
+PARQUET_COMPRESSION = "zstd"
+
+# forecast_accuracy_daily columns in the Parquet files; accuracy_date is the
+# partition key and comes from the directory name.
+DAILY_COLUMNS = [
+    "shop_dept_id", "shop_name", "goods_code", "goods_name", "large_class_name",
+    "predicted_demand", "predicted_order_qty", "actual_consumption",
+    "absolute_error", "absolute_pct_error", "forecast_error", "bias_pct", "squared_error",
+    "prediction_dt", "task_version_id",
+]
+
+
+def require_pyarrow():
+    """Raise a clear error when archiving is enabled without pyarrow."""
+    if pa is None:
+        raise RuntimeError("pyarrow not installed -- required for ARCHIVE_DIR. Run: pip install pyarrow")
+
+
+def require_duckdb():
+    """Raise a clear error when querying without duckdb."""
+    if duckdb is None:
+        raise RuntimeError("duckdb not installed -- required to query the archive. Run: pip install duckdb")
+
+
+def daily_schema():
+    """Parquet schema for DAILY_COLUMNS (types as in the MySQL DDL)."""
+    require_pyarrow()
+    return pa.schema([
+        ("shop_dept_id", pa.int64()),
+        ("shop_name", pa.string()),
+        ("goods_code", pa.string()),
+        ("goods_name", pa.string()),
+        ("large_class_name", pa.string()),
+        ("predicted_demand", pa.decimal128(12, 2)),
+        ("predicted_order_qty", pa.decimal128(12, 2)),
+        ("actual_consumption", pa.decimal128(12, 2)),
+        ("absolute_error", pa.decimal128(12, 2)),
+        ("absolute_pct_error", pa.decimal128(10, 4)),
+        ("forecast_error", pa.decimal128(12, 2)),
+        ("bias_pct", pa.decimal128(10, 4)),
+        ("squared_error", pa.decimal128(20, 4)),
+        ("prediction_dt", pa.string()),
+        ("task_version_id", pa.int64()),
+    ])
+
+
+def actuals_schema():
+    """Parquet schema of extracted actuals (ACTUAL_COLUMNS in run_pipeline)."""
+    require_pyarrow()
+    return pa.schema([
+        ("consumption_date", pa.date32()),
+        ("shop_dept_id", pa.int64()),
+        ("goods_mid", pa.string()),
+        ("actual_consumption", pa.decimal128(38, 10)),   # SUM(ABS(...)): scale of the source column
+        ("record_count", pa.int64()),
+    ])
+
+
+def _chunk_table(chunk, schema):
+    """Row chunk (list of tuples in schema order) -> pyarrow Table."""
+    columns = list(zip(*chunk))
+    return pa.Table.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema)
+
+
+def spill_chunks(chunks, path, schema):
+    """Pass row chunks through while writing them to a Parquet spill file.
+
+    The file only appears at path once chunks is exhausted, so an
+    interrupted extract never looks complete.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    writer = pq.ParquetWriter(tmp, schema, compression=PARQUET_COMPRESSION)
+    try:
+        for chunk in chunks:
+            writer.write_table(_chunk_table(chunk, schema))
+            yield chunk
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+
+
+def read_spill(path, batch_size: int):
+    """Yield the rows of a spill file as lists of tuples, batch_size rows at a time."""
+    require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield list(zip(*(column.to_pylist() for column in batch.columns)))
+
+
+def partition_path(archive_dir, day) -> Path:
+    """Directory of one day's partition."""
+    return Path(archive_dir) / DAILY_DATASET / f"accuracy_date={day}"
+
+
+def write_daily_partition(archive_dir, day, chunks) -> int:
+    """Replace the partition of `day` with the given row chunks. Returns rows written.
+
+    chunks yields lists of tuples in DAILY_COLUMNS order (see stream_query).
+    Row groups are written per chunk. A day without rows drops its partition.
+    """
+    schema = daily_schema()
+    target_dir = partition_path(archive_dir, day)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    target = target_dir / "part-0.parquet"
+    tmp = target_dir / ".part-0.parquet.tmp"
+
+    rows = 0
+    writer = pq.ParquetWriter(tmp, schema, compression=PARQUET_COMPRESSION)
+    try:
+        for chunk in chunks:
+            writer.write_table(_chunk_table(chunk, schema))
+            rows += len(chunk)
+    finally:
+        writer.close()
+
+    if rows:
+        os.replace(tmp, target)
+    else:
+        tmp.unlink()
+        target.unlink(missing_ok=True)
+        target_dir.rmdir()
+    return rows
+
+
+def connect(archive_dir=None):
+    """DuckDB connection with the archive exposed as view forecast_accuracy_daily."""
+    require_duckdb()
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not archive_dir:
+        raise RuntimeError("ARCHIVE_DIR not set")
+    pattern = str(Path(archive_dir) / DAILY_DATASET / "*" / "*.parquet").replace("'", "''")
+    con = duckdb.connect()
+    con.execute(f"""
+        CREATE VIEW {DAILY_DATASET} AS
+        SELECT * FROM read_parquet('{pattern}', hive_partitioning = true,
+                                   hive_types = {{'accuracy_date': DATE}})
+    """)
+    return con
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the UC-SC-01 Parquet archive with DuckDB")
+    parser.add_argument("sql", help="SQL over the view forecast_accuracy_daily")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="Archive root (default: $ARCHIVE_DIR)")
+    parser.add_argument("--csv", type=str, help="Write the result to this CSV file instead of printing")
+    args = parser.parse_args()
+
+    try:
+        con = connect(args.archive_dir)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    result = con.sql(args.sql)
+    if args.csv:
+        result.write_csv(args.csv)
+        print(f"Wrote {args.csv}")
+    else:
+        result.show(max_rows=100)
+
+
+if __name__ == "__main__":
+    main()
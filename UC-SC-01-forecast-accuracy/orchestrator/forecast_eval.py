@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+UC-SC-01: Probabilistic forecast evaluation (pinball loss, coverage, MASE)
+概率预测评估（分位数损失、区间覆盖率、MASE）
+
+Columnar evaluation of the point forecasts in test.forecast_accuracy_daily.
+ireplenishment only publishes a point forecast (vlt_avg_demand), so quantile
+forecasts are built empirically per store-SKU:
+
+  - quantile forecast q_tau = max(0, forecast + tau-quantile of the same
+    store-SKU's residuals (actual - forecast) over the calibration window)
+  - pinball loss      = max(tau * (y - q_tau), (tau - 1) * (y - q_tau))
+  - interval coverage = y within [q_P10, q_P90] (80% nominal)
+  - MASE scaled error = |forecast - y| / in-sample MAE of the seasonal-naive
+                        forecast (y SEASON_DAYS earlier) over the window
+
+The calibration window is the calibration_days before each evaluation
+window (evaluation days excluded). Store-SKUs with fewer than
+MIN_CALIBRATION_POINTS residuals get no quantiles; no seasonal-naive pair
+or a zero naive MAE gives no scaled error.
+
+Everything runs on flat arrays: groups are contiguous slices after one
+sort, per-group statistics use np.bincount, and the seasonal-naive lookup
+is a single np.searchsorted. There is no per-row or per-group Python loop.
+
+Dependencies: numpy
+"""
+
+import numpy as np
+
+QUANTILES = (0.1, 0.5, 0.9)
+INTERVAL = (0.1, 0.9)          # central interval for coverage; both must be in QUANTILES
+SEASON_DAYS = 7                # seasonal-naive lag (same weekday last week)
+MIN_CALIBRATION_POINTS = 7     # residuals needed before a store-SKU gets quantiles
+
+
+def columns_from_chunks(chunks) -> dict:
+    """Row chunks of (day, shop_dept_id, goods_code, forecast, actual) -> column arrays.
+
+    day is an integer day offset (e.g. DATEDIFF against a base date).
+    """
+    parts = {"day": [], "shop_dept_id": [], "goods_code": [], "forecast": [], "actual": []}
+    for chunk in chunks:
+        day, shop, goods, forecast, actual = zip(*chunk)
+        parts["day"].append(np.array(day, dtype=np.int64))
+        parts["shop_dept_id"].append(np.array(shop, dtype=np.int64))
+        parts["goods_code"].append(np.array(goods, dtype=str))
+        parts["forecast"].append(np.array(forecast, dtype=np.float64))
+        parts["actual"].append(np.array(actual, dtype=np.float64))
+    if not parts["day"]:
+        return {
+            "day": np.empty(0, dtype=np.int64), "shop_dept_id": np.empty(0, dtype=np.int64),
+            "goods_code": np.empty(0, dtype=str),
+            "forecast": np.empty(0), "actual": np.empty(0),
+        }
+    return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+
+def key_ids(shop, goods) -> tuple:
+    """Dense integer ids for (store, SKU) pairs. Returns (ids, n_keys)."""
+    if not len(shop):
+        return np.empty(0, dtype=np.int64), 0
+    goods_values, goods_idx = np.unique(goods, return_inverse=True)
+    pair = shop * len(goods_values) + goods_idx
+    keys, ids = np.unique(pair, return_inverse=True)
+    return ids.reshape(-1), len(keys)
+
+
+def seasonal_naive(key, day, actual, season: int = SEASON_DAYS):
+    """Actual of the same key `season` days earlier for every row (NaN if absent)."""
+    naive = np.full(len(day), np.nan)
+    if not len(day):
+        return naive
+    offset = day - day.min()
+    span = offset.max() + season + 1      # lag never reaches into the previous key's range
+    code = key * span + offset
+    order = np.argsort(code, kind="stable")
+    sorted_code = code[order]
+    pos = np.minimum(np.searchsorted(sorted_code, code - season), len(code) - 1)
+    hit = sorted_code[pos] == code - season
+    naive[hit] = actual[order[pos[hit]]]
+    return naive
+
+
+def group_quantiles(key, values, n_keys: int, quantiles, min_count: int) -> tuple:
+    """Per-key quantiles, interpolated as np.quantile does.
+
+    Returns (quantiles [n_keys x len(quantiles)], counts [n_keys]); rows
+    of keys with fewer than min_count values are NaN.
+    """
+    out = np.full((n_keys, len(quantiles)), np.nan)
+    counts = np.bincount(key, minlength=n_keys)
+    if not len(key):
+        return out, counts
+    sorted_values = values[np.lexsort((values, key))]
+    starts = np.cumsum(counts) - counts
+    ok = counts >= max(min_count, 1)
+    n, start = counts[ok], starts[ok]
+    for j, tau in enumerate(quantiles):
+        h = tau * (n - 1)
+        lo = np.floor(h).astype(np.int64)
+        hi = np.ceil(h).astype(np.int64)
+        low = sorted_values[start + lo]
+        out[ok, j] = low + (h - lo) * (sorted_values[start + hi] - low)
+    return out, counts
+
+
+def group_mean(key, values, n_keys: int):
+    """Per-key mean (NaN for keys without values)."""
+    counts = np.bincount(key, minlength=n_keys)
+    sums = np.bincount(key, weights=values, minlength=n_keys)
+    mean = np.full(n_keys, np.nan)
+    np.divide(sums, counts, out=mean, where=counts > 0)
+    return mean
+
+
+def pinball_loss(actual, quantile_forecast, tau: float):
+    """Pinball (quantile) loss of quantile_forecast at level tau."""
+    diff = actual - quantile_forecast
+    return np.maximum(tau * diff, (tau - 1) * diff)
+
+
+def evaluate(columns: dict, eval_start: int, eval_end: int,
+             calibration_days: int, window_days: int = 7) -> dict:
+    """Evaluate the rows with eval_start <= day <= eval_end.
+
+    columns is the output of columns_from_chunks and must also hold the
+    calibration_days + SEASON_DAYS days before eval_start. Evaluation days
+    are processed in windows of window_days, each calibrated on the
+    calibration_days before it. Returns arrays aligned on "row" (index into
+    columns): "quantiles" and "pinball" [n x len(QUANTILES)], "in_interval",
+    "scaled_error", "naive_abs_error" (NaN when undefined) and
+    "calibration_points".
+    """
+    day, forecast, actual = columns["day"], columns["forecast"], columns["actual"]
+    key, n_keys = key_ids(columns["shop_dept_id"], columns["goods_code"])
+    residual = actual - forecast
+    naive_abs_error = np.abs(actual - seasonal_naive(key, day, actual))
+    has_naive = ~np.isnan(naive_abs_error)
+    lo_col, hi_col = QUANTILES.index(INTERVAL[0]), QUANTILES.index(INTERVAL[1])
+    taus = np.array(QUANTILES)
+
+    parts = []
+    for window_start in range(eval_start, eval_end + 1, window_days):
+        window_end = min(window_start + window_days - 1, eval_end)
+        rows = np.flatnonzero((day >= window_start) & (day <= window_end))
+        if not len(rows):
+            continue
+        calib = (day >= window_start - calibration_days) & (day < window_start)
+
+        residual_q, counts = group_quantiles(key[calib], residual[calib], n_keys,
+                                             QUANTILES, MIN_CALIBRATION_POINTS)
+        scaled = calib & has_naive
+        scale = group_mean(key[scaled], naive_abs_error[scaled], n_keys)
+
+        k, y = key[rows], actual[rows]
+        quantiles = np.maximum(forecast[rows, None] + residual_q[k], 0.0)
+        pinball = pinball_loss(y[:, None], quantiles, taus[None, :])
+        in_interval = ((y >= quantiles[:, lo_col]) & (y <= quantiles[:, hi_col])).astype(np.float64)
+        in_interval[np.isnan(quantiles[:, lo_col])] = np.nan
+        scaled_error = np.full(len(rows), np.nan)
+        np.divide(np.abs(forecast[rows] - y), scale[k], out=scaled_error, where=scale[k] > 0)
+
+        parts.append({
+            "row": rows,
+            "quantiles": quantiles,
+            "pinball": pinball,
+            "in_interval": in_interval,
+            "scaled_error": scaled_error,
+            "naive_abs_error": naive_abs_error[rows],
+            "calibration_points": counts[k],
+        })
+
+    if not parts:
+        return {
+            "row": np.empty(0, dtype=np.int64),
+            "quantiles": np.empty((0, len(QUANTILES))), "pinball": np.empty((0, len(QUANTILES))),
+            "in_interval": np.empty(0), "scaled_error": np.empty(0),
+            "naive_abs_error": np.empty(0), "calibration_points": np.empty(0, dtype=np.int64),
+        }
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def _nanmean(values):
+    """Mean ignoring NaN, None if nothing is left."""
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else None
+
+
+def summarize(result: dict) -> dict:
+    """Run-level metrics: mean pinball loss per quantile, interval coverage and MASE."""
+    summary = {f"pinball_p{int(round(tau * 100)):02d}": _nanmean(result["pinball"][:, j])
+               for j, tau in enumerate(QUANTILES)}
+    summary["coverage"] = _nanmean(result["in_interval"])
+    summary["mase"] = _nanmean(result["scaled_error"])
+    return summary
@@ -25,16 +25,39 @@ Usage:
   # Dry run (extract only, no load)
   python run_pipeline.py --date 2026-02-14 --dry-run
 
+  # Join in process with pandas instead of staging tables on dbatest
+  python run_pipeline.py --compute-mode memory
+
+  # Parallel backfill: weekly shards on 4 workers, then one aggregate/drift pass
+  python run_pipeline.py --start-date 2025-08-01 --end-date 2026-02-14 --workers 4
+
+  # Reload the latest-prediction snapshot (e.g. after adding stores)
+  python run_pipeline.py --start-date 2026-01-01 --end-date 2026-02-14 --rebuild-snapshot
+
+  # Write existing history to the Parquet archive (ARCHIVE_DIR, see archive.py)
+  python run_pipeline.py --start-date 2025-08-01 --end-date 2026-02-14 --archive-only
+
+  # Restart a failed run from the step that failed
+  python run_pipeline.py --resume 3f2a9c1b7d4e
+
 Author:  Data Engineering / BI Team
 Created: 2026-02-15
 """
 
 import argparse
+import json
 import logging
 import os
+import queue
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
 from pathlib import Path
 
 try:
@@ -51,12 +74,27 @@ except ImportError:
     # dotenv is optional; env vars can be set directly
     load_dotenv = None
 
+try:
+    import pandas as pd
+except ImportError:
+    # pandas is optional; only needed for --compute-mode memory
+    pd = None
+
+try:
+    import forecast_eval
+except ImportError:
+    # numpy missing; step 5b (probabilistic evaluation) is skipped
+    forecast_eval = None
+
+import archive  # Parquet archive (step 6b) and spill files; pyarrow only needed when used
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-ACTIVE_STORES = (1127, 1128, 1140, 1141, 20008, 20010, 20011, 20027, 20031, 20032)
-STORE_NAMES = {
+# Fallback store list, used only when the opshop store registry (SHOP_*) and
+# its cache are both unavailable. See load_store_registry().
+FALLBACK_STORES = {
     1127:  "8th & Broadway",
     1128:  "28th & 6th",
     1140:  "100 Maiden Ln",
@@ -70,6 +108,48 @@ STORE_NAMES = {
 }
 
 BATCH_SIZE = 5000  # rows per INSERT batch
+STREAM_QUEUE_CHUNKS = 4        # BATCH_SIZE chunks buffered between source read and staging insert
+SOURCE_NET_WRITE_TIMEOUT = 600  # seconds a source server waits on a full queue (SSCursor)
+EVAL_WINDOW_DAYS = 7           # evaluation days sharing one calibration window
+EVAL_BLOCK_DAYS = 28           # evaluation days loaded from forecast_accuracy_daily at a time
+NEW_STORE_DAYS = 28          # stores open fewer days than this are lifecycle NEW
+
+# Settings below come from the environment. main() calls apply_env() again
+# after loading .env, so values set there take effect.
+COMPUTE_MODE = "staging"       # staging | memory (--compute-mode)
+PIPELINE_WORKERS = 1           # parallel date shards (--workers)
+SHARD_DAYS = 7                 # days per shard (--shard-days)
+EVAL_CALIBRATION_DAYS = 28     # residual window (step 5b)
+CHECKPOINT_DIR = ""            # --resume
+STORE_CODE_PREFIX = "US"       # t_shop_info.dept_code LIKE 'US%'
+STORE_REGISTRY_CACHE = ""
+STORE_REGISTRY_TTL = 3600      # seconds
+STORE_EXCLUDE_IDS = set()      # test kitchens / non-US stores in t_shop_info that are never scored
+
+
+def apply_env():
+    """(Re)read the environment-driven settings above (and archive.ARCHIVE_DIR)."""
+    global COMPUTE_MODE, PIPELINE_WORKERS, SHARD_DAYS, EVAL_CALIBRATION_DAYS, CHECKPOINT_DIR
+    global STORE_CODE_PREFIX, STORE_REGISTRY_CACHE, STORE_REGISTRY_TTL, STORE_EXCLUDE_IDS
+    COMPUTE_MODE = os.environ.get("COMPUTE_MODE", "staging")
+    PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "1"))
+    SHARD_DAYS = int(os.environ.get("SHARD_DAYS", "7"))
+    EVAL_CALIBRATION_DAYS = int(os.environ.get("EVAL_CALIBRATION_DAYS", "28"))
+    CHECKPOINT_DIR = os.environ.get(
+        "CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "uc-sc-01-checkpoints"))
+    STORE_CODE_PREFIX = os.environ.get("STORE_CODE_PREFIX", "US")
+    STORE_REGISTRY_CACHE = os.environ.get(
+        "STORE_REGISTRY_CACHE", os.path.join(tempfile.gettempdir(), "uc-sc-01-store-registry.json"))
+    STORE_REGISTRY_TTL = int(os.environ.get("STORE_REGISTRY_TTL", "3600"))
+    STORE_EXCLUDE_IDS = {
+        int(s) for s in os.environ.get("STORE_EXCLUDE_IDS", "1131,20007,20046").split(",") if s.strip()
+    }
+    archive.ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "")
+
+
+apply_env()
+
+STORE_ID_TABLE = "tmp_store_ids"   # session TEMPORARY table joined instead of IN (...)
 
 # ============================================================================
 # LOGGING
@@ -117,10 +197,181 @@ def get_connection(prefix: str) -> pymysql.Connection:
 
 
 # ============================================================================
-# STEP 1: EXTRACT PREDICTIONS
+# STORE REGISTRY
 # ============================================================================
+# Stores come from luckyus_opshop.t_shop_info (SHOP_* connection), cached as
+# JSON for STORE_REGISTRY_TTL seconds. Lifecycle relative to the run date:
+#   PRE_OPEN (set_up_time in the future), NEW (< NEW_STORE_DAYS open),
+#   ACTIVE, CLOSED (status != 1; a status-0 store is taken to have closed
+#   on its update_time). NEW and ACTIVE stores are processed, except
+#   STORE_EXCLUDE_IDS; range runs take every store processed on any day.
+
+STORE_LIFECYCLE_PROCESSED = ("NEW", "ACTIVE")
+
+_store_registry = None
+
 
-EXTRACT_PREDICTIONS_SQL = """
+def _fetch_store_registry() -> dict:
+    """Read every STORE_CODE_PREFIX store from t_shop_info."""
+    conn = get_connection("SHOP")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT dept_id, dept_code, dept_name, status, set_up_time, update_time "
+                "FROM t_shop_info WHERE dept_code LIKE %s",
+                (STORE_CODE_PREFIX + "%",),
+            )
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    return {
+        int(dept_id): {
+            "store_code": dept_code,
+            "store_name": dept_name,
+            "status": status,
+            "opened": set_up_time.date().isoformat() if set_up_time else None,
+            # status 0 (closed): the last update is taken as the closing date
+            "closed": update_time.date().isoformat() if status == 0 and update_time else None,
+        }
+        for dept_id, dept_code, dept_name, status, set_up_time, update_time in rows
+    }
+
+
+def load_store_registry(refresh: bool = False) -> dict:
+    """Return {dept_id: store} from the JSON cache, opshop, or FALLBACK_STORES."""
+    global _store_registry
+    if _store_registry is not None and not refresh:
+        return _store_registry
+
+    cached, age = None, None
+    try:
+        payload = json.loads(Path(STORE_REGISTRY_CACHE).read_text())
+        cached = {int(k): v for k, v in payload["stores"].items()}
+        age = time.time() - payload["loaded_at"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if cached and not refresh and age < STORE_REGISTRY_TTL:
+        _store_registry = cached
+        return cached
+
+    try:
+        stores = _fetch_store_registry()
+        try:
+            Path(STORE_REGISTRY_CACHE).write_text(
+                json.dumps({"loaded_at": time.time(), "stores": stores}))
+        except OSError as e:
+            log.warning("Could not write store registry cache %s: %s", STORE_REGISTRY_CACHE, e)
+    except Exception as e:
+        if cached:
+            log.warning("Store registry refresh failed (%s); using cache (%.0fs old)", e, age)
+            stores = cached
+        else:
+            log.warning("Store registry refresh failed (%s); using FALLBACK_STORES", e)
+            stores = {
+                dept_id: {"store_code": None, "store_name": name, "status": 1, "opened": None}
+                for dept_id, name in FALLBACK_STORES.items()
+            }
+
+    _store_registry = stores
+    return stores
+
+
+def store_lifecycle(store: dict, as_of: str) -> str:
+    """PRE_OPEN / NEW / ACTIVE / CLOSED for a registry entry on date as_of."""
+    if store.get("status") != 1:
+        closed = store.get("closed")
+        if not closed or as_of >= closed:
+            return "CLOSED"
+    if not store.get("opened"):
+        return "ACTIVE"
+    age_days = (date.fromisoformat(as_of) - date.fromisoformat(store["opened"])).days
+    if age_days < 0:
+        return "PRE_OPEN"
+    return "NEW" if age_days < NEW_STORE_DAYS else "ACTIVE"
+
+
+def active_stores(as_of: str) -> dict:
+    """{dept_id: store_name} for stores processed on as_of (NEW or ACTIVE)."""
+    return {
+        dept_id: s["store_name"]
+        for dept_id, s in sorted(load_store_registry().items())
+        if store_lifecycle(s, as_of) in STORE_LIFECYCLE_PROCESSED
+        and dept_id not in STORE_EXCLUDE_IDS
+    }
+
+
+def stores_active_between(date_start: str, date_end: str) -> dict:
+    """active_stores() for every day in [date_start, date_end], merged.
+
+    Range runs rewrite every store's rows in the range, so a store that
+    opened or closed part-way through must still be extracted.
+    """
+    stores = {}
+    day, last = date.fromisoformat(date_start), date.fromisoformat(date_end)
+    while day <= last:
+        stores.update(active_stores(day.isoformat()))
+        day += timedelta(days=1)
+    return dict(sorted(stores.items()))
+
+
+# test.dim_store is shared with UC-OP-02. address and area_type are only
+# known there, so NULLs from this registry never overwrite them.
+UPSERT_STORE_DIMENSION = """
+INSERT INTO test.dim_store (store_id, store_code, store_name, status, opened_date)
+VALUES (%s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    store_code  = COALESCE(VALUES(store_code), store_code),
+    store_name  = VALUES(store_name),
+    status      = VALUES(status),
+    opened_date = COALESCE(VALUES(opened_date), opened_date)
+"""
+
+
+def sync_store_dimension(conn) -> int:
+    """Upsert the store registry into test.dim_store.
+
+    Unchanged stores are not rewritten (MySQL skips no-op updates), so a
+    run against a stable registry writes nothing. Returns the affected-row
+    count (1 per new store, 2 per changed store).
+    """
+    rows = [
+        (dept_id, s["store_code"], s["store_name"], s["status"], s["opened"])
+        for dept_id, s in sorted(load_store_registry().items())
+    ]
+    with conn.cursor() as cur:
+        cur.executemany(UPSERT_STORE_DIMENSION, rows)
+        changed = cur.rowcount
+    conn.commit()
+    log.info("  Store dimension: %d stores synced to test.dim_store (%d rows affected)", len(rows), changed)
+    return changed
+
+
+def load_store_id_table(conn, store_ids) -> None:
+    """(Re)create the session TEMPORARY table STORE_ID_TABLE with store_ids."""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TEMPORARY TABLE IF EXISTS {STORE_ID_TABLE}")
+        cur.execute(f"CREATE TEMPORARY TABLE {STORE_ID_TABLE} "
+                    f"(dept_id BIGINT NOT NULL PRIMARY KEY) ENGINE=MEMORY")
+        if store_ids:
+            cur.executemany(f"INSERT INTO {STORE_ID_TABLE} (dept_id) VALUES (%s)",
+                            [(int(s),) for s in store_ids])
+
+
+# ============================================================================
+# STEP 1: EXTRACT PREDICTIONS (LATEST-PREDICTION SNAPSHOT)
+# ============================================================================
+# test.forecast_prediction_latest keeps only the latest task_version_id per
+# (dt, shop_dept_id, goods_code). It is topped up from ireplenishment with the
+# rows of versions >= the newest version already held, so the source is read
+# once per new version instead of self-joining every version on each run.
+# Predictions for a date range are then a plain range read of the snapshot.
+
+SNAPSHOT_MAX_DT = "9999-12-31"
+
+# Latest version per key straight from the source (snapshot bootstrap, --dry-run)
+EXTRACT_LATEST_PREDICTIONS_SQL = """
 SELECT
     p.dt                  AS dt,
     p.shop_dept_id        AS shop_dept_id,
@@ -132,30 +383,137 @@ SELECT
     p.task_version_id     AS task_version_id
 FROM luckyus_ireplenishment.t_order_predict_alg_v2 p
 INNER JOIN (
-    SELECT shop_dept_id, goods_code, dt, MAX(task_version_id) AS max_version_id
-    FROM luckyus_ireplenishment.t_order_predict_alg_v2
-    WHERE dt >= %s AND dt <= %s
-      AND shop_dept_id IN ({stores})
-    GROUP BY shop_dept_id, goods_code, dt
+    SELECT v.shop_dept_id, v.goods_code, v.dt, MAX(v.task_version_id) AS max_version_id
+    FROM luckyus_ireplenishment.t_order_predict_alg_v2 v
+    INNER JOIN {store_table} ts ON ts.dept_id = v.shop_dept_id
+    WHERE v.dt >= %s AND v.dt <= %s
+    GROUP BY v.shop_dept_id, v.goods_code, v.dt
 ) latest
     ON  p.shop_dept_id    = latest.shop_dept_id
     AND p.goods_code      = latest.goods_code
     AND p.dt              = latest.dt
     AND p.task_version_id = latest.max_version_id
 WHERE p.dt >= %s AND p.dt <= %s
-  AND p.shop_dept_id IN ({stores})
 ORDER BY p.dt, p.shop_dept_id, p.goods_code
-""".format(stores=",".join(str(s) for s in ACTIVE_STORES))
+""".format(store_table=STORE_ID_TABLE)
 
+EXTRACT_SNAPSHOT_DELTA_SQL = """
+SELECT p.dt, p.shop_dept_id, p.goods_code, p.goods_name, p.large_class_name,
+       p.vlt_avg_demand, p.order_num, p.task_version_id
+FROM luckyus_ireplenishment.t_order_predict_alg_v2 p
+INNER JOIN {store_table} ts ON ts.dept_id = p.shop_dept_id
+WHERE p.task_version_id >= %s
+""".format(store_table=STORE_ID_TABLE)
 
-def extract_predictions(conn, date_start: str, date_end: str) -> list:
-    """Extract predictions from ireplenishment server."""
-    log.info("STEP 1: Extracting predictions for %s to %s ...", date_start, date_end)
+# Keep the row of the highest version; task_version_id is assigned last
+UPSERT_SNAPSHOT = """
+INSERT INTO test.forecast_prediction_latest
+    (dt, shop_dept_id, goods_code, goods_name, large_class_name,
+     vlt_avg_demand, order_num, task_version_id)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    goods_name       = IF(VALUES(task_version_id) >= task_version_id, VALUES(goods_name), goods_name),
+    large_class_name = IF(VALUES(task_version_id) >= task_version_id,
+                          VALUES(large_class_name), large_class_name),
+    vlt_avg_demand   = IF(VALUES(task_version_id) >= task_version_id,
+                          VALUES(vlt_avg_demand), vlt_avg_demand),
+    order_num        = IF(VALUES(task_version_id) >= task_version_id, VALUES(order_num), order_num),
+    task_version_id  = GREATEST(task_version_id, VALUES(task_version_id)),
+    updated_at       = NOW()
+"""
+
+SNAPSHOT_RANGE_SELECT = """
+SELECT p.dt, p.shop_dept_id, p.goods_code, p.goods_name, p.large_class_name,
+       p.vlt_avg_demand, p.order_num, p.task_version_id
+FROM test.forecast_prediction_latest p
+INNER JOIN {store_table} ts ON ts.dept_id = p.shop_dept_id
+WHERE p.dt >= %s AND p.dt <= %s
+""".format(store_table=STORE_ID_TABLE)
+
+EXTRACT_PREDICTIONS_SQL = SNAPSHOT_RANGE_SELECT
+
+LOAD_PREDICTIONS_FROM_SNAPSHOT = """
+INSERT INTO test.tmp_predictions
+    (dt, shop_dept_id, goods_code, goods_name, large_class_name,
+     vlt_avg_demand, order_num, task_version_id)
+""" + SNAPSHOT_RANGE_SELECT
+
+
+def stream_query(conn, sql: str, params: tuple):
+    """Yield the rows of a query in BATCH_SIZE chunks via an unbuffered SSCursor.
+
+    Only one chunk is held client-side at a time. While the generator is
+    open no other statement can run on conn.
+    """
     with conn.cursor() as cur:
-        cur.execute(EXTRACT_PREDICTIONS_SQL, (date_start, date_end, date_start, date_end))
-        rows = cur.fetchall()
-    log.info("  -> Extracted %d prediction rows", len(rows))
-    return rows
+        cur.execute("SET SESSION net_write_timeout = %s", (SOURCE_NET_WRITE_TIMEOUT,))
+    with conn.cursor(pymysql.cursors.SSCursor) as cur:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            yield rows
+
+
+def extract_latest_predictions(conn, date_start: str, date_end: str):
+    """Stream latest-version predictions from ireplenishment server (generator of row chunks).
+
+    Expects STORE_ID_TABLE loaded on conn (load_store_id_table).
+    """
+    log.info("STEP 1: Extracting predictions for %s to %s ...", date_start, date_end)
+    return stream_query(conn, EXTRACT_LATEST_PREDICTIONS_SQL,
+                        (date_start, date_end, date_start, date_end))
+
+
+def refresh_prediction_snapshot(pred_conn, analytics_conn, date_start: str,
+                                rebuild: bool = False) -> int:
+    """Top up test.forecast_prediction_latest from ireplenishment. Returns rows upserted.
+
+    - empty (or rebuild): bootstrap latest versions for dt >= date_start
+    - date_start before the oldest dt held: bootstrap that older range
+    - then: upsert every row with task_version_id >= the newest version
+      held (the newest version is re-read in case it was still being
+      written last time)
+    Expects STORE_ID_TABLE loaded on both connections.
+    """
+    log.info("STEP 1: Refreshing latest-prediction snapshot ...")
+    with analytics_conn.cursor() as cur:
+        if rebuild:
+            log.info("  Rebuilding: truncating test.forecast_prediction_latest")
+            cur.execute("TRUNCATE TABLE test.forecast_prediction_latest")
+        cur.execute("SELECT MIN(dt), MAX(task_version_id) FROM test.forecast_prediction_latest")
+        min_dt, watermark = cur.fetchone()
+    analytics_conn.commit()
+
+    loaded = 0
+    if watermark is None:
+        log.info("  Snapshot empty; bootstrapping dt >= %s", date_start)
+        loaded += stream_to_staging(
+            extract_latest_predictions(pred_conn, date_start, SNAPSHOT_MAX_DT),
+            analytics_conn, UPSERT_SNAPSHOT, "snapshot bootstrap")
+    else:
+        if date_start < str(min_dt):
+            log.info("  Snapshot starts at %s; bootstrapping %s onwards", min_dt, date_start)
+            loaded += stream_to_staging(
+                extract_latest_predictions(pred_conn, date_start, str(min_dt)),
+                analytics_conn, UPSERT_SNAPSHOT, "snapshot bootstrap")
+        log.info("  Reading prediction versions >= %s", watermark)
+        loaded += stream_to_staging(
+            stream_query(pred_conn, EXTRACT_SNAPSHOT_DELTA_SQL, (watermark,)),
+            analytics_conn, UPSERT_SNAPSHOT, "snapshot delta")
+
+    log.info("  -> Snapshot refreshed: %d rows upserted", loaded)
+    return loaded
+
+
+def extract_predictions(conn, date_start: str, date_end: str):
+    """Stream predictions for a date range from the snapshot (generator of row chunks).
+
+    conn is the analytics connection; expects STORE_ID_TABLE loaded on it.
+    """
+    log.info("STEP 1: Reading predictions for %s to %s from snapshot ...", date_start, date_end)
+    return stream_query(conn, EXTRACT_PREDICTIONS_SQL, (date_start, date_end))
 
 
 # ============================================================================
@@ -170,24 +528,23 @@ SELECT
     SUM(ABS(scr.total_adjust_num))    AS actual_consumption,
     COUNT(*)                          AS record_count
 FROM luckyus_scm_shopstock.t_shop_goods_stock_change_record scr
+INNER JOIN {store_table} ts ON ts.dept_id = scr.shop_dept_id
 WHERE scr.operated_time >= CONCAT(%s, ' 00:00:00')
   AND scr.operated_time <  DATE_ADD(%s, INTERVAL 1 DAY)
   AND scr.reason_code IN ('025', '1001', '1002')
   AND scr.total_adjust_num < 0
-  AND scr.shop_dept_id IN ({stores})
 GROUP BY DATE(scr.operated_time), scr.shop_dept_id, scr.goods_mid
 ORDER BY consumption_date, scr.shop_dept_id, scr.goods_mid
-""".format(stores=",".join(str(s) for s in ACTIVE_STORES))
+""".format(store_table=STORE_ID_TABLE)
+
 
+def extract_actuals(conn, date_start: str, date_end: str):
+    """Stream actual consumption from scm-shopstock server (generator of row chunks).
 
-def extract_actuals(conn, date_start: str, date_end: str) -> list:
-    """Extract actual consumption from scm-shopstock server."""
+    Expects STORE_ID_TABLE loaded on conn (load_store_id_table).
+    """
     log.info("STEP 2: Extracting actuals for %s to %s ...", date_start, date_end)
-    with conn.cursor() as cur:
-        cur.execute(EXTRACT_ACTUALS_SQL, (date_start, date_end))
-        rows = cur.fetchall()
-    log.info("  -> Extracted %d actual consumption rows", len(rows))
-    return rows
+    return stream_query(conn, EXTRACT_ACTUALS_SQL, (date_start, date_end))
 
 
 # ============================================================================
@@ -221,13 +578,6 @@ CREATE TABLE test.tmp_actuals (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
 """
 
-INSERT_PREDICTIONS = """
-INSERT INTO test.tmp_predictions
-    (dt, shop_dept_id, goods_code, goods_name, large_class_name,
-     vlt_avg_demand, order_num, task_version_id)
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-"""
-
 INSERT_ACTUALS = """
 INSERT INTO test.tmp_actuals
     (consumption_date, shop_dept_id, goods_mid, actual_consumption, record_count)
@@ -235,15 +585,20 @@ VALUES (%s, %s, %s, %s, %s)
 """
 
 
-def load_staging(conn, predictions: list, actuals: list):
-    """Create staging tables and bulk-load extracted data."""
-    log.info("STEP 3: Loading staging tables ...")
+def create_staging(conn, temporary: bool = False):
+    """Create (empty) staging tables.
+
+    temporary=True creates session TEMPORARY tables, so concurrent shards
+    (run_pipeline_sharded) each get their own tmp_predictions/tmp_actuals.
+    """
+    log.info("STEP 3: Creating staging tables ...")
+    table = "TEMPORARY TABLE" if temporary else "TABLE"
 
     with conn.cursor() as cur:
         # Create staging tables (each statement separately)
         log.info("  Creating tmp_predictions ...")
-        cur.execute("DROP TABLE IF EXISTS test.tmp_predictions")
-        cur.execute("""CREATE TABLE test.tmp_predictions (
+        cur.execute(f"DROP {table} IF EXISTS test.tmp_predictions")
+        cur.execute(f"""CREATE {table} test.tmp_predictions (
             dt               VARCHAR(32)  NOT NULL,
             shop_dept_id     BIGINT       NOT NULL,
             goods_code       VARCHAR(32)  NOT NULL,
@@ -256,8 +611,8 @@ def load_staging(conn, predictions: list, actuals: list):
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""")
 
         log.info("  Creating tmp_actuals ...")
-        cur.execute("DROP TABLE IF EXISTS test.tmp_actuals")
-        cur.execute("""CREATE TABLE test.tmp_actuals (
+        cur.execute(f"DROP {table} IF EXISTS test.tmp_actuals")
+        cur.execute(f"""CREATE {table} test.tmp_actuals (
             consumption_date DATE         NOT NULL,
             shop_dept_id     BIGINT       NOT NULL,
             goods_mid        VARCHAR(32)  NOT NULL,
@@ -268,28 +623,65 @@ def load_staging(conn, predictions: list, actuals: list):
 
     conn.commit()
 
-    # Bulk insert predictions
-    if predictions:
-        log.info("  Inserting %d prediction rows (batch size %d) ...", len(predictions), BATCH_SIZE)
-        with conn.cursor() as cur:
-            for i in range(0, len(predictions), BATCH_SIZE):
-                batch = predictions[i : i + BATCH_SIZE]
-                cur.executemany(INSERT_PREDICTIONS, batch)
-                conn.commit()
-                log.info("    Loaded predictions batch %d-%d", i, i + len(batch))
 
-    # Bulk insert actuals
-    if actuals:
-        log.info("  Inserting %d actual rows (batch size %d) ...", len(actuals), BATCH_SIZE)
+_STREAM_END = object()
+
+
+def _put_chunk(chunk_queue: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            chunk_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce_chunks(chunks, chunk_queue: queue.Queue, stop: threading.Event):
+    """Producer thread: read source chunks into the bounded queue."""
+    try:
+        for chunk in chunks:
+            if not _put_chunk(chunk_queue, chunk, stop):
+                return
+        _put_chunk(chunk_queue, _STREAM_END, stop)
+    except Exception as e:
+        _put_chunk(chunk_queue, e, stop)
+
+
+def stream_to_staging(chunks, conn, insert_sql: str, label: str) -> int:
+    """Insert source row chunks into a staging table while they are still being read.
+
+    A producer thread drains the source cursor (chunks, see stream_query)
+    into a queue of STREAM_QUEUE_CHUNKS; this thread executemany()s each
+    chunk on conn. Peak memory is bounded by the queue depth, not by the
+    date range. Source errors are re-raised here.
+    """
+    chunk_queue = queue.Queue(maxsize=STREAM_QUEUE_CHUNKS)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce_chunks, args=(chunks, chunk_queue, stop),
+                                name=f"extract-{label}", daemon=True)
+    producer.start()
+
+    loaded = 0
+    try:
         with conn.cursor() as cur:
-            for i in range(0, len(actuals), BATCH_SIZE):
-                batch = actuals[i : i + BATCH_SIZE]
-                cur.executemany(INSERT_ACTUALS, batch)
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is _STREAM_END:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                cur.executemany(insert_sql, chunk)
                 conn.commit()
-                log.info("    Loaded actuals batch %d-%d", i, i + len(batch))
+                loaded += len(chunk)
+                log.info("    Loaded %s rows %d-%d", label, loaded - len(chunk), loaded)
+    finally:
+        stop.set()
+        producer.join()
 
-    log.info("  -> Staging tables loaded: %d predictions, %d actuals",
-             len(predictions), len(actuals))
+    log.info("  -> Streamed %d %s rows into staging", loaded, label)
+    return loaded
 
 
 # ============================================================================
@@ -312,7 +704,7 @@ INSERT INTO test.forecast_accuracy_daily (
 SELECT
     a.consumption_date                                      AS accuracy_date,
     p.shop_dept_id                                          AS shop_dept_id,
-    NULL                                                    AS shop_name,
+    ds.store_name                                           AS shop_name,
     p.goods_code                                            AS goods_code,
     p.goods_name                                            AS goods_name,
     p.large_class_name                                      AS large_class_name,
@@ -334,13 +726,19 @@ INNER JOIN test.tmp_actuals a
     ON  p.shop_dept_id = a.shop_dept_id
     AND p.goods_code   = a.goods_mid
     AND p.dt           = a.consumption_date
+LEFT JOIN test.dim_store ds
+    ON  ds.store_id    = p.shop_dept_id
 WHERE a.actual_consumption IS NOT NULL
   AND p.vlt_avg_demand     IS NOT NULL
 """
 
 
 def compute_accuracy(conn, date_start: str, date_end: str) -> int:
-    """Join predictions to actuals and compute accuracy metrics."""
+    """Join predictions to actuals and compute accuracy metrics.
+
+    shop_name comes from test.dim_store in the same INSERT ... SELECT (see
+    sync_store_dimension), so each row is written once.
+    """
     log.info("STEP 4: Computing accuracy metrics ...")
 
     with conn.cursor() as cur:
@@ -354,44 +752,168 @@ def compute_accuracy(conn, date_start: str, date_end: str) -> int:
         inserted = cur.rowcount
         log.info("  Inserted %d accuracy rows", inserted)
 
-        # Enrich shop names
-        for shop_id, shop_name in STORE_NAMES.items():
-            cur.execute(
-                "UPDATE test.forecast_accuracy_daily "
-                "SET shop_name = %s "
-                "WHERE shop_dept_id = %s "
-                "  AND accuracy_date >= %s AND accuracy_date <= %s "
-                "  AND shop_name IS NULL",
-                (shop_name, shop_id, date_start, date_end),
-            )
-        log.info("  Enriched shop names for %d stores", len(STORE_NAMES))
-
     conn.commit()
     return inserted
 
 
+# ============================================================================
+# STEP 3-4 (MEMORY MODE): IN-PROCESS JOIN & COMPUTE
+# ============================================================================
+# --compute-mode memory: join predictions to actuals with pandas and insert
+# forecast_accuracy_daily directly, skipping tmp_predictions/tmp_actuals.
+# Same semantics as COMPUTE_ACCURACY; values are rounded to the column scale.
+
+PREDICTION_COLUMNS = ["dt", "shop_dept_id", "goods_code", "goods_name", "large_class_name",
+                      "vlt_avg_demand", "order_num", "task_version_id"]
+ACTUAL_COLUMNS = ["consumption_date", "shop_dept_id", "goods_mid",
+                  "actual_consumption", "record_count"]
+
+INSERT_ACCURACY_DAILY = """
+INSERT INTO test.forecast_accuracy_daily (
+    accuracy_date, shop_dept_id, shop_name,
+    goods_code, goods_name, large_class_name,
+    predicted_demand, predicted_order_qty, actual_consumption,
+    absolute_error, absolute_pct_error, forecast_error, bias_pct, squared_error,
+    prediction_dt, task_version_id, computed_at
+) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+"""
+
+ACCURACY_DAILY_COLUMNS = [
+    "accuracy_date", "shop_dept_id", "shop_name",
+    "goods_code", "goods_name", "large_class_name",
+    "predicted_demand", "predicted_order_qty", "actual_consumption",
+    "absolute_error", "absolute_pct_error", "forecast_error", "bias_pct", "squared_error",
+    "prediction_dt", "task_version_id",
+]
+
+
+def frame_from_chunks(chunks, columns: list, numeric: list):
+    """Build a DataFrame from streamed row chunks (see stream_query).
+
+    DECIMAL columns are converted to float per chunk, so the Python tuples
+    of only one chunk are alive at a time.
+    """
+    frames = []
+    for chunk in chunks:
+        frame = pd.DataFrame.from_records(chunk, columns=columns)
+        for col in numeric:
+            frame[col] = pd.to_numeric(frame[col], errors="coerce").astype("float64")
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def join_accuracy(predictions, actuals, shop_names: dict):
+    """Hash-join predictions to actuals on (date, store, goods) and compute errors.
+
+    Returns a DataFrame with ACCURACY_DAILY_COLUMNS.
+    """
+    pred = predictions.dropna(subset=["vlt_avg_demand"]).copy()
+    pred["join_date"] = pd.to_datetime(pred["dt"].astype(str), errors="coerce")
+    pred = pred.drop_duplicates(subset=["join_date", "shop_dept_id", "goods_code"])
+
+    act = actuals.dropna(subset=["actual_consumption"]).copy()
+    act["join_date"] = pd.to_datetime(act["consumption_date"])
+
+    merged = pred.merge(
+        act[["join_date", "shop_dept_id", "goods_mid", "actual_consumption"]],
+        left_on=["join_date", "shop_dept_id", "goods_code"],
+        right_on=["join_date", "shop_dept_id", "goods_mid"],
+        how="inner",
+    )
+
+    error = merged["vlt_avg_demand"] - merged["actual_consumption"]
+    denominator = merged["actual_consumption"].where(merged["actual_consumption"] != 0)
+
+    return pd.DataFrame({
+        "accuracy_date": merged["join_date"].dt.date,
+        "shop_dept_id": merged["shop_dept_id"].astype("int64"),
+        "shop_name": merged["shop_dept_id"].map(shop_names),
+        "goods_code": merged["goods_code"],
+        "goods_name": merged["goods_name"],
+        "large_class_name": merged["large_class_name"],
+        "predicted_demand": merged["vlt_avg_demand"].round(2),
+        "predicted_order_qty": merged["order_num"].round(2),
+        "actual_consumption": merged["actual_consumption"].round(2),
+        "absolute_error": error.abs().round(2),
+        "absolute_pct_error": (error.abs() / denominator).round(4),
+        "forecast_error": error.round(2),
+        "bias_pct": (error / denominator).round(4),
+        "squared_error": (error ** 2).round(4),
+        "prediction_dt": merged["dt"].astype(str),
+        "task_version_id": merged["task_version_id"],
+    }, columns=ACCURACY_DAILY_COLUMNS)
+
+
+def compute_accuracy_memory(conn, predictions, actuals, date_start: str, date_end: str) -> int:
+    """Compute accuracy in process and bulk-insert forecast_accuracy_daily."""
+    log.info("STEP 4: Computing accuracy metrics in memory ...")
+
+    # Every registry store, as synced to test.dim_store (staging mode joins that)
+    shop_names = {dept_id: s["store_name"] for dept_id, s in load_store_registry().items()}
+    daily = join_accuracy(predictions, actuals, shop_names)
+    rows = daily.astype(object).where(daily.notna(), None)
+    values = list(rows.itertuples(index=False, name=None))
+    log.info("  Joined %d predictions x %d actuals -> %d accuracy rows",
+             len(predictions), len(actuals), len(values))
+
+    with conn.cursor() as cur:
+        # Idempotent delete; delete + insert commit together
+        cur.execute(IDEMPOTENT_DELETE_DAILY, (date_start, date_end))
+        log.info("  Deleted %d existing rows for idempotency", cur.rowcount)
+
+        for i in range(0, len(values), BATCH_SIZE):
+            cur.executemany(INSERT_ACCURACY_DAILY, values[i : i + BATCH_SIZE])
+    conn.commit()
+
+    log.info("  Inserted %d accuracy rows", len(values))
+    return len(values)
+
+
 # ============================================================================
 # STEP 5: AGGREGATE METRICS
 # ============================================================================
 
 def compute_aggregates(conn, date_start: str, date_end: str):
-    """Compute aggregated accuracy metrics across periods and dimensions."""
+    """Maintain forecast_accuracy_summary incrementally for the given date range.
+
+    1. Refresh per-day partial sums (forecast_accuracy_partials) for
+       date_start..date_end only.
+    2. Re-roll the summary rows whose period contains one of those days:
+       DAILY for the range, WEEKLY/MONTHLY for the weeks/months touched,
+       ROLLING_7D/30D for windows ending within 6/29 days after it.
+    Every metric is a ratio of sums, so all periods are rolled up from the
+    partials without re-reading forecast_accuracy_daily.
+    """
     log.info("STEP 5: Computing aggregate metrics ...")
-
-    agg_sql_blocks = _build_aggregate_sql()
+    ds = date.fromisoformat(date_start)
+    de = date.fromisoformat(date_end)
     total_inserted = 0
 
     with conn.cursor() as cur:
-        # Idempotent delete of overlapping summaries
+        # Bootstrap partials from history on first run
+        cur.execute("SELECT 1 FROM test.forecast_accuracy_partials LIMIT 1")
+        if cur.fetchone() is None:
+            cur.execute("SELECT MIN(accuracy_date), MAX(accuracy_date) "
+                        "FROM test.forecast_accuracy_daily")
+            hist_start, hist_end = cur.fetchone()
+            if hist_start:
+                log.info("  Partials empty; bootstrapping from %s to %s", hist_start, hist_end)
+                ds, de = min(ds, hist_start), max(de, hist_end)
+
         cur.execute(
-            "DELETE FROM test.forecast_accuracy_summary "
-            "WHERE period_end >= %s AND period_start <= %s",
-            (date_start, date_end),
+            "DELETE FROM test.forecast_accuracy_partials "
+            "WHERE accuracy_date >= %s AND accuracy_date <= %s",
+            (ds, de),
         )
-        log.info("  Deleted overlapping summaries")
+        for label, sql in _build_partials_sql():
+            cur.execute(sql, (ds, de))
+            log.info("  Partials %s: %d rows", label, cur.rowcount)
 
-        for label, sql in agg_sql_blocks:
-            cur.execute(sql, (date_start, date_end))
+        for label, delete_sql, delete_params, sql, params in _build_rollup_sql(ds, de):
+            cur.execute(delete_sql, delete_params)
+            cur.execute(sql, params)
             count = cur.rowcount
             total_inserted += count
             log.info("  %s: %d rows", label, count)
@@ -401,21 +923,74 @@ def compute_aggregates(conn, date_start: str, date_end: str):
     return total_inserted
 
 
-def _build_aggregate_sql() -> list:
-    """Return list of (label, sql) tuples for each aggregation section."""
+def _build_partials_sql() -> list:
+    """Return (label, sql) tuples refreshing forecast_accuracy_partials per dimension."""
     # Each query takes (%s, %s) for (date_start, date_end)
+    sums_select = """
+        COUNT(*),
+        SUM(CASE WHEN d.actual_consumption > 0 AND d.absolute_pct_error IS NOT NULL
+                 THEN 1 ELSE 0 END),
+        COALESCE(SUM(CASE WHEN d.actual_consumption > 0 THEN d.absolute_pct_error END), 0),
+        SUM(CASE WHEN d.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END),
+        COALESCE(SUM(d.absolute_error), 0),
+        COALESCE(SUM(d.forecast_error), 0),
+        COALESCE(SUM(d.squared_error), 0),
+        COALESCE(SUM(d.actual_consumption), 0),
+        NOW()
+    FROM test.forecast_accuracy_daily d
+    WHERE d.accuracy_date >= %s AND d.accuracy_date <= %s
+    """
+
+    insert_prefix = """INSERT INTO test.forecast_accuracy_partials (
+        accuracy_date, dimension_type, dimension_value, dimension_name,
+        prediction_count, ape_count, sum_ape, within_20_count,
+        sum_abs_error, sum_forecast_error, sum_squared_error, sum_actual, computed_at
+    ) SELECT """
+
+    return [
+        ("OVERALL", insert_prefix + f"""
+        d.accuracy_date, 'OVERALL', 'ALL', 'All Stores & Products',
+        {sums_select}
+        GROUP BY d.accuracy_date
+        """),
+        ("STORE", insert_prefix + f"""
+        d.accuracy_date, 'STORE', CAST(d.shop_dept_id AS CHAR), MAX(d.shop_name),
+        {sums_select}
+        GROUP BY d.accuracy_date, d.shop_dept_id
+        """),
+        ("CATEGORY", insert_prefix + f"""
+        d.accuracy_date, 'CATEGORY', COALESCE(d.large_class_name, 'UNKNOWN'),
+        COALESCE(d.large_class_name, 'Unknown Category'),
+        {sums_select}
+        GROUP BY d.accuracy_date, COALESCE(d.large_class_name, 'UNKNOWN'),
+                 COALESCE(d.large_class_name, 'Unknown Category')
+        """),
+    ]
+
+
+def _build_rollup_sql(ds: date, de: date) -> list:
+    """Return (label, delete_sql, delete_params, sql, params) for each summary section.
+
+    Only periods containing a day of ds..de are deleted and re-rolled
+    from forecast_accuracy_partials.
+    """
+    week_start = ds - timedelta(days=ds.weekday())
+    week_end = de + timedelta(days=6 - de.weekday())
+    month_start = ds.replace(day=1)
+    month_end = (de.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
     metric_select = """
-        ROUND(AVG(CASE WHEN d.actual_consumption > 0 THEN d.absolute_pct_error END), 4) AS mape,
-        ROUND(SUM(d.absolute_error) / NULLIF(SUM(d.actual_consumption), 0), 4) AS wmape,
-        ROUND(SQRT(AVG(d.squared_error)), 4) AS rmse,
-        ROUND(AVG(d.forecast_error), 4) AS mfe,
-        ROUND(SUM(CASE WHEN d.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END)
-            / NULLIF(COUNT(*), 0), 4) AS accuracy_rate_20,
-        ROUND(SUM(d.forecast_error) / NULLIF(AVG(d.absolute_error), 0), 4) AS tracking_signal,
-        COUNT(*) AS prediction_count,
-        NULL AS coverage_pct,
-        ROUND(AVG(d.actual_consumption), 2) AS avg_actual,
-        NOW() AS computed_at
+        ROUND(SUM(pa.sum_ape) / NULLIF(SUM(pa.ape_count), 0), 4),
+        ROUND(SUM(pa.sum_abs_error) / NULLIF(SUM(pa.sum_actual), 0), 4),
+        ROUND(SQRT(SUM(pa.sum_squared_error) / NULLIF(SUM(pa.prediction_count), 0)), 4),
+        ROUND(SUM(pa.sum_forecast_error) / NULLIF(SUM(pa.prediction_count), 0), 4),
+        ROUND(SUM(pa.within_20_count) / NULLIF(SUM(pa.prediction_count), 0), 4),
+        ROUND(SUM(pa.sum_forecast_error)
+            / NULLIF(SUM(pa.sum_abs_error) / NULLIF(SUM(pa.prediction_count), 0), 0), 4),
+        SUM(pa.prediction_count),
+        NULL,
+        ROUND(SUM(pa.sum_actual) / NULLIF(SUM(pa.prediction_count), 0), 2),
+        NOW()
     """
 
     insert_prefix = """INSERT INTO test.forecast_accuracy_summary (
@@ -426,412 +1001,460 @@ def _build_aggregate_sql() -> list:
         prediction_count, coverage_pct, avg_actual, computed_at
     ) SELECT """
 
-    where_clause = """
-    FROM test.forecast_accuracy_daily d
-    WHERE d.accuracy_date >= %s AND d.accuracy_date <= %s
-    """
+    def delete_sql(period_type: str, dimension_type: str, column: str) -> str:
+        return (
+            "DELETE FROM test.forecast_accuracy_summary "
+            f"WHERE period_type = '{period_type}' AND dimension_type = '{dimension_type}' "
+            f"AND {column} >= %s AND {column} <= %s"
+        )
 
     blocks = []
 
-    # DAILY x OVERALL
-    blocks.append(("DAILY x OVERALL", insert_prefix + f"""
-        'DAILY', d.accuracy_date, d.accuracy_date,
-        'OVERALL', 'ALL', 'All Stores & Products',
+    # DAILY x OVERALL / STORE / CATEGORY
+    for dim in ("OVERALL", "STORE", "CATEGORY"):
+        blocks.append((f"DAILY x {dim}", delete_sql("DAILY", dim, "period_start"), (ds, de),
+                       insert_prefix + f"""
+        'DAILY', pa.accuracy_date, pa.accuracy_date,
+        pa.dimension_type, pa.dimension_value, MAX(pa.dimension_name),
         {metric_select}
-        {where_clause}
-        GROUP BY d.accuracy_date
-    """))
-
-    # DAILY x STORE
-    blocks.append(("DAILY x STORE", insert_prefix + f"""
-        'DAILY', d.accuracy_date, d.accuracy_date,
-        'STORE', CAST(d.shop_dept_id AS CHAR), MAX(d.shop_name),
+    FROM test.forecast_accuracy_partials pa
+    WHERE pa.dimension_type = '{dim}'
+      AND pa.accuracy_date >= %s AND pa.accuracy_date <= %s
+    GROUP BY pa.accuracy_date, pa.dimension_type, pa.dimension_value
+    """, (ds, de)))
+
+    # DAILY x DOW (the day's OVERALL sums, labelled by weekday)
+    blocks.append(("DAILY x DOW", delete_sql("DAILY", "DOW", "period_start"), (ds, de),
+                   insert_prefix + f"""
+        'DAILY', pa.accuracy_date, pa.accuracy_date,
+        'DOW', CAST(DAYOFWEEK(pa.accuracy_date) AS CHAR), DAYNAME(pa.accuracy_date),
         {metric_select}
-        {where_clause}
-        GROUP BY d.accuracy_date, d.shop_dept_id
-    """))
-
-    # DAILY x CATEGORY
-    blocks.append(("DAILY x CATEGORY", insert_prefix + f"""
-        'DAILY', d.accuracy_date, d.accuracy_date,
-        'CATEGORY', COALESCE(d.large_class_name, 'UNKNOWN'),
-        COALESCE(d.large_class_name, 'Unknown Category'),
-        {metric_select}
-        {where_clause}
-        GROUP BY d.accuracy_date, d.large_class_name
-    """))
-
-    # DAILY x DOW
-    blocks.append(("DAILY x DOW", insert_prefix + f"""
-        'DAILY', d.accuracy_date, d.accuracy_date,
-        'DOW', CAST(DAYOFWEEK(d.accuracy_date) AS CHAR), DAYNAME(d.accuracy_date),
+    FROM test.forecast_accuracy_partials pa
+    WHERE pa.dimension_type = 'OVERALL'
+      AND pa.accuracy_date >= %s AND pa.accuracy_date <= %s
+    GROUP BY pa.accuracy_date
+    """, (ds, de)))
+
+    # WEEKLY x OVERALL / STORE (whole ISO weeks touched by the range)
+    week_expr = "DATE_SUB(pa.accuracy_date, INTERVAL (WEEKDAY(pa.accuracy_date)) DAY)"
+    for dim, name in (("OVERALL", "CONCAT('Week ', YEARWEEK(MIN(pa.accuracy_date), 1))"),
+                      ("STORE", "MAX(pa.dimension_name)")):
+        blocks.append((f"WEEKLY x {dim}", delete_sql("WEEKLY", dim, "period_start"),
+                       (week_start, week_end), insert_prefix + f"""
+        'WEEKLY', {week_expr}, DATE_ADD({week_expr}, INTERVAL 6 DAY),
+        pa.dimension_type, pa.dimension_value, {name},
         {metric_select}
-        {where_clause}
-        GROUP BY d.accuracy_date, DAYOFWEEK(d.accuracy_date), DAYNAME(d.accuracy_date)
-    """))
-
-    # WEEKLY x OVERALL
-    blocks.append(("WEEKLY x OVERALL", insert_prefix + f"""
-        'WEEKLY',
-        DATE_SUB(d.accuracy_date, INTERVAL (WEEKDAY(d.accuracy_date)) DAY),
-        DATE_ADD(DATE_SUB(d.accuracy_date, INTERVAL (WEEKDAY(d.accuracy_date)) DAY), INTERVAL 6 DAY),
-        'OVERALL', 'ALL', CONCAT('Week ', YEARWEEK(d.accuracy_date, 1)),
+    FROM test.forecast_accuracy_partials pa
+    WHERE pa.dimension_type = '{dim}'
+      AND pa.accuracy_date >= %s AND pa.accuracy_date <= %s
+    GROUP BY {week_expr}, pa.dimension_type, pa.dimension_value
+    """, (week_start, week_end)))
+
+    # MONTHLY x OVERALL / CATEGORY (whole months touched by the range)
+    for dim, name in (("OVERALL", "DATE_FORMAT(MIN(pa.accuracy_date), '%%Y-%%m')"),
+                      ("CATEGORY", "MAX(pa.dimension_name)")):
+        blocks.append((f"MONTHLY x {dim}", delete_sql("MONTHLY", dim, "period_start"),
+                       (month_start, month_end), insert_prefix + f"""
+        'MONTHLY', DATE_FORMAT(pa.accuracy_date, '%%Y-%%m-01'), LAST_DAY(pa.accuracy_date),
+        pa.dimension_type, pa.dimension_value, {name},
         {metric_select}
-        {where_clause}
-        GROUP BY YEARWEEK(d.accuracy_date, 1),
-                 DATE_SUB(d.accuracy_date, INTERVAL (WEEKDAY(d.accuracy_date)) DAY)
-    """))
-
-    # WEEKLY x STORE
-    blocks.append(("WEEKLY x STORE", insert_prefix + f"""
-        'WEEKLY',
-        DATE_SUB(d.accuracy_date, INTERVAL (WEEKDAY(d.accuracy_date)) DAY),
-        DATE_ADD(DATE_SUB(d.accuracy_date, INTERVAL (WEEKDAY(d.accuracy_date)) DAY), INTERVAL 6 DAY),
-        'STORE', CAST(d.shop_dept_id AS CHAR), MAX(d.shop_name),
+    FROM test.forecast_accuracy_partials pa
+    WHERE pa.dimension_type = '{dim}'
+      AND pa.accuracy_date >= %s AND pa.accuracy_date <= %s
+    GROUP BY DATE_FORMAT(pa.accuracy_date, '%%Y-%%m-01'), LAST_DAY(pa.accuracy_date),
+             pa.dimension_type, pa.dimension_value
+    """, (month_start, month_end)))
+
+    # ROLLING_7D / ROLLING_30D: every window ending on a scored day in
+    # ds..de + (days - 1) contains a refreshed day
+    rolling_names = {"OVERALL": "All Stores & Products ({label} Rolling)"}
+    for period_type, days, dims in (("ROLLING_7D", 7, ("OVERALL", "STORE", "CATEGORY")),
+                                    ("ROLLING_30D", 30, ("OVERALL", "STORE"))):
+        ref_end = de + timedelta(days=days - 1)
+        for dim in dims:
+            name = (f"'{rolling_names[dim].format(label=period_type[8:])}'"
+                    if dim in rolling_names else "MAX(pa.dimension_name)")
+            blocks.append((f"{period_type} x {dim}", delete_sql(period_type, dim, "period_end"),
+                           (ds, ref_end), insert_prefix + f"""
+        '{period_type}', DATE_SUB(ref.ref_date, INTERVAL {days - 1} DAY), ref.ref_date,
+        pa.dimension_type, pa.dimension_value, {name},
         {metric_select}
-        {where_clause}
-        GROUP BY YEARWEEK(d.accuracy_date, 1),
-                 DATE_SUB(d.accuracy_date, INTERVAL (WEEKDAY(d.accuracy_date)) DAY),
-                 d.shop_dept_id
-    """))
-
-    # MONTHLY x OVERALL
-    blocks.append(("MONTHLY x OVERALL", insert_prefix + f"""
-        'MONTHLY',
-        DATE_FORMAT(d.accuracy_date, '%%Y-%%m-01'),
-        LAST_DAY(d.accuracy_date),
-        'OVERALL', 'ALL', DATE_FORMAT(d.accuracy_date, '%%Y-%%m'),
-        {metric_select}
-        {where_clause}
-        GROUP BY DATE_FORMAT(d.accuracy_date, '%%Y-%%m-01'), LAST_DAY(d.accuracy_date)
-    """))
-
-    # MONTHLY x CATEGORY
-    blocks.append(("MONTHLY x CATEGORY", insert_prefix + f"""
-        'MONTHLY',
-        DATE_FORMAT(d.accuracy_date, '%%Y-%%m-01'),
-        LAST_DAY(d.accuracy_date),
-        'CATEGORY', COALESCE(d.large_class_name, 'UNKNOWN'),
-        COALESCE(d.large_class_name, 'Unknown Category'),
-        {metric_select}
-        {where_clause}
-        GROUP BY DATE_FORMAT(d.accuracy_date, '%%Y-%%m-01'),
-                 LAST_DAY(d.accuracy_date), d.large_class_name
-    """))
-
-    # ROLLING_7D x OVERALL
-    blocks.append(("ROLLING_7D x OVERALL", insert_prefix + f"""
-        'ROLLING_7D',
-        DATE_SUB(ref.ref_date, INTERVAL 6 DAY),
-        ref.ref_date,
-        'OVERALL', 'ALL', 'All Stores & Products (7D Rolling)',
-        {metric_select.replace('d.', 'd2.')}
-    FROM (
-        SELECT DISTINCT accuracy_date AS ref_date
-        FROM test.forecast_accuracy_daily
-        WHERE accuracy_date >= %s AND accuracy_date <= %s
-    ) ref
-    INNER JOIN test.forecast_accuracy_daily d2
-        ON d2.accuracy_date BETWEEN DATE_SUB(ref.ref_date, INTERVAL 6 DAY) AND ref.ref_date
-    GROUP BY ref.ref_date
-    """.replace(metric_select.replace('d.', 'd2.'), """
-        ROUND(AVG(CASE WHEN d2.actual_consumption > 0 THEN d2.absolute_pct_error END), 4),
-        ROUND(SUM(d2.absolute_error) / NULLIF(SUM(d2.actual_consumption), 0), 4),
-        ROUND(SQRT(AVG(d2.squared_error)), 4),
-        ROUND(AVG(d2.forecast_error), 4),
-        ROUND(SUM(CASE WHEN d2.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END)
-            / NULLIF(COUNT(*), 0), 4),
-        ROUND(SUM(d2.forecast_error) / NULLIF(AVG(d2.absolute_error), 0), 4),
-        COUNT(*),
-        NULL,
-        ROUND(AVG(d2.actual_consumption), 2),
-        NOW()
-    """)))
-
-    # ROLLING_7D x STORE
-    blocks.append(("ROLLING_7D x STORE", insert_prefix + """
-        'ROLLING_7D',
-        DATE_SUB(ref.ref_date, INTERVAL 6 DAY),
-        ref.ref_date,
-        'STORE', CAST(d2.shop_dept_id AS CHAR), MAX(d2.shop_name),
-        ROUND(AVG(CASE WHEN d2.actual_consumption > 0 THEN d2.absolute_pct_error END), 4),
-        ROUND(SUM(d2.absolute_error) / NULLIF(SUM(d2.actual_consumption), 0), 4),
-        ROUND(SQRT(AVG(d2.squared_error)), 4),
-        ROUND(AVG(d2.forecast_error), 4),
-        ROUND(SUM(CASE WHEN d2.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END)
-            / NULLIF(COUNT(*), 0), 4),
-        ROUND(SUM(d2.forecast_error) / NULLIF(AVG(d2.absolute_error), 0), 4),
-        COUNT(*), NULL,
-        ROUND(AVG(d2.actual_consumption), 2), NOW()
-    FROM (
-        SELECT DISTINCT accuracy_date AS ref_date
-        FROM test.forecast_accuracy_daily
-        WHERE accuracy_date >= %s AND accuracy_date <= %s
-    ) ref
-    INNER JOIN test.forecast_accuracy_daily d2
-        ON d2.accuracy_date BETWEEN DATE_SUB(ref.ref_date, INTERVAL 6 DAY) AND ref.ref_date
-    GROUP BY ref.ref_date, d2.shop_dept_id
-    """))
-
-    # ROLLING_7D x CATEGORY
-    blocks.append(("ROLLING_7D x CATEGORY", insert_prefix + """
-        'ROLLING_7D',
-        DATE_SUB(ref.ref_date, INTERVAL 6 DAY),
-        ref.ref_date,
-        'CATEGORY', COALESCE(d2.large_class_name, 'UNKNOWN'),
-        COALESCE(d2.large_class_name, 'Unknown Category'),
-        ROUND(AVG(CASE WHEN d2.actual_consumption > 0 THEN d2.absolute_pct_error END), 4),
-        ROUND(SUM(d2.absolute_error) / NULLIF(SUM(d2.actual_consumption), 0), 4),
-        ROUND(SQRT(AVG(d2.squared_error)), 4),
-        ROUND(AVG(d2.forecast_error), 4),
-        ROUND(SUM(CASE WHEN d2.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END)
-            / NULLIF(COUNT(*), 0), 4),
-        ROUND(SUM(d2.forecast_error) / NULLIF(AVG(d2.absolute_error), 0), 4),
-        COUNT(*), NULL,
-        ROUND(AVG(d2.actual_consumption), 2), NOW()
-    FROM (
-        SELECT DISTINCT accuracy_date AS ref_date
-        FROM test.forecast_accuracy_daily
-        WHERE accuracy_date >= %s AND accuracy_date <= %s
-    ) ref
-    INNER JOIN test.forecast_accuracy_daily d2
-        ON d2.accuracy_date BETWEEN DATE_SUB(ref.ref_date, INTERVAL 6 DAY) AND ref.ref_date
-    GROUP BY ref.ref_date, d2.large_class_name
-    """))
-
-    # ROLLING_30D x OVERALL
-    blocks.append(("ROLLING_30D x OVERALL", insert_prefix + """
-        'ROLLING_30D',
-        DATE_SUB(ref.ref_date, INTERVAL 29 DAY),
-        ref.ref_date,
-        'OVERALL', 'ALL', 'All Stores & Products (30D Rolling)',
-        ROUND(AVG(CASE WHEN d2.actual_consumption > 0 THEN d2.absolute_pct_error END), 4),
-        ROUND(SUM(d2.absolute_error) / NULLIF(SUM(d2.actual_consumption), 0), 4),
-        ROUND(SQRT(AVG(d2.squared_error)), 4),
-        ROUND(AVG(d2.forecast_error), 4),
-        ROUND(SUM(CASE WHEN d2.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END)
-            / NULLIF(COUNT(*), 0), 4),
-        ROUND(SUM(d2.forecast_error) / NULLIF(AVG(d2.absolute_error), 0), 4),
-        COUNT(*), NULL,
-        ROUND(AVG(d2.actual_consumption), 2), NOW()
     FROM (
-        SELECT DISTINCT accuracy_date AS ref_date
-        FROM test.forecast_accuracy_daily
-        WHERE accuracy_date >= %s AND accuracy_date <= %s
+        SELECT accuracy_date AS ref_date
+        FROM test.forecast_accuracy_partials
+        WHERE dimension_type = 'OVERALL'
+          AND accuracy_date >= %s AND accuracy_date <= %s
     ) ref
-    INNER JOIN test.forecast_accuracy_daily d2
-        ON d2.accuracy_date BETWEEN DATE_SUB(ref.ref_date, INTERVAL 29 DAY) AND ref.ref_date
-    GROUP BY ref.ref_date
-    """))
-
-    # ROLLING_30D x STORE
-    blocks.append(("ROLLING_30D x STORE", insert_prefix + """
-        'ROLLING_30D',
-        DATE_SUB(ref.ref_date, INTERVAL 29 DAY),
-        ref.ref_date,
-        'STORE', CAST(d2.shop_dept_id AS CHAR), MAX(d2.shop_name),
-        ROUND(AVG(CASE WHEN d2.actual_consumption > 0 THEN d2.absolute_pct_error END), 4),
-        ROUND(SUM(d2.absolute_error) / NULLIF(SUM(d2.actual_consumption), 0), 4),
-        ROUND(SQRT(AVG(d2.squared_error)), 4),
-        ROUND(AVG(d2.forecast_error), 4),
-        ROUND(SUM(CASE WHEN d2.absolute_pct_error <= 0.20 THEN 1 ELSE 0 END)
-            / NULLIF(COUNT(*), 0), 4),
-        ROUND(SUM(d2.forecast_error) / NULLIF(AVG(d2.absolute_error), 0), 4),
-        COUNT(*), NULL,
-        ROUND(AVG(d2.actual_consumption), 2), NOW()
-    FROM (
-        SELECT DISTINCT accuracy_date AS ref_date
-        FROM test.forecast_accuracy_daily
-        WHERE accuracy_date >= %s AND accuracy_date <= %s
-    ) ref
-    INNER JOIN test.forecast_accuracy_daily d2
-        ON d2.accuracy_date BETWEEN DATE_SUB(ref.ref_date, INTERVAL 29 DAY) AND ref.ref_date
-    GROUP BY ref.ref_date, d2.shop_dept_id
-    """))
+    INNER JOIN test.forecast_accuracy_partials pa
+        ON  pa.dimension_type = '{dim}'
+        AND pa.accuracy_date BETWEEN DATE_SUB(ref.ref_date, INTERVAL {days - 1} DAY)
+                                 AND ref.ref_date
+    GROUP BY ref.ref_date, pa.dimension_type, pa.dimension_value
+    """, (ds, ref_end)))
 
     return blocks
 
 
+# ============================================================================
+# STEP 5b: PROBABILISTIC EVALUATION
+# ============================================================================
+# Pinball loss, P10-P90 interval coverage and MASE per store-SKU-day from
+# forecast_accuracy_daily, computed column-wise in forecast_eval.py.
+
+LOAD_EVAL_SQL = """
+SELECT DATEDIFF(accuracy_date, %s) AS day, shop_dept_id, goods_code,
+       predicted_demand, actual_consumption
+FROM test.forecast_accuracy_daily
+WHERE accuracy_date >= %s AND accuracy_date <= %s
+  AND predicted_demand IS NOT NULL
+  AND actual_consumption IS NOT NULL
+"""
+
+DELETE_PROBABILISTIC = """
+DELETE FROM test.forecast_probabilistic_metrics
+WHERE accuracy_date >= %s AND accuracy_date <= %s
+"""
+
+INSERT_PROBABILISTIC = """
+INSERT INTO test.forecast_probabilistic_metrics (
+    accuracy_date, shop_dept_id, goods_code, predicted_demand, actual_consumption,
+    quantile_p10, quantile_p50, quantile_p90, pinball_p10, pinball_p50, pinball_p90,
+    in_interval_80, naive_abs_error, scaled_error, calibration_points, computed_at
+) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+"""
+
+
+def _nullable(values) -> list:
+    """Array -> list with NaN as None."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def run_probabilistic_eval(conn, date_start: str, date_end: str) -> int:
+    """Write forecast_probabilistic_metrics for the given date range. Returns rows written.
+
+    Works in blocks of EVAL_BLOCK_DAYS; each block loads its days plus the
+    EVAL_CALIBRATION_DAYS + SEASON_DAYS before them in one range read.
+    """
+    log.info("STEP 5b: Evaluating quantile forecasts for %s to %s ...", date_start, date_end)
+    if forecast_eval is None:
+        log.warning("  numpy not installed; skipping probabilistic evaluation")
+        return 0
+
+    ds, de = date.fromisoformat(date_start), date.fromisoformat(date_end)
+    history_days = EVAL_CALIBRATION_DAYS + forecast_eval.SEASON_DAYS
+    written = 0
+    block_start = ds
+    while block_start <= de:
+        block_end = min(block_start + timedelta(days=EVAL_BLOCK_DAYS - 1), de)
+        load_start = block_start - timedelta(days=history_days)
+        columns = forecast_eval.columns_from_chunks(
+            stream_query(conn, LOAD_EVAL_SQL, (block_start, load_start, block_end)))
+        result = forecast_eval.evaluate(columns, 0, (block_end - block_start).days,
+                                        EVAL_CALIBRATION_DAYS, EVAL_WINDOW_DAYS)
+
+        rows = result["row"]
+        day_dates = {d: block_start + timedelta(days=d) for d in range((block_end - block_start).days + 1)}
+        values = list(zip(
+            [day_dates[d] for d in columns["day"][rows].tolist()],
+            columns["shop_dept_id"][rows].tolist(),
+            columns["goods_code"][rows].tolist(),
+            columns["forecast"][rows].tolist(),
+            columns["actual"][rows].tolist(),
+            *[_nullable(result["quantiles"][:, j]) for j in range(len(forecast_eval.QUANTILES))],
+            *[_nullable(result["pinball"][:, j]) for j in range(len(forecast_eval.QUANTILES))],
+            _nullable(result["in_interval"]),
+            _nullable(result["naive_abs_error"]),
+            _nullable(result["scaled_error"]),
+            result["calibration_points"].tolist(),
+        ))
+
+        with conn.cursor() as cur:
+            # Idempotent delete; delete + insert commit together
+            cur.execute(DELETE_PROBABILISTIC, (block_start, block_end))
+            for i in range(0, len(values), BATCH_SIZE):
+                cur.executemany(INSERT_PROBABILISTIC, values[i : i + BATCH_SIZE])
+        conn.commit()
+
+        summary = forecast_eval.summarize(result)
+        log.info("  %s..%s: %d rows (history %d), pinball P10/P50/P90 = %s, "
+                 "80%% coverage = %s, MASE = %s",
+                 block_start, block_end, len(values), len(columns["day"]),
+                 "/".join("-" if summary[k] is None else f"{summary[k]:.3f}"
+                          for k in ("pinball_p10", "pinball_p50", "pinball_p90")),
+                 "-" if summary["coverage"] is None else f"{summary['coverage']:.1%}",
+                 "-" if summary["mase"] is None else f"{summary['mase']:.3f}")
+        written += len(values)
+        block_start = block_end + timedelta(days=1)
+
+    log.info("  -> Probabilistic metrics written: %d rows", written)
+    return written
+
+
 # ============================================================================
 # STEP 6: DRIFT DETECTION & ALERTS
 # ============================================================================
 
-def run_drift_detection(conn, alert_date: str) -> int:
-    """Execute the 5 alert rules and insert into forecast_alerts."""
-    log.info("STEP 6: Running drift detection for alert_date=%s ...", alert_date)
+DRIFT_LOOKBACK_DAYS = 30      # one scan covers every rule's window
+
+MAPE_CRITICAL = Decimal("0.40")
+MAPE_WARNING = Decimal("0.30")
+BIAS_MIN_DAYS = 14
+DRIFT_WOW_CHANGE = Decimal("0.50")
+
+DRIFT_FEATURES_SQL = """
+SELECT pa.accuracy_date, pa.dimension_type, pa.dimension_value, pa.dimension_name,
+       pa.prediction_count, pa.ape_count, pa.sum_ape, pa.sum_forecast_error
+FROM test.forecast_accuracy_partials pa
+LEFT JOIN {store_table} ts
+    ON  pa.dimension_type = 'STORE'
+    AND ts.dept_id = CAST(pa.dimension_value AS UNSIGNED)
+WHERE pa.accuracy_date BETWEEN DATE_SUB(%s, INTERVAL {days} DAY) AND %s
+  AND (pa.dimension_type = 'CATEGORY'
+       OR (pa.dimension_type = 'STORE' AND ts.dept_id IS NOT NULL))
+""".format(store_table=STORE_ID_TABLE, days=DRIFT_LOOKBACK_DAYS)
+
+INSERT_ALERT = """
+INSERT IGNORE INTO test.forecast_alerts (
+    alert_date, alert_timestamp, alert_type, entity_type, entity_id, entity_name,
+    metric_name, metric_value, threshold_value, baseline_value,
+    description, recommended_action, is_acknowledged
+) VALUES (%s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, FALSE)
+"""
 
-    stores_list = ",".join(str(s) for s in ACTIVE_STORES)
-    alerts_before = 0
-    with conn.cursor() as cur:
-        cur.execute("SELECT COUNT(*) FROM test.forecast_alerts WHERE DATE(alert_timestamp) = CURDATE()")
-        alerts_before = cur.fetchone()[0]
 
-    with conn.cursor() as cur:
-        # RULE 1: CRITICAL - 7-day MAPE > 40% per store
-        cur.execute(f"""
-            INSERT INTO test.forecast_alerts (
-                alert_timestamp, alert_type, entity_type, entity_id, entity_name,
-                metric_name, metric_value, threshold_value,
-                description, recommended_action, is_acknowledged
-            )
-            SELECT NOW(), 'CRITICAL', 'STORE',
-                CAST(shop_dept_id AS CHAR), MAX(shop_name),
-                'mape_7d',
-                ROUND(AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END), 4),
-                0.4000,
-                CONCAT('CRITICAL: Store ', MAX(shop_name), ' 7-day MAPE = ',
-                       ROUND(AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) * 100, 1), '%% > 40%%'),
-                'Investigate SKU-level accuracy. Consider model retraining.',
-                FALSE
-            FROM test.forecast_accuracy_daily
-            WHERE accuracy_date BETWEEN DATE_SUB(%s, INTERVAL 6 DAY) AND %s
-              AND shop_dept_id IN ({stores_list})
-            GROUP BY shop_dept_id
-            HAVING AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) > 0.40
-               AND NOT EXISTS (
-                   SELECT 1 FROM test.forecast_alerts fa
-                   WHERE fa.alert_type = 'CRITICAL' AND fa.entity_id = CAST(shop_dept_id AS CHAR)
-                     AND fa.metric_name = 'mape_7d' AND DATE(fa.alert_timestamp) = CURDATE()
-               )
-        """, (alert_date, alert_date))
-        log.info("  Rule 1 (CRITICAL MAPE>40%%): %d alerts", cur.rowcount)
-
-        # RULE 2: WARNING - 7-day MAPE > 30% per store (<=40%)
-        cur.execute(f"""
-            INSERT INTO test.forecast_alerts (
-                alert_timestamp, alert_type, entity_type, entity_id, entity_name,
-                metric_name, metric_value, threshold_value,
-                description, recommended_action, is_acknowledged
-            )
-            SELECT NOW(), 'WARNING', 'STORE',
-                CAST(shop_dept_id AS CHAR), MAX(shop_name),
-                'mape_7d',
-                ROUND(AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END), 4),
-                0.3000,
-                CONCAT('WARNING: Store ', MAX(shop_name), ' 7-day MAPE = ',
-                       ROUND(AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) * 100, 1), '%% > 30%%'),
-                'Monitor closely for 2-3 days. Review top error SKUs.',
-                FALSE
-            FROM test.forecast_accuracy_daily
-            WHERE accuracy_date BETWEEN DATE_SUB(%s, INTERVAL 6 DAY) AND %s
-              AND shop_dept_id IN ({stores_list})
-            GROUP BY shop_dept_id
-            HAVING AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) > 0.30
-               AND AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) <= 0.40
-               AND NOT EXISTS (
-                   SELECT 1 FROM test.forecast_alerts fa
-                   WHERE fa.alert_type = 'WARNING' AND fa.entity_id = CAST(shop_dept_id AS CHAR)
-                     AND fa.metric_name = 'mape_7d' AND DATE(fa.alert_timestamp) = CURDATE()
-               )
-        """, (alert_date, alert_date))
-        log.info("  Rule 2 (WARNING MAPE>30%%): %d alerts", cur.rowcount)
-
-        # RULE 3: BIAS - 14+ consecutive same-sign MFE days
-        cur.execute(f"""
-            INSERT INTO test.forecast_alerts (
-                alert_timestamp, alert_type, entity_type, entity_id, entity_name,
-                metric_name, metric_value, threshold_value, baseline_value,
-                description, recommended_action, is_acknowledged
-            )
-            SELECT NOW(), 'BIAS', 'STORE',
-                CAST(bc.shop_dept_id AS CHAR), bc.shop_name,
-                'consecutive_bias_days', bc.consecutive_days, 14.0000, bc.avg_daily_mfe,
-                CONCAT('BIAS: Store ', bc.shop_name, ' has ',
-                       CASE WHEN bc.bias_direction = 'OVER' THEN 'over-predicted' ELSE 'under-predicted' END,
-                       ' for ', bc.consecutive_days, ' consecutive days.'),
-                'Systematic bias detected. Recommend model recalibration.',
-                FALSE
-            FROM (
-                SELECT sub.shop_dept_id, sub.shop_name, sub.bias_direction,
-                       COUNT(*) AS consecutive_days, AVG(sub.daily_mfe) AS avg_daily_mfe
-                FROM (
-                    SELECT d.shop_dept_id, MAX(d.shop_name) AS shop_name, d.accuracy_date,
-                           AVG(d.forecast_error) AS daily_mfe,
-                           CASE WHEN AVG(d.forecast_error) >= 0 THEN 'OVER' ELSE 'UNDER' END AS bias_direction,
-                           ROW_NUMBER() OVER (PARTITION BY d.shop_dept_id ORDER BY d.accuracy_date DESC) AS rn
-                    FROM test.forecast_accuracy_daily d
-                    WHERE d.accuracy_date BETWEEN DATE_SUB(%s, INTERVAL 30 DAY) AND %s
-                      AND d.shop_dept_id IN ({stores_list})
-                    GROUP BY d.shop_dept_id, d.accuracy_date
-                ) sub
-                WHERE sub.rn <= 30
-                GROUP BY sub.shop_dept_id, sub.shop_name, sub.bias_direction
-                HAVING MIN(sub.rn) = 1 AND COUNT(*) >= 14
-            ) bc
-            WHERE NOT EXISTS (
-                SELECT 1 FROM test.forecast_alerts fa
-                WHERE fa.alert_type = 'BIAS' AND fa.entity_id = CAST(bc.shop_dept_id AS CHAR)
-                  AND fa.metric_name = 'consecutive_bias_days' AND DATE(fa.alert_timestamp) = CURDATE()
-            )
-        """, (alert_date, alert_date))
-        log.info("  Rule 3 (BIAS 14+ days): %d alerts", cur.rowcount)
+def _round(value, places: int):
+    """ROUND() as MySQL does it for exact values (half away from zero)."""
+    return Decimal(value).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP)
 
-        # RULE 5: DRIFT - WoW MAPE change > 50% by category
-        cur.execute("""
-            INSERT INTO test.forecast_alerts (
-                alert_timestamp, alert_type, entity_type, entity_id, entity_name,
-                metric_name, metric_value, threshold_value, baseline_value,
-                description, recommended_action, is_acknowledged
-            )
-            SELECT NOW(), 'DRIFT', 'CATEGORY',
-                curr.large_class_name, curr.large_class_name,
-                'mape_wow_relative_change',
-                ROUND((curr.curr_mape - prev.prev_mape) / NULLIF(prev.prev_mape, 0), 4),
-                0.5000,
-                ROUND(prev.prev_mape, 4),
-                CONCAT('DRIFT: Category "', curr.large_class_name, '" MAPE WoW change = ',
-                       ROUND((curr.curr_mape - prev.prev_mape) / NULLIF(prev.prev_mape, 0) * 100, 1), '%%'),
-                'Investigate category for demand pattern changes.',
-                FALSE
-            FROM (
-                SELECT COALESCE(large_class_name, 'UNKNOWN') AS large_class_name,
-                       AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) AS curr_mape
-                FROM test.forecast_accuracy_daily
-                WHERE accuracy_date BETWEEN DATE_SUB(%s, INTERVAL 6 DAY) AND %s
-                GROUP BY large_class_name
-            ) curr
-            INNER JOIN (
-                SELECT COALESCE(large_class_name, 'UNKNOWN') AS large_class_name,
-                       AVG(CASE WHEN actual_consumption > 0 THEN absolute_pct_error END) AS prev_mape
-                FROM test.forecast_accuracy_daily
-                WHERE accuracy_date BETWEEN DATE_SUB(%s, INTERVAL 13 DAY) AND DATE_SUB(%s, INTERVAL 7 DAY)
-                GROUP BY large_class_name
-            ) prev ON curr.large_class_name = prev.large_class_name
-            WHERE prev.prev_mape > 0
-              AND ABS((curr.curr_mape - prev.prev_mape) / prev.prev_mape) > 0.50
-              AND NOT EXISTS (
-                  SELECT 1 FROM test.forecast_alerts fa
-                  WHERE fa.alert_type = 'DRIFT' AND fa.entity_id = curr.large_class_name
-                    AND fa.metric_name = 'mape_wow_relative_change' AND DATE(fa.alert_timestamp) = CURDATE()
-              )
-        """, (alert_date, alert_date, alert_date, alert_date))
-        log.info("  Rule 5 (DRIFT WoW>50%%): %d alerts", cur.rowcount)
 
-    conn.commit()
+def _window_mape(days: dict, first: date, last: date):
+    """MAPE over days first..last from per-day (count, ape_count, sum_ape, sum_fe) sums."""
+    ape_count = sum(v[1] for d, v in days.items() if first <= d <= last)
+    sum_ape = sum((v[2] for d, v in days.items() if first <= d <= last), Decimal(0))
+    return sum_ape / ape_count if ape_count else None
+
+
+def load_drift_features(conn, alert_date: date) -> tuple:
+    """One scan of the last DRIFT_LOOKBACK_DAYS of partials into per-entity features.
 
+    Returns (stores, categories): {entity_id -> {"name": str, "days": {date ->
+    (prediction_count, ape_count, sum_ape, sum_forecast_error)}}}. Stores
+    are limited to STORE_ID_TABLE, which must be loaded on conn.
+    """
+    stores, categories = {}, {}
     with conn.cursor() as cur:
-        cur.execute("SELECT COUNT(*) FROM test.forecast_alerts WHERE DATE(alert_timestamp) = CURDATE()")
-        alerts_after = cur.fetchone()[0]
+        cur.execute(DRIFT_FEATURES_SQL, (alert_date, alert_date))
+        for day, dim_type, dim_value, dim_name, count, ape_count, sum_ape, sum_fe in cur.fetchall():
+            entities = stores if dim_type == "STORE" else categories
+            entity = entities.setdefault(dim_value, {"name": dim_name, "days": {}})
+            entity["name"] = dim_name or entity["name"]
+            entity["days"][day] = (count, ape_count, sum_ape, sum_fe)
+    return stores, categories
+
+
+def evaluate_drift_rules(stores: dict, categories: dict, alert_date: date) -> list:
+    """Apply the alert rules to the feature frame. Returns INSERT_ALERT rows (minus alert_date)."""
+    alerts = []
+    week_start = alert_date - timedelta(days=6)
+
+    for store_id, store in stores.items():
+        name = store["name"]
+
+        # RULE 1 / RULE 2: 7-day MAPE > 40% CRITICAL, > 30% WARNING
+        mape = _window_mape(store["days"], week_start, alert_date)
+        if mape is not None and mape > MAPE_WARNING:
+            critical = mape > MAPE_CRITICAL
+            threshold = MAPE_CRITICAL if critical else MAPE_WARNING
+            alert_type = "CRITICAL" if critical else "WARNING"
+            alerts.append((
+                alert_type, "STORE", store_id, name, "mape_7d",
+                _round(mape, 4), threshold, None,
+                f"{alert_type}: Store {name} 7-day MAPE = {_round(mape * 100, 1)}% "
+                f"> {int(threshold * 100)}%",
+                "Investigate SKU-level accuracy. Consider model retraining." if critical
+                else "Monitor closely for 2-3 days. Review top error SKUs.",
+            ))
 
-    new_alerts = alerts_after - alerts_before
-    log.info("  -> Total new alerts generated: %d", new_alerts)
+        # RULE 3: BIAS - 14+ consecutive days (with data) of same-sign daily MFE
+        run = []
+        for day in sorted(store["days"], reverse=True):
+            count, _, _, sum_fe = store["days"][day]
+            daily_mfe = sum_fe / count
+            if run and (daily_mfe >= 0) != (run[0] >= 0):
+                break
+            run.append(daily_mfe)
+        if len(run) >= BIAS_MIN_DAYS:
+            direction = "over-predicted" if run[0] >= 0 else "under-predicted"
+            alerts.append((
+                "BIAS", "STORE", store_id, name, "consecutive_bias_days",
+                len(run), Decimal(BIAS_MIN_DAYS), _round(sum(run) / len(run), 4),
+                f"BIAS: Store {name} has {direction} for {len(run)} consecutive days.",
+                "Systematic bias detected. Recommend model recalibration.",
+            ))
+
+    # RULE 5: DRIFT - WoW MAPE change > 50% by category
+    prev_start = alert_date - timedelta(days=13)
+    prev_end = alert_date - timedelta(days=7)
+    for category, entity in categories.items():
+        curr_mape = _window_mape(entity["days"], week_start, alert_date)
+        prev_mape = _window_mape(entity["days"], prev_start, prev_end)
+        if curr_mape is None or not prev_mape:
+            continue
+        change = (curr_mape - prev_mape) / prev_mape
+        if abs(change) > DRIFT_WOW_CHANGE:
+            alerts.append((
+                "DRIFT", "CATEGORY", category, category, "mape_wow_relative_change",
+                _round(change, 4), DRIFT_WOW_CHANGE, _round(prev_mape, 4),
+                f'DRIFT: Category "{category}" MAPE WoW change = {_round(change * 100, 1)}%',
+                "Investigate category for demand pattern changes.",
+            ))
+
+    return alerts
+
+
+def run_drift_detection(conn, alert_date: str) -> int:
+    """Evaluate the alert rules from one feature scan and insert new forecast_alerts.
+
+    Reads per-day partials (refreshed by compute_aggregates in the same run)
+    instead of one aggregation over forecast_accuracy_daily per rule.
+    Alerts are deduplicated by the (alert_date, alert_type, entity_id,
+    metric_name) unique key, so re-running a date never duplicates.
+    Store rules join STORE_ID_TABLE, which must be loaded on conn.
+    """
+    log.info("STEP 6: Running drift detection for alert_date=%s ...", alert_date)
+    as_of = date.fromisoformat(alert_date)
+
+    stores, categories = load_drift_features(conn, as_of)
+    log.info("  Features: %d stores, %d categories over %d days",
+             len(stores), len(categories), DRIFT_LOOKBACK_DAYS + 1)
+
+    alerts = evaluate_drift_rules(stores, categories, as_of)
+    for alert_type in ("CRITICAL", "WARNING", "BIAS", "DRIFT"):
+        log.info("  %-9s %d candidate alerts", alert_type + ":",
+                 sum(1 for a in alerts if a[0] == alert_type))
+
+    new_alerts = 0
+    if alerts:
+        with conn.cursor() as cur:
+            cur.executemany(INSERT_ALERT, [(as_of,) + alert for alert in alerts])
+            new_alerts = cur.rowcount
+        conn.commit()
+
+    log.info("  -> Total new alerts generated: %d (%d already raised for %s)",
+             new_alerts, len(alerts) - new_alerts, alert_date)
     return new_alerts
 
 
+# ============================================================================
+# STEP 6b: PARQUET ARCHIVE
+# ============================================================================
+# With ARCHIVE_DIR set, every processed day of forecast_accuracy_daily is
+# written to a date-partitioned Parquet dataset for local DuckDB queries
+# (archive.py). Each day's partition is replaced as a whole.
+
+ARCHIVE_DAILY_SQL = """
+SELECT {columns}
+FROM test.forecast_accuracy_daily
+WHERE accuracy_date = %s
+""".format(columns=", ".join(archive.DAILY_COLUMNS))
+
+
+def archive_daily(conn, date_start: str, date_end: str) -> int:
+    """Write forecast_accuracy_daily for the range to ARCHIVE_DIR, one partition per day."""
+    log.info("STEP 6b: Archiving %s to %s into %s ...", date_start, date_end, archive.ARCHIVE_DIR)
+    archive.require_pyarrow()
+
+    written = 0
+    day = date.fromisoformat(date_start)
+    while day <= date.fromisoformat(date_end):
+        rows = archive.write_daily_partition(
+            archive.ARCHIVE_DIR, day, stream_query(conn, ARCHIVE_DAILY_SQL, (day,)))
+        log.debug("  %s: %d rows", day, rows)
+        written += rows
+        day += timedelta(days=1)
+
+    log.info("  -> Archived %d rows", written)
+    return written
+
+
 # ============================================================================
 # STEP 7: CLEANUP
 # ============================================================================
 
-def cleanup_staging(conn):
+def cleanup_staging(conn, temporary: bool = False):
     """Drop staging tables."""
     log.info("STEP 7: Cleaning up staging tables ...")
+    table = "TEMPORARY TABLE" if temporary else "TABLE"
     with conn.cursor() as cur:
-        cur.execute("DROP TABLE IF EXISTS test.tmp_predictions")
-        cur.execute("DROP TABLE IF EXISTS test.tmp_actuals")
+        cur.execute(f"DROP {table} IF EXISTS test.tmp_predictions")
+        cur.execute(f"DROP {table} IF EXISTS test.tmp_actuals")
     conn.commit()
     log.info("  -> Staging tables dropped")
 
 
+# ============================================================================
+# CHECKPOINTS (--resume)
+# ============================================================================
+# Each run keeps CHECKPOINT_DIR/<run_id>/checkpoint.json with its arguments
+# and the steps completed so far (result, artifact, completed_at). Extracted
+# actuals are spilled to actuals.parquet next to it. --resume RUN_ID skips
+# the recorded steps and reads the spill file instead of scm-shopstock.
+# The directory is removed when the run completes.
+
+def checkpoint_path(run_id: str) -> Path:
+    """Directory holding the checkpoint and spill files of a run."""
+    return Path(CHECKPOINT_DIR) / run_id
+
+
+def load_checkpoint(run_id: str) -> dict:
+    """Read the checkpoint manifest of a failed run."""
+    try:
+        return json.loads((checkpoint_path(run_id) / "checkpoint.json").read_text())
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"No checkpoint for run {run_id} in {CHECKPOINT_DIR} ({e})")
+
+
+def save_checkpoint(checkpoint: dict, step: str = None, result=None, artifact: str = None):
+    """Record step as completed (if given) and rewrite the manifest atomically.
+
+    A no-op for runs without a checkpoint (dry runs, shards).
+    """
+    if checkpoint is None:
+        return
+    if step:
+        checkpoint["steps"][step] = {
+            "result": result, "artifact": artifact, "completed_at": datetime.now().isoformat(),
+        }
+    directory = checkpoint_path(checkpoint["run_id"])
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / "checkpoint.json.tmp"
+    tmp.write_text(json.dumps(checkpoint, indent=2, default=str))
+    os.replace(tmp, directory / "checkpoint.json")
+
+
+def step_done(checkpoint: dict, step: str):
+    """Result recorded for step by a previous attempt, or None."""
+    if checkpoint is None or step not in checkpoint["steps"]:
+        return None
+    result = checkpoint["steps"][step]["result"]
+    log.info("%s: completed by a previous attempt (%s), skipping", step, result)
+    return result
+
+
+def spilled_actuals(checkpoint: dict):
+    """Path of a complete actuals spill file from a previous attempt, or None."""
+    step = (checkpoint or {}).get("steps", {}).get("EXTRACT_ACTUALS")
+    if step and step["artifact"] and Path(step["artifact"]).exists():
+        return Path(step["artifact"])
+    return None
+
+
+def clear_checkpoint(checkpoint: dict):
+    """Remove the checkpoint directory (manifest and spill files)."""
+    if checkpoint is not None:
+        shutil.rmtree(checkpoint_path(checkpoint["run_id"]), ignore_errors=True)
+
+
 # ============================================================================
 # PIPELINE LOGGING
 # ============================================================================
@@ -870,7 +1493,7 @@ def log_pipeline_run(conn, run_id: str, step: str, status: str,
 # ============================================================================
 
 def setup_tables(conn):
-    """Create the 4 analytics tables if they don't exist."""
+    """Create the 8 analytics tables if they don't exist."""
     log.info("SETUP: Creating analytics tables ...")
 
     ddl_file = Path(__file__).parent.parent / "sql" / "02_create_analytics_schema.sql"
@@ -915,27 +1538,234 @@ def setup_tables(conn):
             SELECT TABLE_NAME FROM information_schema.TABLES
             WHERE TABLE_SCHEMA = 'test'
               AND TABLE_NAME IN ('forecast_accuracy_daily','forecast_accuracy_summary',
-                                 'forecast_alerts','forecast_pipeline_run_log')
+                                 'forecast_alerts','forecast_pipeline_run_log',
+                                 'forecast_accuracy_partials','forecast_prediction_latest',
+                                 'forecast_probabilistic_metrics','dim_store')
             ORDER BY TABLE_NAME
         """)
         tables = [row[0] for row in cur.fetchall()]
 
     log.info("  -> Tables found: %s", ", ".join(tables) if tables else "NONE")
-    if len(tables) < 4:
-        log.warning("  Not all 4 tables were created. Missing: %s",
+    if len(tables) < 8:
+        log.warning("  Not all 8 tables were created. Missing: %s",
                      set(["forecast_accuracy_daily", "forecast_accuracy_summary",
-                          "forecast_alerts", "forecast_pipeline_run_log"]) - set(tables))
+                          "forecast_alerts", "forecast_pipeline_run_log",
+                          "forecast_accuracy_partials", "forecast_prediction_latest",
+                          "forecast_probabilistic_metrics", "dim_store"]) - set(tables))
     else:
-        log.info("  -> All 4 tables ready!")
+        log.info("  -> All 8 tables ready!")
 
 
 # ============================================================================
 # MAIN PIPELINE
 # ============================================================================
 
-def run_pipeline(calc_date_start: str, calc_date_end: str, dry_run: bool = False):
-    """Execute the full pipeline for the given date range."""
-    run_id = str(uuid.uuid4())[:12]
+def _actuals_source(actual_conn, date_start: str, date_end: str, checkpoint: dict):
+    """Chunks of actuals: from a previous attempt's spill file, or extracted
+    from scm-shopstock (and spilled when the run has a checkpoint)."""
+    spill = spilled_actuals(checkpoint)
+    if spill:
+        log.info("STEP 2: Reading actuals from checkpoint spill %s", spill)
+        return archive.read_spill(spill, BATCH_SIZE)
+
+    chunks = extract_actuals(actual_conn, date_start, date_end)
+    if checkpoint is None:
+        return chunks
+    if archive.pa is None:
+        log.warning("  pyarrow not installed; actuals are not spilled (--resume re-extracts them)")
+        return chunks
+    spill = checkpoint_path(checkpoint["run_id"]) / "actuals.parquet"
+    spill.parent.mkdir(parents=True, exist_ok=True)
+    return archive.spill_chunks(chunks, spill, archive.actuals_schema())
+
+
+def _checkpoint_actuals(checkpoint: dict, n_actuals: int):
+    """Record EXTRACT_ACTUALS with its spill file (if one was written)."""
+    if checkpoint is None or spilled_actuals(checkpoint):
+        return
+    spill = checkpoint_path(checkpoint["run_id"]) / "actuals.parquet"
+    save_checkpoint(checkpoint, "EXTRACT_ACTUALS", n_actuals,
+                    artifact=str(spill) if spill.exists() else None)
+
+
+def extract_and_compute(run_id: str, actual_conn, analytics_conn,
+                        date_start: str, date_end: str, compute_mode: str,
+                        temporary_staging: bool = False, checkpoint: dict = None) -> tuple:
+    """Steps 1-4 for one date range: extract, join and write forecast_accuracy_daily.
+
+    Predictions are read from the snapshot on analytics_conn, so
+    refresh_prediction_snapshot must have run first. With a checkpoint,
+    extracted actuals are spilled to Parquet and recorded as EXTRACT_ACTUALS;
+    a resumed run reads them back instead of querying actual_conn.
+
+    Returns (predictions, actuals, daily_rows). Stops after an empty
+    extract (predictions == 0 or actuals == 0) without writing anything.
+    Staging tables are dropped before returning.
+    """
+    if compute_mode == "memory":
+        # Steps 1-2: Stream predictions and actuals into DataFrames
+        step_start = datetime.now()
+        predictions = frame_from_chunks(
+            extract_predictions(analytics_conn, date_start, date_end),
+            PREDICTION_COLUMNS, ["vlt_avg_demand", "order_num"])
+        n_predictions = len(predictions)
+        log.info("  -> Extracted %d prediction rows", n_predictions)
+        log_pipeline_run(analytics_conn, run_id, "EXTRACT_PREDICTIONS", "SUCCESS",
+                         date_start, date_end,
+                         rows_extracted=n_predictions, start_time=step_start)
+
+        if not n_predictions:
+            return 0, 0, 0
+
+        step_start = datetime.now()
+        actuals = frame_from_chunks(
+            _actuals_source(actual_conn, date_start, date_end, checkpoint),
+            ACTUAL_COLUMNS, ["actual_consumption"])
+        n_actuals = len(actuals)
+        log.info("  -> Extracted %d actual consumption rows", n_actuals)
+        log_pipeline_run(analytics_conn, run_id, "EXTRACT_ACTUALS", "SUCCESS",
+                         date_start, date_end,
+                         rows_extracted=n_actuals, start_time=step_start)
+        _checkpoint_actuals(checkpoint, n_actuals)
+
+        if not n_actuals:
+            return n_predictions, 0, 0
+
+        # Steps 3-4: Join & compute in process
+        step_start = datetime.now()
+        daily_rows = compute_accuracy_memory(analytics_conn, predictions, actuals,
+                                             date_start, date_end)
+        del predictions, actuals
+        log_pipeline_run(analytics_conn, run_id, "COMPUTE_ACCURACY", "SUCCESS",
+                         date_start, date_end,
+                         rows_loaded=daily_rows, start_time=step_start)
+        return n_predictions, n_actuals, daily_rows
+
+    # Steps 1-3: Stream predictions and actuals straight into staging
+    staging_start = datetime.now()
+    create_staging(analytics_conn, temporary=temporary_staging)
+    try:
+        step_start = datetime.now()
+        log.info("STEP 1: Loading predictions for %s to %s from snapshot ...",
+                 date_start, date_end)
+        with analytics_conn.cursor() as cur:
+            cur.execute(LOAD_PREDICTIONS_FROM_SNAPSHOT, (date_start, date_end))
+            n_predictions = cur.rowcount
+        analytics_conn.commit()
+        log.info("  -> Loaded %d prediction rows into staging", n_predictions)
+        log_pipeline_run(analytics_conn, run_id, "EXTRACT_PREDICTIONS", "SUCCESS",
+                         date_start, date_end,
+                         rows_extracted=n_predictions, start_time=step_start)
+
+        if not n_predictions:
+            return 0, 0, 0
+
+        step_start = datetime.now()
+        n_actuals = stream_to_staging(
+            _actuals_source(actual_conn, date_start, date_end, checkpoint),
+            analytics_conn, INSERT_ACTUALS, "actuals")
+        log_pipeline_run(analytics_conn, run_id, "EXTRACT_ACTUALS", "SUCCESS",
+                         date_start, date_end,
+                         rows_extracted=n_actuals, start_time=step_start)
+        _checkpoint_actuals(checkpoint, n_actuals)
+
+        if not n_actuals:
+            return n_predictions, 0, 0
+
+        log_pipeline_run(analytics_conn, run_id, "LOAD_STAGING", "SUCCESS",
+                         date_start, date_end,
+                         rows_loaded=n_predictions + n_actuals,
+                         start_time=staging_start)
+
+        # Step 4: Compute accuracy
+        step_start = datetime.now()
+        daily_rows = compute_accuracy(analytics_conn, date_start, date_end)
+        log_pipeline_run(analytics_conn, run_id, "COMPUTE_ACCURACY", "SUCCESS",
+                         date_start, date_end,
+                         rows_loaded=daily_rows, start_time=step_start)
+        return n_predictions, n_actuals, daily_rows
+    finally:
+        try:
+            cleanup_staging(analytics_conn, temporary=temporary_staging)
+        except Exception as e:
+            log.warning("  Failed to drop staging tables: %s", e)
+
+
+def aggregate_and_detect(run_id: str, analytics_conn, date_start: str, date_end: str,
+                         checkpoint: dict = None) -> tuple:
+    """Steps 5-6b over the whole range. Returns (summary_rows, new_alerts).
+
+    Steps recorded in checkpoint by a previous attempt are skipped.
+    """
+    summary_rows = step_done(checkpoint, "COMPUTE_AGGREGATES")
+    if summary_rows is None:
+        step_start = datetime.now()
+        summary_rows = compute_aggregates(analytics_conn, date_start, date_end)
+        log_pipeline_run(analytics_conn, run_id, "COMPUTE_AGGREGATES", "SUCCESS",
+                         date_start, date_end,
+                         rows_loaded=summary_rows, start_time=step_start)
+        save_checkpoint(checkpoint, "COMPUTE_AGGREGATES", summary_rows)
+
+    if step_done(checkpoint, "PROBABILISTIC_EVAL") is None:
+        step_start = datetime.now()
+        eval_rows = run_probabilistic_eval(analytics_conn, date_start, date_end)
+        log_pipeline_run(analytics_conn, run_id, "PROBABILISTIC_EVAL",
+                         "SUCCESS" if forecast_eval else "SKIPPED",
+                         date_start, date_end,
+                         rows_loaded=eval_rows, start_time=step_start)
+        save_checkpoint(checkpoint, "PROBABILISTIC_EVAL", eval_rows)
+
+    new_alerts = step_done(checkpoint, "DRIFT_DETECTION")
+    if new_alerts is None:
+        step_start = datetime.now()
+        new_alerts = run_drift_detection(analytics_conn, date_end)
+        log_pipeline_run(analytics_conn, run_id, "DRIFT_DETECTION", "SUCCESS",
+                         date_start, date_end,
+                         rows_loaded=new_alerts, start_time=step_start)
+        save_checkpoint(checkpoint, "DRIFT_DETECTION", new_alerts)
+
+    if archive.ARCHIVE_DIR and step_done(checkpoint, "ARCHIVE_DAILY") is None:
+        step_start = datetime.now()
+        archived = archive_daily(analytics_conn, date_start, date_end)
+        log_pipeline_run(analytics_conn, run_id, "ARCHIVE_DAILY", "SUCCESS",
+                         date_start, date_end,
+                         rows_loaded=archived, start_time=step_start)
+        save_checkpoint(checkpoint, "ARCHIVE_DAILY", archived)
+    return summary_rows, new_alerts
+
+
+def run_pipeline(calc_date_start: str, calc_date_end: str, dry_run: bool = False,
+                 compute_mode: str = None, rebuild_snapshot: bool = False,
+                 checkpoint: dict = None):
+    """Execute the full pipeline for the given date range.
+
+    compute_mode (default COMPUTE_MODE): "staging" loads tmp_predictions /
+    tmp_actuals on dbatest and joins there; "memory" joins in process with
+    pandas and writes forecast_accuracy_daily directly.
+    rebuild_snapshot truncates and reloads forecast_prediction_latest.
+    checkpoint is the manifest of a failed run to resume (see resume_pipeline);
+    otherwise a new one is started. Steps are logged under run_id for the
+    first attempt and run_id:rN for the Nth resume.
+    """
+    compute_mode = compute_mode or COMPUTE_MODE
+    if compute_mode == "memory" and pd is None:
+        raise RuntimeError("--compute-mode memory requires pandas (pip install pandas)")
+    if dry_run:
+        checkpoint = None
+        run_id = str(uuid.uuid4())[:12]
+    else:
+        if checkpoint is None:
+            checkpoint = {
+                "run_id": str(uuid.uuid4())[:12], "attempt": 0,
+                "date_start": calc_date_start, "date_end": calc_date_end,
+                "compute_mode": compute_mode, "rebuild_snapshot": rebuild_snapshot,
+                "steps": {},
+            }
+        else:
+            checkpoint["attempt"] += 1
+        run_id = checkpoint["run_id"]
+        if checkpoint["attempt"]:
+            run_id = f"{run_id}:r{checkpoint['attempt']}"
     pipeline_start = datetime.now()
 
     log.info("=" * 70)
@@ -943,96 +1773,288 @@ def run_pipeline(calc_date_start: str, calc_date_end: str, dry_run: bool = False
     log.info("Run ID:     %s", run_id)
     log.info("Date range: %s to %s", calc_date_start, calc_date_end)
     log.info("Dry run:    %s", dry_run)
+    log.info("Compute:    %s", compute_mode)
     log.info("=" * 70)
 
-    # Connect to all 3 servers
+    stores = stores_active_between(calc_date_start, calc_date_end)
+    log.info("Stores:     %d (registry, NEW/ACTIVE during the range)", len(stores))
+
+    # Connect to the servers still needed (a resumed run may skip the sources)
     pred_conn = None
     actual_conn = None
     analytics_conn = None
+    done = checkpoint["steps"] if checkpoint else {}
 
     try:
-        pred_conn = get_connection("PRED")
-        actual_conn = get_connection("ACTUAL")
+        # Written before connecting, so any failure below leaves a resumable run
+        save_checkpoint(checkpoint)
+        if "REFRESH_SNAPSHOT" not in done:
+            pred_conn = get_connection("PRED")
+        if "COMPUTE_ACCURACY" not in done and not spilled_actuals(checkpoint):
+            actual_conn = get_connection("ACTUAL")
         analytics_conn = get_connection("ANALYTICS")
+        for conn in (pred_conn, actual_conn, analytics_conn):
+            if conn:
+                load_store_id_table(conn, stores)
 
         # Log start
         log_pipeline_run(analytics_conn, run_id, "PIPELINE_START", "RUNNING",
                          calc_date_start, calc_date_end, start_time=pipeline_start)
 
-        # Step 1: Extract predictions
-        step_start = datetime.now()
-        predictions = extract_predictions(pred_conn, calc_date_start, calc_date_end)
-        log_pipeline_run(analytics_conn, run_id, "EXTRACT_PREDICTIONS", "SUCCESS",
-                         calc_date_start, calc_date_end,
-                         rows_extracted=len(predictions), start_time=step_start)
-
-        # Step 2: Extract actuals
-        step_start = datetime.now()
-        actuals = extract_actuals(actual_conn, calc_date_start, calc_date_end)
-        log_pipeline_run(analytics_conn, run_id, "EXTRACT_ACTUALS", "SUCCESS",
-                         calc_date_start, calc_date_end,
-                         rows_extracted=len(actuals), start_time=step_start)
-
         if dry_run:
             log.info("DRY RUN: Skipping load and compute steps.")
-            log.info("  Predictions: %d rows", len(predictions))
-            log.info("  Actuals:     %d rows", len(actuals))
-            if predictions:
-                log.info("  Sample prediction: %s", predictions[0])
-            if actuals:
-                log.info("  Sample actual:     %s", actuals[0])
+            for label, chunks in (
+                ("Predictions", extract_latest_predictions(pred_conn, calc_date_start,
+                                                           calc_date_end)),
+                ("Actuals", extract_actuals(actual_conn, calc_date_start, calc_date_end)),
+            ):
+                count, sample = 0, None
+                for chunk in chunks:
+                    sample = sample or chunk[0]
+                    count += len(chunk)
+                log.info("  %-12s %d rows", label + ":", count)
+                if sample:
+                    log.info("  Sample:       %s", sample)
             return
 
-        if not predictions:
+        sync_store_dimension(analytics_conn)
+
+        # Step 1: Top up the latest-prediction snapshot
+        if step_done(checkpoint, "REFRESH_SNAPSHOT") is None:
+            step_start = datetime.now()
+            snapshot_rows = refresh_prediction_snapshot(pred_conn, analytics_conn, calc_date_start,
+                                                        rebuild=rebuild_snapshot)
+            log_pipeline_run(analytics_conn, run_id, "REFRESH_SNAPSHOT", "SUCCESS",
+                             calc_date_start, calc_date_end,
+                             rows_loaded=snapshot_rows, start_time=step_start)
+            save_checkpoint(checkpoint, "REFRESH_SNAPSHOT", snapshot_rows)
+
+        # Steps 1-4: Extract, join & compute accuracy
+        counts = step_done(checkpoint, "COMPUTE_ACCURACY")
+        if counts is None:
+            counts = extract_and_compute(run_id, actual_conn, analytics_conn,
+                                         calc_date_start, calc_date_end, compute_mode,
+                                         checkpoint=checkpoint)
+        n_predictions, n_actuals, daily_rows = counts
+
+        if not n_predictions:
             log.warning("No predictions found for date range. Aborting.")
             log_pipeline_run(analytics_conn, run_id, "PIPELINE_ABORT", "FAILED",
                              calc_date_start, calc_date_end,
                              error_msg="No predictions found", start_time=pipeline_start)
+            clear_checkpoint(checkpoint)
             return
 
-        if not actuals:
+        if not n_actuals:
             log.warning("No actuals found for date range. Aborting.")
             log_pipeline_run(analytics_conn, run_id, "PIPELINE_ABORT", "FAILED",
                              calc_date_start, calc_date_end,
                              error_msg="No actuals found", start_time=pipeline_start)
+            clear_checkpoint(checkpoint)
             return
+        save_checkpoint(checkpoint, "COMPUTE_ACCURACY", list(counts))
 
-        # Step 3: Load staging
-        step_start = datetime.now()
-        load_staging(analytics_conn, predictions, actuals)
-        log_pipeline_run(analytics_conn, run_id, "LOAD_STAGING", "SUCCESS",
-                         calc_date_start, calc_date_end,
-                         rows_loaded=len(predictions) + len(actuals),
-                         start_time=step_start)
+        # Steps 5-6: Aggregates & drift detection
+        summary_rows, new_alerts = aggregate_and_detect(run_id, analytics_conn,
+                                                        calc_date_start, calc_date_end,
+                                                        checkpoint=checkpoint)
 
-        # Step 4: Compute accuracy
-        step_start = datetime.now()
-        daily_rows = compute_accuracy(analytics_conn, calc_date_start, calc_date_end)
-        log_pipeline_run(analytics_conn, run_id, "COMPUTE_ACCURACY", "SUCCESS",
+        # Final log
+        log_pipeline_run(analytics_conn, run_id, "PIPELINE_COMPLETE", "SUCCESS",
                          calc_date_start, calc_date_end,
-                         rows_loaded=daily_rows, start_time=step_start)
+                         rows_extracted=n_predictions + n_actuals,
+                         rows_loaded=daily_rows,
+                         start_time=pipeline_start)
+        clear_checkpoint(checkpoint)
+
+        duration = (datetime.now() - pipeline_start).total_seconds()
+        log.info("=" * 70)
+        log.info("PIPELINE COMPLETE")
+        log.info("  Duration:     %.1f seconds", duration)
+        log.info("  Predictions:  %d extracted", n_predictions)
+        log.info("  Actuals:      %d extracted", n_actuals)
+        log.info("  Daily rows:   %d computed", daily_rows)
+        log.info("  Summary rows: %d aggregated", summary_rows)
+        log.info("  Alerts:       %d generated", new_alerts)
+        log.info("=" * 70)
+
+    except Exception as e:
+        log.error("PIPELINE FAILED: %s", e, exc_info=True)
+        if analytics_conn:
+            log_pipeline_run(analytics_conn, run_id, "PIPELINE_FAILED", "FAILED",
+                             calc_date_start, calc_date_end,
+                             error_msg=str(e)[:500], start_time=pipeline_start)
+        if checkpoint and (checkpoint_path(checkpoint["run_id"]) / "checkpoint.json").exists():
+            log.error("Completed steps are checkpointed in %s. Resume with: "
+                      "python run_pipeline.py --resume %s",
+                      checkpoint_path(checkpoint["run_id"]), checkpoint["run_id"])
+        raise
+
+    finally:
+        for conn in [pred_conn, actual_conn, analytics_conn]:
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def resume_pipeline(run_id: str):
+    """Re-run a failed run_pipeline run from its first incomplete step."""
+    checkpoint = load_checkpoint(run_id)
+    log.info("Resuming run %s (%s to %s), completed steps: %s",
+             run_id, checkpoint["date_start"], checkpoint["date_end"],
+             ", ".join(checkpoint["steps"]) or "none")
+    run_pipeline(checkpoint["date_start"], checkpoint["date_end"],
+                 compute_mode=checkpoint["compute_mode"],
+                 rebuild_snapshot=checkpoint["rebuild_snapshot"],
+                 checkpoint=checkpoint)
+
+
+# ============================================================================
+# SHARDED PIPELINE (--workers)
+# ============================================================================
+
+def date_shards(date_start: str, date_end: str, shard_days: int) -> list:
+    """Split [date_start, date_end] into consecutive (start, end) shards of shard_days."""
+    shards = []
+    shard_start = date.fromisoformat(date_start)
+    end = date.fromisoformat(date_end)
+    while shard_start <= end:
+        shard_end = min(shard_start + timedelta(days=shard_days - 1), end)
+        shards.append((shard_start.isoformat(), shard_end.isoformat()))
+        shard_start = shard_end + timedelta(days=1)
+    return shards
+
+
+def process_shard(run_id: str, shard_start: str, shard_end: str, stores: dict,
+                  compute_mode: str) -> tuple:
+    """Steps 1-4 for one shard on its own connections (runs in a worker thread).
+
+    Staging tables are session TEMPORARY tables; forecast_accuracy_daily
+    writes are idempotent per shard date range. Step rows are logged as
+    "<run_id>:<shard_start>" (run log is unique on run_id + step_name).
+    """
+    shard_run_id = f"{run_id}:{shard_start}"
+    actual_conn = None
+    analytics_conn = None
+    try:
+        actual_conn = get_connection("ACTUAL")
+        analytics_conn = get_connection("ANALYTICS")
+        for conn in (actual_conn, analytics_conn):
+            load_store_id_table(conn, stores)
+
+        counts = extract_and_compute(shard_run_id, actual_conn, analytics_conn,
+                                     shard_start, shard_end, compute_mode,
+                                     temporary_staging=True)
+        log.info("  Shard %s..%s: %d predictions, %d actuals -> %d daily rows",
+                 shard_start, shard_end, *counts)
+        return counts
+    finally:
+        for conn in [actual_conn, analytics_conn]:
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def run_pipeline_sharded(calc_date_start: str, calc_date_end: str, workers: int = None,
+                         shard_days: int = None, compute_mode: str = None,
+                         rebuild_snapshot: bool = False):
+    """Execute the pipeline with the date range split across a worker pool.
+
+    The prediction snapshot is refreshed once; then each shard of shard_days
+    (default SHARD_DAYS) runs steps 1-4 on its own connections in one of
+    `workers` threads (default PIPELINE_WORKERS).
+    Aggregates and drift detection then run once over the whole range.
+    If any shard fails, steps 5-6 are skipped and the run fails; re-running
+    is safe because every shard rewrites its own dates.
+    """
+    workers = workers or PIPELINE_WORKERS
+    shard_days = shard_days or SHARD_DAYS
+    compute_mode = compute_mode or COMPUTE_MODE
+    if compute_mode == "memory" and pd is None:
+        raise RuntimeError("--compute-mode memory requires pandas (pip install pandas)")
+    run_id = str(uuid.uuid4())[:12]
+    pipeline_start = datetime.now()
+    shards = date_shards(calc_date_start, calc_date_end, shard_days)
+
+    log.info("=" * 70)
+    log.info("UC-SC-01 FORECAST ACCURACY PIPELINE (SHARDED)")
+    log.info("Run ID:     %s", run_id)
+    log.info("Date range: %s to %s", calc_date_start, calc_date_end)
+    log.info("Shards:     %d x %d day(s), %d workers", len(shards), shard_days, workers)
+    log.info("Compute:    %s", compute_mode)
+    log.info("=" * 70)
+
+    stores = stores_active_between(calc_date_start, calc_date_end)
+    log.info("Stores:     %d (registry, NEW/ACTIVE during the range)", len(stores))
+
+    analytics_conn = None
+    try:
+        analytics_conn = get_connection("ANALYTICS")
+        load_store_id_table(analytics_conn, stores)
+        log_pipeline_run(analytics_conn, run_id, "PIPELINE_START", "RUNNING",
+                         calc_date_start, calc_date_end, start_time=pipeline_start)
+        sync_store_dimension(analytics_conn)
 
-        # Step 5: Aggregates
+        # Step 1: Top up the latest-prediction snapshot shared by all shards
         step_start = datetime.now()
-        summary_rows = compute_aggregates(analytics_conn, calc_date_start, calc_date_end)
-        log_pipeline_run(analytics_conn, run_id, "COMPUTE_AGGREGATES", "SUCCESS",
+        pred_conn = get_connection("PRED")
+        try:
+            load_store_id_table(pred_conn, stores)
+            snapshot_rows = refresh_prediction_snapshot(pred_conn, analytics_conn,
+                                                        calc_date_start, rebuild=rebuild_snapshot)
+        finally:
+            pred_conn.close()
+        log_pipeline_run(analytics_conn, run_id, "REFRESH_SNAPSHOT", "SUCCESS",
                          calc_date_start, calc_date_end,
-                         rows_loaded=summary_rows, start_time=step_start)
+                         rows_loaded=snapshot_rows, start_time=step_start)
 
-        # Step 6: Drift detection
+        # Steps 1-4: one unit of work per shard
         step_start = datetime.now()
-        new_alerts = run_drift_detection(analytics_conn, calc_date_end)
-        log_pipeline_run(analytics_conn, run_id, "DRIFT_DETECTION", "SUCCESS",
+        results = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard") as pool:
+            futures = {
+                pool.submit(process_shard, run_id, shard_start, shard_end, stores, compute_mode):
+                    (shard_start, shard_end)
+                for shard_start, shard_end in shards
+            }
+            for future in as_completed(futures):
+                shard_start, shard_end = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    log.error("  Shard %s..%s FAILED: %s", shard_start, shard_end, e)
+                    failed.append(f"{shard_start}..{shard_end}")
+
+        n_predictions = sum(r[0] for r in results)
+        n_actuals = sum(r[1] for r in results)
+        daily_rows = sum(r[2] for r in results)
+        if failed:
+            raise RuntimeError(f"{len(failed)}/{len(shards)} shards failed: "
+                               + ", ".join(sorted(failed)))
+        log_pipeline_run(analytics_conn, run_id, "SHARDS_COMPLETE", "SUCCESS",
                          calc_date_start, calc_date_end,
-                         rows_loaded=new_alerts, start_time=step_start)
+                         rows_extracted=n_predictions + n_actuals,
+                         rows_loaded=daily_rows, start_time=step_start)
 
-        # Step 7: Cleanup
-        cleanup_staging(analytics_conn)
+        if not daily_rows:
+            log.warning("No accuracy rows computed for date range. Aborting.")
+            log_pipeline_run(analytics_conn, run_id, "PIPELINE_ABORT", "FAILED",
+                             calc_date_start, calc_date_end,
+                             error_msg="No accuracy rows computed", start_time=pipeline_start)
+            return
+
+        # Steps 5-6: Aggregates & drift detection over the union of shards
+        summary_rows, new_alerts = aggregate_and_detect(run_id, analytics_conn,
+                                                        calc_date_start, calc_date_end)
 
-        # Final log
         log_pipeline_run(analytics_conn, run_id, "PIPELINE_COMPLETE", "SUCCESS",
                          calc_date_start, calc_date_end,
-                         rows_extracted=len(predictions) + len(actuals),
+                         rows_extracted=n_predictions + n_actuals,
                          rows_loaded=daily_rows,
                          start_time=pipeline_start)
 
@@ -1040,8 +2062,9 @@ def run_pipeline(calc_date_start: str, calc_date_end: str, dry_run: bool = False
         log.info("=" * 70)
         log.info("PIPELINE COMPLETE")
         log.info("  Duration:     %.1f seconds", duration)
-        log.info("  Predictions:  %d extracted", len(predictions))
-        log.info("  Actuals:      %d extracted", len(actuals))
+        log.info("  Shards:       %d", len(shards))
+        log.info("  Predictions:  %d extracted", n_predictions)
+        log.info("  Actuals:      %d extracted", n_actuals)
         log.info("  Daily rows:   %d computed", daily_rows)
         log.info("  Summary rows: %d aggregated", summary_rows)
         log.info("  Alerts:       %d generated", new_alerts)
@@ -1053,19 +2076,14 @@ def run_pipeline(calc_date_start: str, calc_date_end: str, dry_run: bool = False
             log_pipeline_run(analytics_conn, run_id, "PIPELINE_FAILED", "FAILED",
                              calc_date_start, calc_date_end,
                              error_msg=str(e)[:500], start_time=pipeline_start)
-            try:
-                cleanup_staging(analytics_conn)
-            except Exception:
-                pass
         raise
 
     finally:
-        for conn in [pred_conn, actual_conn, analytics_conn]:
-            if conn:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+        if analytics_conn:
+            try:
+                analytics_conn.close()
+            except Exception:
+                pass
 
 
 # ============================================================================
@@ -1083,6 +2101,11 @@ Examples:
   python run_pipeline.py --start-date 2026-01-01 --end-date 2026-02-14  # Backfill
   python run_pipeline.py --setup                 # Create tables
   python run_pipeline.py --date 2026-02-14 --dry-run  # Extract only
+  python run_pipeline.py --compute-mode memory   # Join in process (pandas), no staging tables
+  python run_pipeline.py --start-date 2025-08-01 --end-date 2026-02-14 --workers 4  # Parallel backfill
+  python run_pipeline.py --rebuild-snapshot      # Reload the latest-prediction snapshot
+  python run_pipeline.py --start-date 2025-08-01 --end-date 2026-02-14 --archive-only  # Parquet backfill
+  python run_pipeline.py --resume 3f2a9c1b7d4e   # Restart a failed run from the failed step
         """,
     )
     parser.add_argument("--date", type=str, help="Single date to process (YYYY-MM-DD)")
@@ -1090,6 +2113,20 @@ Examples:
     parser.add_argument("--end-date", type=str, help="End date for backfill (YYYY-MM-DD)")
     parser.add_argument("--setup", action="store_true", help="Create analytics tables")
     parser.add_argument("--dry-run", action="store_true", help="Extract only, no load")
+    parser.add_argument("--compute-mode", choices=["staging", "memory"], default=None,
+                        help="staging: join via tmp tables on dbatest; memory: join in process "
+                             "with pandas (default: COMPUTE_MODE env or staging)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Process the range as date shards on N parallel workers "
+                             "(default: PIPELINE_WORKERS env or 1 = serial)")
+    parser.add_argument("--shard-days", type=int, default=None,
+                        help="Days per shard with --workers (default: SHARD_DAYS env or 7; 1 = daily)")
+    parser.add_argument("--rebuild-snapshot", action="store_true",
+                        help="Truncate and reload test.forecast_prediction_latest from --start-date/--date")
+    parser.add_argument("--archive-only", action="store_true",
+                        help="Only write the date range of forecast_accuracy_daily to ARCHIVE_DIR")
+    parser.add_argument("--resume", type=str, metavar="RUN_ID",
+                        help="Resume a failed run from its checkpoint (skips completed steps)")
     parser.add_argument("--env-file", type=str, default=".env", help="Path to .env file")
     parser.add_argument("--verbose", "-v", action="store_true", help="Debug logging")
     return parser.parse_args()
@@ -1114,6 +2151,8 @@ def main():
                 key, _, value = line.partition("=")
                 os.environ.setdefault(key.strip(), value.strip())
         log.info("Loaded env from %s (manual parse)", env_path)
+    # Settings may come from the .env file
+    apply_env()
 
     # Setup mode
     if args.setup:
@@ -1149,6 +2188,33 @@ def main():
         log.error("Invalid date format: %s", e)
         sys.exit(1)
 
+    # Resume mode
+    if args.resume:
+        try:
+            resume_pipeline(args.resume)
+        except RuntimeError as e:
+            log.error("%s", e)
+            sys.exit(1)
+        return
+
+    # Archive-only mode
+    if args.archive_only:
+        if not archive.ARCHIVE_DIR:
+            log.error("--archive-only requires ARCHIVE_DIR")
+            sys.exit(1)
+        conn = get_connection("ANALYTICS")
+        try:
+            archive_daily(conn, date_start, date_end)
+        finally:
+            conn.close()
+        return
+
+    workers = args.workers or PIPELINE_WORKERS
+    if workers > 1 and not args.dry_run:
+        run_pipeline_sharded(date_start, date_end, workers, args.shard_days, args.compute_mode,
+                             args.rebuild_snapshot)
+        return
+
     # For backfill of large ranges, process day by day
     days = (de - ds).days + 1
     if days > 30:
@@ -1156,10 +2222,21 @@ def main():
         chunk_start = ds
         while chunk_start <= de:
             chunk_end = min(chunk_start + timedelta(days=6), de)
-            run_pipeline(chunk_start.isoformat(), chunk_end.isoformat(), args.dry_run)
+            try:
+                run_pipeline(chunk_start.isoformat(), chunk_end.isoformat(), args.dry_run,
+                             args.compute_mode, args.rebuild_snapshot and chunk_start == ds)
+            except Exception:
+                # Each chunk is its own run; --resume only finishes the failed one
+                if chunk_end < de:
+                    log.error("Backfill stopped at chunk %s..%s; %s..%s not processed. "
+                              "After resuming the failed chunk, finish with: "
+                              "python run_pipeline.py --start-date %s --end-date %s",
+                              chunk_start, chunk_end, chunk_end + timedelta(days=1), de,
+                              chunk_end + timedelta(days=1), de)
+                raise
             chunk_start = chunk_end + timedelta(days=1)
     else:
-        run_pipeline(date_start, date_end, args.dry_run)
+        run_pipeline(date_start, date_end, args.dry_run, args.compute_mode, args.rebuild_snapshot)
 
 
 if __name__ == "__main__":
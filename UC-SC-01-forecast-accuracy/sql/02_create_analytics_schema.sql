@@ -13,6 +13,10 @@
 --   2. test.forecast_accuracy_summary - Aggregated accuracy metrics by dimension
 --   3. test.forecast_alerts           - Threshold-based alert records
 --   4. test.forecast_pipeline_run_log - ETL pipeline execution tracking
+--   5. test.forecast_accuracy_partials - Per-day mergeable sums behind the summary
+--   6. test.forecast_prediction_latest - Latest-version prediction snapshot
+--   7. test.forecast_probabilistic_metrics - Quantile loss, interval coverage, MASE
+--   8. test.dim_store                 - Store dimension shared with UC-OP-02
 --
 -- Usage:    Execute this script once to initialize the schema.
 --           Re-running is safe (uses IF NOT EXISTS).
@@ -150,6 +154,8 @@ CREATE TABLE IF NOT EXISTS test.forecast_alerts (
     id                  BIGINT          NOT NULL AUTO_INCREMENT PRIMARY KEY,
 
     -- Alert identification / 预警标识
+    alert_date          DATE            NOT NULL DEFAULT (CURRENT_DATE)
+                                                    COMMENT '预警数据日期 / Data date the alert was evaluated for (dedup key)',
     alert_timestamp     DATETIME        DEFAULT CURRENT_TIMESTAMP
                                                     COMMENT '预警时间 / Alert generation timestamp',
     alert_type          ENUM('CRITICAL','WARNING','BIAS','COVERAGE','DRIFT')
@@ -178,6 +184,7 @@ CREATE TABLE IF NOT EXISTS test.forecast_alerts (
     acknowledged_at     DATETIME                    COMMENT '确认时间 / Acknowledgement timestamp',
 
     -- Indexes / 索引
+    UNIQUE INDEX uk_alert_dedup (alert_date, alert_type, entity_id, metric_name),
     INDEX idx_type_time (alert_type, alert_timestamp),
     INDEX idx_entity    (entity_type, entity_id)
 
@@ -187,6 +194,19 @@ CREATE TABLE IF NOT EXISTS test.forecast_alerts (
   COMMENT='UC-SC-01: 预测质量预警记录 / Forecast quality alerts with acknowledgement workflow';
 
 
+-- Migration for tables created before alert_date existed (run once).
+-- The pipeline inserts with INSERT IGNORE against uk_alert_dedup instead of
+-- probing DATE(alert_timestamp) = CURDATE() per rule.
+-- 迁移：为已有表增加 alert_date 及去重唯一键（仅执行一次）。
+--
+-- ALTER TABLE test.forecast_alerts
+--     ADD COLUMN alert_date DATE NOT NULL DEFAULT (CURRENT_DATE)
+--         COMMENT '预警数据日期 / Data date the alert was evaluated for (dedup key)' AFTER id;
+-- UPDATE test.forecast_alerts SET alert_date = DATE(alert_timestamp);
+-- ALTER TABLE test.forecast_alerts
+--     ADD UNIQUE INDEX uk_alert_dedup (alert_date, alert_type, entity_id, metric_name);
+
+
 -- ============================================================================
 -- TABLE 4: forecast_pipeline_run_log
 -- 管道运行日志表 / ETL pipeline execution tracking
@@ -256,6 +276,175 @@ CREATE TABLE IF NOT EXISTS test.forecast_pipeline_run_log (
   COMMENT='UC-SC-01: ETL管道运行日志 / Pipeline execution tracking for forecast accuracy ETL';
 
 
+-- ============================================================================
+-- TABLE 5: forecast_accuracy_partials
+-- 预测准确性日度部分聚合表 / Per-day mergeable partial aggregates
+-- ============================================================================
+-- One row per (date, dimension) holding sums and counts instead of ratios.
+-- Every summary metric is a ratio of these sums (MAPE = sum_ape / ape_count,
+-- WMAPE = sum_abs_error / sum_actual, RMSE = SQRT(sum_squared_error /
+-- prediction_count), ...), so weekly, monthly and rolling periods are
+-- rolled up from the partials. A daily run only refreshes the new days and
+-- re-rolls the periods that contain them.
+-- 存储可合并的求和/计数；周/月/滚动指标由部分聚合汇总，日常增量运行只刷新新日期。
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS test.forecast_accuracy_partials (
+    -- Keys / 键
+    accuracy_date       DATE            NOT NULL    COMMENT '比较日期 / Comparison date',
+    dimension_type      ENUM('OVERALL','STORE','CATEGORY')
+                                        NOT NULL    COMMENT '维度类型 / Dimension type',
+    dimension_value     VARCHAR(100)    NOT NULL    COMMENT '维度值 / ALL, store_id or category',
+    dimension_name      VARCHAR(200)                COMMENT '维度名称 / Dimension display name',
+
+    -- Mergeable sums / 可合并的求和与计数
+    prediction_count    INT             NOT NULL    COMMENT '记录数 / Rows (COUNT(*))',
+    ape_count           INT             NOT NULL    COMMENT 'MAPE分母 / Rows with actual > 0 and APE',
+    sum_ape             DECIMAL(20,4)   NOT NULL    COMMENT 'APE之和 / SUM(absolute_pct_error) where actual > 0',
+    within_20_count     INT             NOT NULL    COMMENT '20%容差命中数 / Rows with APE <= 0.20',
+    sum_abs_error       DECIMAL(20,2)   NOT NULL    COMMENT '绝对误差之和 / SUM(absolute_error)',
+    sum_forecast_error  DECIMAL(20,2)   NOT NULL    COMMENT '预测误差之和 / SUM(forecast_error)',
+    sum_squared_error   DECIMAL(24,4)   NOT NULL    COMMENT '平方误差之和 / SUM(squared_error)',
+    sum_actual          DECIMAL(20,2)   NOT NULL    COMMENT '实际消耗之和 / SUM(actual_consumption)',
+
+    -- Metadata / 元数据
+    computed_at         DATETIME        DEFAULT CURRENT_TIMESTAMP
+                                                    COMMENT '计算时间 / Row computation timestamp',
+
+    PRIMARY KEY (accuracy_date, dimension_type, dimension_value),
+    INDEX idx_dimension (dimension_type, dimension_value, accuracy_date)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci
+  COMMENT='UC-SC-01: 日度可合并部分聚合 / Per-day mergeable partial aggregates for summary rollups';
+
+
+-- ============================================================================
+-- TABLE 6: forecast_prediction_latest
+-- 最新版本预测快照 / Latest-version prediction snapshot
+-- ============================================================================
+-- One row per (dt, store, SKU) holding the prediction of the highest
+-- task_version_id seen in luckyus_ireplenishment.t_order_predict_alg_v2.
+-- The orchestrator upserts only rows with task_version_id >= MAX(task_version_id)
+-- held here, so extraction is a range read on the primary key instead of a
+-- MAX(task_version_id) self-join over all versions on the source server.
+-- 保存每个 日期-门店-商品 的最新版本预测；按版本号增量更新，抽取时按主键范围读取，无需自连接。
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS test.forecast_prediction_latest (
+    -- Keys / 键
+    dt                  VARCHAR(32)     NOT NULL    COMMENT '预测日期 / Prediction date',
+    shop_dept_id        BIGINT          NOT NULL    COMMENT '门店部门ID / Store department ID',
+    goods_code          VARCHAR(32)     NOT NULL    COMMENT 'GS编码 / GS code',
+
+    -- Prediction / 预测值
+    goods_name          VARCHAR(200)                COMMENT '商品名称 / Product name',
+    large_class_name    VARCHAR(100)                COMMENT '商品大类 / Product category',
+    vlt_avg_demand      DECIMAL(12,2)               COMMENT 'VLT日均需求预测 / VLT avg daily demand',
+    order_num           DECIMAL(12,2)               COMMENT '建议订货量 / Suggested order quantity',
+    task_version_id     BIGINT          NOT NULL    COMMENT '算法任务版本 / Latest task version held',
+
+    -- Metadata / 元数据
+    updated_at          DATETIME        DEFAULT CURRENT_TIMESTAMP
+                                                    COMMENT '更新时间 / Last upsert timestamp',
+
+    PRIMARY KEY (dt, shop_dept_id, goods_code),
+    INDEX idx_version (task_version_id)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci
+  COMMENT='UC-SC-01: 最新版本预测快照 / Latest-version prediction snapshot of t_order_predict_alg_v2';
+
+
+-- ============================================================================
+-- TABLE 7: forecast_probabilistic_metrics
+-- 概率预测评估 / Probabilistic forecast evaluation
+-- ============================================================================
+-- One row per (date, store, SKU) of forecast_accuracy_daily. The point
+-- forecast is turned into P10/P50/P90 quantile forecasts by adding the
+-- store-SKU's empirical residual quantiles over the preceding calibration
+-- window (EVAL_CALIBRATION_DAYS, default 28). Columns are per-row terms,
+-- so any period rolls up with AVG():
+--   mean pinball loss = AVG(pinball_pNN)
+--   80% coverage      = AVG(in_interval_80)
+--   MASE              = AVG(scaled_error)
+-- Computed by orchestrator/forecast_eval.py (NumPy), step 5b.
+-- 每个 日期-门店-商品 一行：经验分位数预测、分位数损失、80%区间命中、MASE缩放误差；可按任意周期取平均。
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS test.forecast_probabilistic_metrics (
+    -- Keys / 键
+    accuracy_date       DATE            NOT NULL    COMMENT '比较日期 / Comparison date',
+    shop_dept_id        BIGINT          NOT NULL    COMMENT '门店ID / Store ID',
+    goods_code          VARCHAR(32)     NOT NULL    COMMENT '货物编号(GS code) / Goods code',
+
+    -- Inputs / 输入
+    predicted_demand    DECIMAL(12,2)               COMMENT '点预测 / Point forecast (vlt_avg_demand)',
+    actual_consumption  DECIMAL(12,2)               COMMENT '实际消耗量 / Actual consumption',
+
+    -- Quantile forecasts / 分位数预测 (NULL: < 7 calibration residuals)
+    quantile_p10        DECIMAL(12,2)               COMMENT 'P10分位数预测 / P10 quantile forecast',
+    quantile_p50        DECIMAL(12,2)               COMMENT 'P50分位数预测 / P50 quantile forecast',
+    quantile_p90        DECIMAL(12,2)               COMMENT 'P90分位数预测 / P90 quantile forecast',
+    pinball_p10         DECIMAL(12,4)               COMMENT 'P10分位数损失 / Pinball loss at 0.1',
+    pinball_p50         DECIMAL(12,4)               COMMENT 'P50分位数损失 / Pinball loss at 0.5',
+    pinball_p90         DECIMAL(12,4)               COMMENT 'P90分位数损失 / Pinball loss at 0.9',
+    in_interval_80      TINYINT                     COMMENT '是否落入P10-P90区间 / 1 if actual in [P10, P90]',
+
+    -- Seasonal-naive baseline / 季节性朴素基线
+    naive_abs_error     DECIMAL(12,2)               COMMENT '朴素误差 / |actual - actual 7 days earlier|',
+    scaled_error        DECIMAL(12,4)               COMMENT 'MASE缩放误差 / |forecast - actual| / naive MAE over calibration window',
+    calibration_points  INT             NOT NULL    COMMENT '校准残差数 / Residuals in the calibration window',
+
+    -- Metadata / 元数据
+    computed_at         DATETIME        DEFAULT CURRENT_TIMESTAMP
+                                                    COMMENT '计算时间 / Row computation timestamp',
+
+    PRIMARY KEY (accuracy_date, shop_dept_id, goods_code),
+    INDEX idx_shop_goods (shop_dept_id, goods_code, accuracy_date)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci
+  COMMENT='UC-SC-01: 概率预测评估 / Pinball loss, interval coverage and MASE per store-SKU-day';
+
+
+-- ============================================================================
+-- TABLE 8: dim_store
+-- 门店维度表（与UC-OP-02共享）/ Store dimension shared with UC-OP-02
+-- ============================================================================
+-- Shared by UC-SC-01 and UC-OP-02 (both DDL files define it identically;
+-- never dropped by either). Each pipeline upserts its cached opshop store
+-- registry at the start of a run; attributes a pipeline does not know
+-- (address, area_type from UC-SC-01) are left as they are. UC-SC-01 joins
+-- it in COMPUTE_ACCURACY so forecast_accuracy_daily is written with
+-- shop_name in a single pass.
+-- 两个项目共用的门店维度，由各自管道在运行开始时从门店注册表同步。
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS test.dim_store (
+    store_id            BIGINT          NOT NULL    COMMENT '门店ID (t_shop_info.dept_id) / Store ID',
+    store_code          VARCHAR(32)                 COMMENT '门店编号 e.g. US00001 / Store code (dept_code)',
+    store_name          VARCHAR(200)                COMMENT '门店名称 / Store name (dept_name)',
+    address             VARCHAR(500)                COMMENT '门店地址 / Address (UC-OP-02 only)',
+    status              INT                         COMMENT '门店状态 1=营业 / t_shop_info.status (1 = open)',
+    opened_date         DATE                        COMMENT '开业日期 / set_up_time',
+    area_type           VARCHAR(50)                 COMMENT '商圈类型 / Area type (UC-OP-02, site-selection CSV)',
+    updated_at          TIMESTAMP       DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                                                    COMMENT '更新时间 / Changed only when an attribute changes',
+
+    PRIMARY KEY (store_id),
+    INDEX idx_store_code (store_code)
+
+) ENGINE=InnoDB
+  DEFAULT CHARSET=utf8mb4
+  COLLATE=utf8mb4_unicode_ci
+  COMMENT='UC-SC-01 / UC-OP-02: 共享门店维度 / Shared store dimension';
+
+
+
 -- ============================================================================
 -- VERIFICATION QUERIES (run after table creation)
 -- ============================================================================
@@ -271,7 +460,11 @@ WHERE  TABLE_SCHEMA = 'test'
            'forecast_accuracy_daily',
            'forecast_accuracy_summary',
            'forecast_alerts',
-           'forecast_pipeline_run_log'
+           'forecast_pipeline_run_log',
+           'forecast_accuracy_partials',
+           'forecast_prediction_latest',
+           'forecast_probabilistic_metrics',
+           'dim_store'
        )
 ORDER  BY TABLE_NAME;
 */
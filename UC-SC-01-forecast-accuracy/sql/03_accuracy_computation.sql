@@ -235,7 +235,7 @@ SELECT
     -- Dimensional keys / 维度键
     a.consumption_date                                          AS accuracy_date,
     p.shop_dept_id                                              AS shop_dept_id,
-    NULL                                                        AS shop_name,       -- Enriched in post-processing / 后处理中填充
+    ds.store_name                                               AS shop_name,       -- From test.dim_store / 来自门店维度表
     p.goods_code                                                AS goods_code,
     p.goods_name                                                AS goods_name,
     p.large_class_name                                          AS large_class_name,
@@ -284,30 +284,33 @@ INNER JOIN test.tmp_actuals a
     ON  p.shop_dept_id = a.shop_dept_id
     AND p.goods_code   = a.goods_mid
     AND p.dt           = a.consumption_date
+LEFT JOIN test.dim_store ds
+    ON  ds.store_id    = p.shop_dept_id
 WHERE a.actual_consumption IS NOT NULL
   AND p.vlt_avg_demand     IS NOT NULL;
 
 
--- --- 3e: Post-processing - Enrich shop_name from store master ---
--- 后处理 - 从门店主数据补充门店名称
--- NOTE: The orchestrator should run a separate query against aws-luckyus-opshop-rw
---       to fetch shop_name for all 10 stores, then update here.
---       Alternatively, maintain a local lookup.
--- 注意: 编排器应对 aws-luckyus-opshop-rw 执行单独查询获取10个门店的名称，然后在此更新。
---       或者维护本地查找表。
-
--- Store name mapping for 10 active stores (hardcoded fallback):
--- 10个活跃门店名称映射（硬编码备用）:
-UPDATE test.forecast_accuracy_daily SET shop_name = '8th & Broadway'   WHERE shop_dept_id = 1127  AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '28th & 6th'      WHERE shop_dept_id = 1128  AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '100 Maiden Ln'   WHERE shop_dept_id = 1140  AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '54th & 8th'      WHERE shop_dept_id = 1141  AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '33rd & 10th'     WHERE shop_dept_id = 20008 AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '102 Fulton'      WHERE shop_dept_id = 20010 AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '37th & Broadway' WHERE shop_dept_id = 20011 AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '21st & 3rd'      WHERE shop_dept_id = 20027 AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '15th & 3rd'      WHERE shop_dept_id = 20031 AND shop_name IS NULL;
-UPDATE test.forecast_accuracy_daily SET shop_name = '221 Grand'       WHERE shop_dept_id = 20032 AND shop_name IS NULL;
+-- --- 3e: Store names ---
+-- 门店名称
+-- shop_name is joined from test.dim_store in 3d, so rows are written once
+-- instead of being rewritten by a per-store UPDATE. run_pipeline.py keeps
+-- dim_store in sync with the opshop store registry (sync_store_dimension).
+-- When running this script by hand on a fresh schema, seed the fallback
+-- names BEFORE step 3d; existing rows are left untouched.
+-- shop_name 在3d中从 test.dim_store 关联写入，无需逐店 UPDATE 重写。
+-- 手动执行且维度表为空时，请在3d之前插入以下备用门店名称。
+--
+-- INSERT IGNORE INTO test.dim_store (store_id, store_name, status) VALUES
+--     (1127,  '8th & Broadway',  1),
+--     (1128,  '28th & 6th',      1),
+--     (1140,  '100 Maiden Ln',   1),
+--     (1141,  '54th & 8th',      1),
+--     (20008, '33rd & 10th',     1),
+--     (20010, '102 Fulton',      1),
+--     (20011, '37th & Broadway', 1),
+--     (20027, '21st & 3rd',      1),
+--     (20031, '15th & 3rd',      1),
+--     (20032, '221 Grand',       1);
 
 
 -- --- 3f: Cleanup staging tables ---
@@ -289,7 +289,7 @@ BEGIN
     SELECT
         a.consumption_date                                          AS accuracy_date,
         p.shop_dept_id                                              AS shop_dept_id,
-        NULL                                                        AS shop_name,
+        ds.store_name                                               AS shop_name,
         p.goods_code                                                AS goods_code,
         p.goods_name                                                AS goods_name,
         p.large_class_name                                          AS large_class_name,
@@ -315,24 +315,14 @@ BEGIN
         ON  p.shop_dept_id = a.shop_dept_id
         AND p.goods_code   = a.goods_mid
         AND p.dt           = a.consumption_date
+    LEFT JOIN test.dim_store ds                                     -- shop_name, see 03 step 3e
+        ON  ds.store_id    = p.shop_dept_id
     WHERE a.actual_consumption IS NOT NULL
       AND p.vlt_avg_demand     IS NOT NULL
       AND a.consumption_date   = p_calc_date;
 
     SET v_daily_count = ROW_COUNT();
 
-    -- Enrich shop_name / 补充门店名称
-    UPDATE test.forecast_accuracy_daily SET shop_name = '8th & Broadway'   WHERE shop_dept_id = 1127  AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '28th & 6th'      WHERE shop_dept_id = 1128  AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '100 Maiden Ln'   WHERE shop_dept_id = 1140  AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '54th & 8th'      WHERE shop_dept_id = 1141  AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '33rd & 10th'     WHERE shop_dept_id = 20008 AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '102 Fulton'      WHERE shop_dept_id = 20010 AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '37th & Broadway' WHERE shop_dept_id = 20011 AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '21st & 3rd'      WHERE shop_dept_id = 20027 AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '15th & 3rd'      WHERE shop_dept_id = 20031 AND accuracy_date = p_calc_date AND shop_name IS NULL;
-    UPDATE test.forecast_accuracy_daily SET shop_name = '221 Grand'       WHERE shop_dept_id = 20032 AND accuracy_date = p_calc_date AND shop_name IS NULL;
-
     INSERT INTO test.forecast_pipeline_run_log (
         run_id, pipeline_name, step_name,
         run_start, run_end, duration_seconds,
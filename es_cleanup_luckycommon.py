@@ -10,6 +10,9 @@ AWS Elasticsearch (luckycommon) 磁盘空间清理脚本
 使用方法:
     python3 es_cleanup_luckycommon.py --endpoint https://search-luckycommon-xxx.us-east-1.es.amazonaws.com --days 30 --dry-run
     python3 es_cleanup_luckycommon.py --endpoint https://search-luckycommon-xxx.us-east-1.es.amazonaws.com --days 30  # 真实执行
+    python3 es_cleanup_luckycommon.py --endpoint https://search-luckycommon-xxx.us-east-1.es.amazonaws.com --days 30 --batch --workers 4  # 批量并发删除
+    python3 es_cleanup_luckycommon.py --endpoint https://search-luckycommon-xxx.us-east-1.es.amazonaws.com --daemon --days 7 --dry-run  # 水位守护模式
+    python3 es_cleanup_luckycommon.py --benchmark 100000  # 日期解析/模式匹配benchmark (10万个模拟索引，无需集群)
 
 需要安装: pip3 install requests python-dateutil
 """
@@ -18,6 +21,12 @@ import argparse
 import requests
 import json
 import re
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from dateutil import parser as date_parser
 import sys
@@ -30,6 +39,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 批量删除参数
+DEFAULT_MAX_URL_LENGTH = 4000   # 单个DELETE请求URL最大长度 (ES默认http.max_initial_line_length=4kb)
+DEFAULT_DELETE_WORKERS = 4      # 并发删除线程数
+DEFAULT_MAX_RETRIES = 5         # 遇到429时的最大重试次数
+
+# 守护模式参数
+DEFAULT_INTERVAL = 300              # 轮询间隔(秒)
+DEFAULT_WATERMARK_PCT = 85.0        # 触发水位 (对应ES low watermark默认值85%)
+DEFAULT_TARGET_PCT = 75.0           # 清理后的目标使用率
+DEFAULT_HORIZON_HOURS = 24.0        # 预测窗口: 预计在此时间内触及水位即提前清理
+DEFAULT_MAX_DELETES_PER_CYCLE = 20  # 每轮最多删除的索引数
+DEFAULT_MERGE_DELETED_RATIO = 0.2   # 已删除文档占比超过此值的索引优先force merge
+DEFAULT_LEDGER = 'es_retention_ledger.jsonl'
+USAGE_HISTORY_SIZE = 288            # 保留的使用率采样点 (5分钟间隔约24小时)
+
+# 索引名日期解析: 一个预编译正则 (零宽先行断言以找到所有可能重叠的位置)
+# 分隔符优先级与原实现一致: 先取第一个 YYYY-MM-DD，无效则取第一个 YYYY.MM.DD，再 YYYY_MM_DD
+INDEX_DATE_RE = re.compile(r'(?=(\d{4})([-._])(\d{2})\2(\d{2}))')
+DATE_SEPARATOR_PRIORITY = ('-', '.', '_')
+DATE_CACHE_SIZE = 131072
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_index_date_cached(index_name):
+    """从索引名称中提取日期 (预编译正则 + 结果缓存)
+
+    Returns:
+        datetime对象或None
+    """
+    first_by_sep = {}
+    for match in INDEX_DATE_RE.finditer(index_name):
+        sep = match.group(2)
+        if sep not in first_by_sep:
+            first_by_sep[sep] = match
+            if len(first_by_sep) == len(DATE_SEPARATOR_PRIORITY):
+                break
+
+    for sep in DATE_SEPARATOR_PRIORITY:
+        match = first_by_sep.get(sep)
+        if match:
+            try:
+                return datetime(int(match.group(1)), int(match.group(3)), int(match.group(4)))
+            except ValueError:
+                continue
+    return None
+
+
+class IndexPatternMatcher:
+    """索引名称模式过滤器，模式只编译一次
+
+    语义与原实现相同: '*' 替换为 '.*' 后从索引名开头匹配 (re.match)
+    """
+
+    def __init__(self, patterns=None):
+        self.patterns = list(patterns or [])
+        self._compiled = [re.compile(p.replace('*', '.*')) for p in self.patterns]
+
+    def matches(self, index_name):
+        if not self._compiled:
+            return True
+        return any(regex.match(index_name) for regex in self._compiled)
+
+
+def format_bytes(num_bytes):
+    """将字节数格式化为可读字符串"""
+    size = float(num_bytes)
+    for unit in ('b', 'kb', 'mb', 'gb', 'tb'):
+        if abs(size) < 1024 or unit == 'tb':
+            return f"{size:.1f}{unit}"
+        size /= 1024.0
+
 
 class ElasticsearchCleaner:
     def __init__(self, endpoint, verify_ssl=True):
@@ -42,6 +122,15 @@ class ElasticsearchCleaner:
         self.endpoint = endpoint.rstrip('/')
         self.verify_ssl = verify_ssl
         self.session = requests.Session()
+        self._local = threading.local()
+
+    def _thread_session(self):
+        """每个工作线程使用独立的Session (requests.Session不保证线程安全)"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
 
     def get_cluster_health(self):
         """获取集群健康状态"""
@@ -58,10 +147,11 @@ class ElasticsearchCleaner:
             return None
 
     def get_all_indices(self):
-        """获取所有索引列表"""
+        """获取所有索引列表 (store.size以字节为单位返回, bytes=b)"""
         try:
             response = self.session.get(
-                f"{self.endpoint}/_cat/indices?format=json",
+                f"{self.endpoint}/_cat/indices",
+                params={'format': 'json', 'bytes': 'b'},
                 verify=self.verify_ssl,
                 timeout=30
             )
@@ -85,36 +175,21 @@ class ElasticsearchCleaner:
         Returns:
             datetime对象或None
         """
-        # 尝试多种日期格式
-        patterns = [
-            r'(\d{4}-\d{2}-\d{2})',  # 2026-01-28
-            r'(\d{4}\.\d{2}\.\d{2})', # 2026.01.28
-            r'(\d{4}_\d{2}_\d{2})',   # 2026_01_28
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, index_name)
-            if match:
-                date_str = match.group(1)
-                try:
-                    # 尝试解析日期
-                    return datetime.strptime(date_str.replace('.', '-').replace('_', '-'), '%Y-%m-%d')
-                except ValueError:
-                    continue
-
-        return None
+        return parse_index_date_cached(index_name)
 
-    def find_old_indices(self, days_threshold=30, patterns=None):
+    def find_old_indices(self, days_threshold=30, patterns=None, all_indices=None):
         """查找超过指定天数的旧索引
 
         Args:
             days_threshold: 天数阈值，超过此天数的索引将被标记
             patterns: 索引名称模式列表，只处理匹配的索引（可选）
+            all_indices: 已获取的_cat/indices结果（可选，不传则重新获取）
 
         Returns:
             符合条件的索引列表
         """
-        all_indices = self.get_all_indices()
+        if all_indices is None:
+            all_indices = self.get_all_indices()
         if not all_indices:
             logger.warning("未获取到任何索引")
             return []
@@ -126,6 +201,7 @@ class ElasticsearchCleaner:
         logger.info(f"截止日期: {cutoff_date.strftime('%Y-%m-%d')}")
         logger.info(f"将查找 {days_threshold} 天之前的索引")
 
+        matcher = IndexPatternMatcher(patterns)
         for index in all_indices:
             index_name = index.get('index', '')
 
@@ -134,19 +210,21 @@ class ElasticsearchCleaner:
                 continue
 
             # 如果指定了模式，检查是否匹配
-            if patterns:
-                if not any(re.match(pattern.replace('*', '.*'), index_name) for pattern in patterns):
-                    continue
+            if not matcher.matches(index_name):
+                continue
 
             # 尝试从索引名称解析日期
             index_date = self.parse_index_date(index_name)
 
             if index_date and index_date < cutoff_date:
+                size_bytes = self.parse_size_bytes(index.get('store.size'))
                 old_indices.append({
                     'name': index_name,
                     'date': index_date,
-                    'size': index.get('store.size', 'unknown'),
+                    'size': format_bytes(size_bytes) if size_bytes is not None else 'unknown',
+                    'size_bytes': size_bytes or 0,
                     'docs_count': index.get('docs.count', 'unknown'),
+                    'docs_deleted': self.parse_size_bytes(index.get('docs.deleted')) or 0,
                     'status': index.get('status', 'unknown')
                 })
 
@@ -155,6 +233,23 @@ class ElasticsearchCleaner:
 
         return old_indices
 
+    @staticmethod
+    def parse_size_bytes(value):
+        """解析_cat/indices返回的字节数 (bytes=b)，无法解析时返回None"""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def project_disk_freed(indices):
+        """预估删除这些索引可释放的磁盘空间 (含副本，来自store.size)
+
+        Returns:
+            字节数
+        """
+        return sum(idx.get('size_bytes', 0) for idx in indices)
+
     def delete_index(self, index_name):
         """删除指定索引
 
@@ -181,11 +276,111 @@ class ElasticsearchCleaner:
         except Exception as e:
             return False, f"删除异常: {e}"
 
-    def get_disk_usage(self):
-        """获取磁盘使用情况"""
+    def chunk_index_names(self, index_names, max_url_length=DEFAULT_MAX_URL_LENGTH):
+        """将索引名按URL长度上限切分为逗号分隔的批次
+
+        Args:
+            index_names: 索引名称列表
+            max_url_length: DELETE请求URL的最大长度
+
+        Returns:
+            索引名称列表的列表
+        """
+        base_len = len(self.endpoint) + 1
+        chunks = []
+        current = []
+        current_len = base_len
+        for name in index_names:
+            extra = len(name) + (1 if current else 0)
+            if current and current_len + extra > max_url_length:
+                chunks.append(current)
+                current = []
+                current_len = base_len
+                extra = len(name)
+            current.append(name)
+            current_len += extra
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def delete_indices_batch(self, index_names, max_retries=DEFAULT_MAX_RETRIES):
+        """用一个DELETE请求删除一批索引 (逗号分隔)，遇到429时退避重试
+
+        Args:
+            index_names: 要删除的索引名称列表 (不含通配符)
+            max_retries: 429时最大重试次数
+
+        Returns:
+            (成功标志, 响应消息)
+        """
+        session = self._thread_session()
+        url = f"{self.endpoint}/{','.join(index_names)}"
+        for attempt in range(max_retries + 1):
+            try:
+                response = session.delete(url, verify=self.verify_ssl, timeout=120)
+                if response.status_code == 429 and attempt < max_retries:
+                    retry_after = response.headers.get('Retry-After')
+                    wait = float(retry_after) if retry_after and retry_after.isdigit() else min(2 ** attempt, 60)
+                    logger.warning(f"  批次({len(index_names)}个索引)被限流(429)，{wait:.0f}秒后重试 ({attempt + 1}/{max_retries})")
+                    time.sleep(wait)
+                    continue
+                response.raise_for_status()
+                result = response.json()
+                if result.get('acknowledged'):
+                    return True, "删除成功"
+                return False, f"删除失败: {result}"
+            except Exception as e:
+                return False, f"删除异常: {e}"
+        return False, f"重试{max_retries}次后仍被限流(429)"
+
+    def delete_indices_parallel(self, index_names, workers=DEFAULT_DELETE_WORKERS,
+                                max_url_length=DEFAULT_MAX_URL_LENGTH,
+                                max_retries=DEFAULT_MAX_RETRIES):
+        """按URL长度分批并发删除索引
+
+        Args:
+            index_names: 要删除的索引名称列表
+            workers: 并发线程数
+            max_url_length: 单个请求URL最大长度
+            max_retries: 429时最大重试次数
+
+        Returns:
+            (已删除索引列表, [(失败批次, 错误消息), ...])
+        """
+        chunks = self.chunk_index_names(index_names, max_url_length)
+        logger.info(f"共 {len(index_names)} 个索引，分为 {len(chunks)} 个批次，{workers} 个并发线程")
+
+        deleted = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(self.delete_indices_batch, chunk, max_retries): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                success, message = future.result()
+                if success:
+                    deleted.extend(chunk)
+                    logger.info(f"  ✅ 批次删除成功: {len(chunk)} 个索引 ({chunk[0]} ... {chunk[-1]})")
+                else:
+                    failed.append((chunk, message))
+                    logger.error(f"  ❌ 批次删除失败: {len(chunk)} 个索引 ({chunk[0]} ... {chunk[-1]}): {message}")
+        return deleted, failed
+
+    def get_disk_usage(self, raw_bytes=False):
+        """获取磁盘使用情况
+
+        Args:
+            raw_bytes: 为True时磁盘容量以字节为单位返回 (bytes=b)
+        """
+        params = {'format': 'json'}
+        if raw_bytes:
+            params['bytes'] = 'b'
         try:
             response = self.session.get(
-                f"{self.endpoint}/_cat/allocation?format=json",
+                f"{self.endpoint}/_cat/allocation",
+                params=params,
                 verify=self.verify_ssl,
                 timeout=10
             )
@@ -222,6 +417,348 @@ class ElasticsearchCleaner:
             return False, f"Force merge失败: {e}"
 
 
+class RetentionDaemon:
+    """基于磁盘水位的持续清理守护进程
+
+    每轮轮询 _cat/allocation 和 _cat/indices:
+    1. 记录集群已用空间，用线性拟合估算写入速率 (采样不足时用最近几天的日索引大小估算)
+    2. 预测触及水位的时间; 已超过水位或预计在horizon内触及时才动作
+    3. 计算需要释放的空间，使预测窗口末的使用率回到target以下
+    4. 先对已删除文档占比高的旧索引force merge (仅在未超水位时，merge需要临时空间)，
+       再按日期从旧到新删除索引，直到满足需要释放的空间或达到每轮上限
+    所有计划和执行结果写入JSONL台账，dry-run时只记录不执行
+    """
+
+    def __init__(self, cleaner, min_age_days=7, patterns=None,
+                 watermark_pct=DEFAULT_WATERMARK_PCT, target_pct=DEFAULT_TARGET_PCT,
+                 horizon_hours=DEFAULT_HORIZON_HOURS,
+                 max_deletes_per_cycle=DEFAULT_MAX_DELETES_PER_CYCLE,
+                 merge_deleted_ratio=DEFAULT_MERGE_DELETED_RATIO,
+                 ledger_path=DEFAULT_LEDGER, dry_run=True,
+                 workers=DEFAULT_DELETE_WORKERS, max_url_length=DEFAULT_MAX_URL_LENGTH,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.cleaner = cleaner
+        self.min_age_days = min_age_days
+        self.patterns = patterns
+        self.watermark_pct = watermark_pct
+        self.target_pct = target_pct
+        self.horizon_hours = horizon_hours
+        self.max_deletes_per_cycle = max_deletes_per_cycle
+        self.merge_deleted_ratio = merge_deleted_ratio
+        self.ledger_path = ledger_path
+        self.dry_run = dry_run
+        self.workers = workers
+        self.max_url_length = max_url_length
+        self.max_retries = max_retries
+
+        # (时间戳, 毛使用量) 毛使用量 = 已用空间 + 本进程累计释放空间，避免删除造成的下降干扰速率拟合
+        self.history = deque(maxlen=USAGE_HISTORY_SIZE)
+        self.freed_total = 0
+        self.cycle = 0
+
+    @staticmethod
+    def summarize_allocation(allocation):
+        """汇总_cat/allocation (bytes=b) 结果
+
+        Returns:
+            (已用字节, 总字节, 最高节点使用率%) 或 None
+        """
+        used = total = 0
+        max_pct = 0.0
+        for node in allocation:
+            node_used = ElasticsearchCleaner.parse_size_bytes(node.get('disk.used'))
+            node_total = ElasticsearchCleaner.parse_size_bytes(node.get('disk.total'))
+            if not node_used or not node_total:
+                continue  # UNASSIGNED行
+            used += node_used
+            total += node_total
+            max_pct = max(max_pct, node_used * 100.0 / node_total)
+        if total == 0:
+            return None
+        return used, total, max_pct
+
+    def ingest_rate_from_history(self):
+        """最小二乘拟合毛使用量随时间的斜率 (字节/秒)，采样不足返回None"""
+        if len(self.history) < 2:
+            return None
+        t0 = self.history[0][0]
+        xs = [t - t0 for t, _ in self.history]
+        ys = [u for _, u in self.history]
+        n = len(xs)
+        mean_x = sum(xs) / n
+        mean_y = sum(ys) / n
+        sxx = sum((x - mean_x) ** 2 for x in xs)
+        if sxx == 0:
+            return None
+        sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        return sxy / sxx
+
+    def ingest_rate_from_indices(self, all_indices, days=3):
+        """用最近几个完整自然日的日索引大小估算写入速率 (字节/秒)"""
+        today = datetime.now().date()
+        per_day = {}
+        for index in all_indices:
+            name = index.get('index', '')
+            if name.startswith('.'):
+                continue
+            index_date = self.cleaner.parse_index_date(name)
+            if not index_date:
+                continue
+            day = index_date.date()
+            if 0 < (today - day).days <= days:
+                per_day[day] = per_day.get(day, 0) + (ElasticsearchCleaner.parse_size_bytes(index.get('store.size')) or 0)
+        if not per_day:
+            return None
+        return sum(per_day.values()) / len(per_day) / 86400.0
+
+    def plan(self, used, total, max_pct, rate, candidates):
+        """根据当前使用量和写入速率生成本轮动作计划
+
+        Returns:
+            (需释放字节数, 预计触及水位小时数, merge列表, delete列表)
+        """
+        # 以最高节点使用率为准 (水位按节点判断)，假设分片在节点间大致均衡
+        hottest_used = max_pct / 100.0 * total
+        watermark_bytes = self.watermark_pct / 100.0 * total
+        target_bytes = self.target_pct / 100.0 * total
+
+        eta_hours = None
+        if hottest_used >= watermark_bytes:
+            eta_hours = 0.0
+        elif rate and rate > 0:
+            eta_hours = (watermark_bytes - hottest_used) / rate / 3600.0
+
+        if eta_hours is None or eta_hours > self.horizon_hours:
+            return 0, eta_hours, [], []
+
+        projected = hottest_used + max(rate or 0, 0) * self.horizon_hours * 3600.0
+        need = max(0, int(projected - target_bytes))
+
+        merges = []
+        deletes = []
+        remaining = need
+
+        # 未超水位时才force merge: merge过程需要额外临时空间
+        if hottest_used < watermark_bytes and self.merge_deleted_ratio > 0:
+            for idx in candidates:
+                if remaining <= 0:
+                    break
+                docs_count = self.cleaner.parse_size_bytes(idx.get('docs_count')) or 0
+                docs_deleted = idx.get('docs_deleted', 0)
+                if docs_count + docs_deleted == 0:
+                    continue
+                ratio = docs_deleted / (docs_count + docs_deleted)
+                if ratio >= self.merge_deleted_ratio:
+                    reclaim = int(idx['size_bytes'] * ratio)
+                    merges.append((idx, reclaim))
+                    remaining -= reclaim
+
+        merged = {idx['name'] for idx, _ in merges}
+        for idx in candidates:
+            if remaining <= 0 or len(deletes) >= self.max_deletes_per_cycle:
+                break
+            if idx['name'] in merged:
+                continue
+            deletes.append(idx)
+            remaining -= idx['size_bytes']
+
+        return need, eta_hours, merges, deletes
+
+    def write_ledger(self, record):
+        """追加一条台账记录 (JSONL)"""
+        record = dict(record, ts=datetime.now().isoformat(timespec='seconds'),
+                      cycle=self.cycle, dry_run=self.dry_run)
+        with open(self.ledger_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    def run_cycle(self):
+        """执行一轮轮询和清理"""
+        self.cycle += 1
+        logger.info("\n" + "=" * 60)
+        logger.info(f"[守护模式] 第 {self.cycle} 轮")
+
+        summary = self.summarize_allocation(self.cleaner.get_disk_usage(raw_bytes=True))
+        if summary is None:
+            logger.error("无法获取磁盘使用情况，跳过本轮")
+            return
+        used, total, max_pct = summary
+        now = time.time()
+        self.history.append((now, used + self.freed_total))
+
+        all_indices = self.cleaner.get_all_indices()
+        rate = self.ingest_rate_from_history()
+        rate_source = 'allocation'
+        if rate is None:
+            rate = self.ingest_rate_from_indices(all_indices)
+            rate_source = 'daily_indices'
+
+        logger.info(f"  集群使用: {format_bytes(used)} / {format_bytes(total)} "
+                    f"({used * 100.0 / total:.1f}%)，最高节点: {max_pct:.1f}%")
+        if rate is not None:
+            logger.info(f"  写入速率: {format_bytes(rate * 86400)}/天 (来源: {rate_source})")
+
+        candidates = self.cleaner.find_old_indices(
+            days_threshold=self.min_age_days,
+            patterns=self.patterns,
+            all_indices=all_indices
+        ) if all_indices else []
+
+        need, eta_hours, merges, deletes = self.plan(used, total, max_pct, rate, candidates)
+        if eta_hours is not None:
+            logger.info(f"  预计 {eta_hours:.1f} 小时后触及水位 {self.watermark_pct:.0f}%")
+
+        if need == 0:
+            logger.info(f"  无需清理 (水位 {self.watermark_pct:.0f}%，预测窗口 {self.horizon_hours:.0f} 小时)")
+            self.write_ledger({'action': 'noop', 'used_bytes': used, 'total_bytes': total,
+                               'max_node_pct': round(max_pct, 2), 'eta_hours': eta_hours})
+            return
+
+        planned = sum(r for _, r in merges) + sum(idx['size_bytes'] for idx in deletes)
+        logger.info(f"  需释放: {format_bytes(need)}，计划: force merge {len(merges)} 个，"
+                    f"删除 {len(deletes)} 个，预计释放 {format_bytes(planned)}")
+        if planned < need:
+            logger.warning(f"  ⚠️  可清理的索引不足 (每轮上限 {self.max_deletes_per_cycle}，最小保留 {self.min_age_days} 天)")
+
+        for idx, reclaim in merges:
+            if self.dry_run:
+                result = 'planned'
+            else:
+                success, message = self.cleaner.force_merge_index(idx['name'])
+                result = 'ok' if success else str(message)
+                if success:
+                    self.freed_total += reclaim
+            logger.info(f"  [merge] {idx['name']} 预计回收 {format_bytes(reclaim)}: {result}")
+            self.write_ledger({'action': 'force_merge', 'index': idx['name'],
+                               'est_bytes': reclaim, 'need_bytes': need,
+                               'eta_hours': eta_hours, 'result': result})
+
+        if not deletes:
+            return
+
+        if self.dry_run:
+            deleted = set()
+            failed_msgs = {}
+        else:
+            deleted_list, failed = self.cleaner.delete_indices_parallel(
+                [idx['name'] for idx in deletes],
+                workers=self.workers,
+                max_url_length=self.max_url_length,
+                max_retries=self.max_retries
+            )
+            deleted = set(deleted_list)
+            failed_msgs = {name: message for chunk, message in failed for name in chunk}
+
+        for idx in deletes:
+            if self.dry_run:
+                result = 'planned'
+            elif idx['name'] in deleted:
+                result = 'ok'
+                self.freed_total += idx['size_bytes']
+            else:
+                result = failed_msgs.get(idx['name'], 'unknown')
+            logger.info(f"  [delete] {idx['name']} ({idx['size']}): {result}")
+            self.write_ledger({'action': 'delete', 'index': idx['name'],
+                               'index_date': idx['date'].strftime('%Y-%m-%d'),
+                               'size_bytes': idx['size_bytes'], 'need_bytes': need,
+                               'eta_hours': eta_hours, 'result': result})
+
+    def run(self, interval=DEFAULT_INTERVAL, max_cycles=None):
+        """循环执行，直到达到max_cycles或被中断"""
+        mode = "DRY RUN" if self.dry_run else "执行"
+        logger.info(f"[守护模式] 启动 ({mode})，间隔 {interval}s，水位 {self.watermark_pct}% -> 目标 {self.target_pct}%")
+        logger.info(f"[守护模式] 台账: {self.ledger_path}")
+        while True:
+            try:
+                self.run_cycle()
+            except Exception as e:
+                logger.error(f"[守护模式] 本轮失败: {e}", exc_info=True)
+            if max_cycles and self.cycle >= max_cycles:
+                break
+            time.sleep(interval)
+
+
+def _legacy_old_index_names(all_indices, cutoff_date, patterns):
+    """原实现 (未编译正则 + strptime)，仅用于benchmark对比结果和耗时"""
+    result = []
+    for index in all_indices:
+        index_name = index.get('index', '')
+        if index_name.startswith('.'):
+            continue
+        if patterns and not any(re.match(p.replace('*', '.*'), index_name) for p in patterns):
+            continue
+        index_date = None
+        for pattern in (r'(\d{4}-\d{2}-\d{2})', r'(\d{4}\.\d{2}\.\d{2})', r'(\d{4}_\d{2}_\d{2})'):
+            match = re.search(pattern, index_name)
+            if match:
+                try:
+                    index_date = datetime.strptime(match.group(1).replace('.', '-').replace('_', '-'), '%Y-%m-%d')
+                    break
+                except ValueError:
+                    continue
+        if index_date and index_date < cutoff_date:
+            result.append(index_name)
+    return result
+
+
+def generate_synthetic_indices(count, seed=42):
+    """生成模拟的_cat/indices结果 (多种命名格式和日期分隔符)"""
+    rng = random.Random(seed)
+    prefixes = ['logstash', 'luckyur-log', 'application-logs', 'nginx-access', 'order-service', 'old-logs']
+    start = datetime.now() - timedelta(days=365)
+    indices = []
+    for i in range(count):
+        day = start + timedelta(days=rng.randrange(365))
+        fmt = rng.choice(['%Y-%m-%d', '%Y.%m.%d', '%Y_%m_%d', '%Y-%m-%d'])
+        name = f"{rng.choice(prefixes)}-{rng.randrange(200):03d}-{day.strftime(fmt)}"
+        if i % 50 == 0:
+            name = f".kibana_{i}"
+        elif i % 97 == 0:
+            name = f"{rng.choice(prefixes)}-nodate-{i}"
+        indices.append({
+            'index': name,
+            'store.size': str(rng.randrange(1, 10 ** 9)),
+            'docs.count': str(rng.randrange(10 ** 6)),
+            'docs.deleted': str(rng.randrange(10 ** 4)),
+            'status': 'open',
+        })
+    return indices
+
+
+def run_benchmark(count, days_threshold=30, patterns=None):
+    """对比原实现与预编译/缓存实现在模拟索引列表上的耗时，并校验结果一致"""
+    patterns = patterns or ['luckyur-log-*', 'logstash-*', 'application-logs-*']
+    logger.info(f"生成 {count} 个模拟索引...")
+    all_indices = generate_synthetic_indices(count)
+    cleaner = ElasticsearchCleaner('http://benchmark.invalid')
+    cutoff_date = datetime.now() - timedelta(days=days_threshold)
+
+    start = time.perf_counter()
+    legacy = _legacy_old_index_names(all_indices, cutoff_date, patterns)
+    legacy_sec = time.perf_counter() - start
+
+    parse_index_date_cached.cache_clear()
+    start = time.perf_counter()
+    cold = cleaner.find_old_indices(days_threshold, patterns, all_indices=all_indices)
+    cold_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm = cleaner.find_old_indices(days_threshold, patterns, all_indices=all_indices)
+    warm_sec = time.perf_counter() - start
+
+    new_names = sorted(idx['name'] for idx in cold)
+    if sorted(legacy) != new_names or new_names != sorted(idx['name'] for idx in warm):
+        logger.error("❌ 结果不一致: 原实现 %d 个, 新实现 %d 个", len(legacy), len(cold))
+        return False
+
+    logger.info("\n" + "=" * 60)
+    logger.info(f"Benchmark: {count} 个索引，匹配到 {len(cold)} 个旧索引 (结果一致)")
+    logger.info(f"  原实现 (未编译正则+strptime): {legacy_sec:.3f}s")
+    logger.info(f"  预编译 (缓存冷):              {cold_sec:.3f}s  ({legacy_sec / cold_sec:.1f}x)")
+    logger.info(f"  预编译 (缓存热):              {warm_sec:.3f}s  ({legacy_sec / warm_sec:.1f}x)")
+    logger.info(f"  缓存: {parse_index_date_cached.cache_info()}")
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='AWS Elasticsearch 索引清理工具',
@@ -236,12 +773,21 @@ def main():
 
   # 删除60天之前的所有索引
   python3 es_cleanup_luckycommon.py --endpoint https://search-xxx.es.amazonaws.com --days 60 --yes
+
+  # 批量并发删除 (逗号拼接索引名，按URL长度分批，429自动重试)
+  python3 es_cleanup_luckycommon.py --endpoint https://search-xxx.es.amazonaws.com --days 30 --batch --workers 8
+
+  # 日期解析/模式匹配benchmark (10万个模拟索引，无需集群)
+  python3 es_cleanup_luckycommon.py --benchmark 100000
+
+  # 水位守护模式: 预计24小时内触及85%时，删除最旧的索引(至少保留7天)直到回到75%以下
+  python3 es_cleanup_luckycommon.py --endpoint https://search-xxx.es.amazonaws.com --daemon --days 7 \\
+      --watermark-pct 85 --target-pct 75 --max-deletes-per-cycle 20 --dry-run
         """
     )
 
     parser.add_argument(
         '--endpoint',
-        required=True,
         help='ES集群endpoint URL (例: https://search-luckycommon-xxx.us-east-1.es.amazonaws.com)'
     )
     parser.add_argument(
@@ -270,6 +816,86 @@ def main():
         action='store_true',
         help='删除后对剩余索引执行force merge'
     )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='批量模式: 按URL长度将索引名逗号拼接分批删除，并发执行'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_DELETE_WORKERS,
+        help=f'批量模式并发线程数 (默认: {DEFAULT_DELETE_WORKERS})'
+    )
+    parser.add_argument(
+        '--max-url-length',
+        type=int,
+        default=DEFAULT_MAX_URL_LENGTH,
+        help=f'批量模式单个DELETE请求URL最大长度 (默认: {DEFAULT_MAX_URL_LENGTH})'
+    )
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f'批量模式遇到429限流时最大重试次数 (默认: {DEFAULT_MAX_RETRIES})'
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='守护模式: 持续轮询磁盘水位，按需清理最旧的索引 (--days作为最小保留天数)'
+    )
+    parser.add_argument(
+        '--interval',
+        type=int,
+        default=DEFAULT_INTERVAL,
+        help=f'守护模式轮询间隔秒数 (默认: {DEFAULT_INTERVAL})'
+    )
+    parser.add_argument(
+        '--watermark-pct',
+        type=float,
+        default=DEFAULT_WATERMARK_PCT,
+        help=f'守护模式触发水位%% (默认: {DEFAULT_WATERMARK_PCT})'
+    )
+    parser.add_argument(
+        '--target-pct',
+        type=float,
+        default=DEFAULT_TARGET_PCT,
+        help=f'守护模式清理后目标使用率%% (默认: {DEFAULT_TARGET_PCT})'
+    )
+    parser.add_argument(
+        '--horizon-hours',
+        type=float,
+        default=DEFAULT_HORIZON_HOURS,
+        help=f'守护模式预测窗口小时数 (默认: {DEFAULT_HORIZON_HOURS})'
+    )
+    parser.add_argument(
+        '--max-deletes-per-cycle',
+        type=int,
+        default=DEFAULT_MAX_DELETES_PER_CYCLE,
+        help=f'守护模式每轮最多删除索引数 (默认: {DEFAULT_MAX_DELETES_PER_CYCLE})'
+    )
+    parser.add_argument(
+        '--merge-deleted-ratio',
+        type=float,
+        default=DEFAULT_MERGE_DELETED_RATIO,
+        help=f'守护模式已删除文档占比超过此值时优先force merge，0为禁用 (默认: {DEFAULT_MERGE_DELETED_RATIO})'
+    )
+    parser.add_argument(
+        '--ledger',
+        default=DEFAULT_LEDGER,
+        help=f'守护模式台账文件 (JSONL，默认: {DEFAULT_LEDGER})'
+    )
+    parser.add_argument(
+        '--max-cycles',
+        type=int,
+        help='守护模式最多执行轮数 (默认: 不限)'
+    )
+    parser.add_argument(
+        '--benchmark',
+        type=int,
+        metavar='N',
+        help='对N个模拟索引运行日期解析/模式匹配benchmark (无需连接集群)'
+    )
     parser.add_argument(
         '--no-verify-ssl',
         action='store_true',
@@ -278,6 +904,13 @@ def main():
 
     args = parser.parse_args()
 
+    if args.benchmark:
+        ok = run_benchmark(args.benchmark, days_threshold=args.days, patterns=args.pattern)
+        sys.exit(0 if ok else 1)
+
+    if not args.endpoint:
+        parser.error('--endpoint 为必填参数 (--benchmark 除外)')
+
     # 创建清理器
     cleaner = ElasticsearchCleaner(
         endpoint=args.endpoint,
@@ -300,6 +933,31 @@ def main():
         logger.error("集群状态为RED，建议先解决集群问题后再清理索引")
         sys.exit(1)
 
+    if args.daemon:
+        if args.target_pct >= args.watermark_pct:
+            logger.error("--target-pct 必须小于 --watermark-pct")
+            sys.exit(1)
+        if not args.dry_run and not args.yes:
+            logger.error("守护模式无人值守运行，真实执行需要同时指定 --yes (或使用 --dry-run)")
+            sys.exit(1)
+        daemon = RetentionDaemon(
+            cleaner,
+            min_age_days=args.days,
+            patterns=args.pattern,
+            watermark_pct=args.watermark_pct,
+            target_pct=args.target_pct,
+            horizon_hours=args.horizon_hours,
+            max_deletes_per_cycle=args.max_deletes_per_cycle,
+            merge_deleted_ratio=args.merge_deleted_ratio,
+            ledger_path=args.ledger,
+            dry_run=args.dry_run,
+            workers=args.workers,
+            max_url_length=args.max_url_length,
+            max_retries=args.max_retries
+        )
+        daemon.run(interval=args.interval, max_cycles=args.max_cycles)
+        return
+
     # 获取磁盘使用情况
     logger.info("\n当前磁盘使用情况:")
     disk_usage = cleaner.get_disk_usage()
@@ -324,10 +982,13 @@ def main():
 
     # 显示找到的索引
     logger.info(f"\n找到 {len(old_indices)} 个符合条件的索引:")
-    total_size = 0
     for idx in old_indices:
         logger.info(f"  - {idx['name']:<50} | 日期: {idx['date'].strftime('%Y-%m-%d')} | 大小: {idx['size']:<10} | 文档数: {idx['docs_count']}")
 
+    # 预估释放空间 (store.size含副本)
+    total_size = cleaner.project_disk_freed(old_indices)
+    logger.info(f"\n预计释放磁盘空间: {format_bytes(total_size)} (含副本)")
+
     # 如果是dry-run模式，这里就结束
     if args.dry_run:
         logger.info("\n[DRY RUN] 模拟模式，未执行实际删除")
@@ -349,21 +1010,33 @@ def main():
     success_count = 0
     failed_count = 0
 
-    for idx in old_indices:
-        index_name = idx['name']
-        logger.info(f"\n删除索引: {index_name}")
+    if args.batch:
+        deleted, failed = cleaner.delete_indices_parallel(
+            [idx['name'] for idx in old_indices],
+            workers=args.workers,
+            max_url_length=args.max_url_length,
+            max_retries=args.max_retries
+        )
+        success_count = len(deleted)
+        failed_count = sum(len(chunk) for chunk, _ in failed)
+        deleted_set = set(deleted)
+        freed = cleaner.project_disk_freed([idx for idx in old_indices if idx['name'] in deleted_set])
+        logger.info(f"  已释放(预估): {format_bytes(freed)}")
+    else:
+        for idx in old_indices:
+            index_name = idx['name']
+            logger.info(f"\n删除索引: {index_name}")
 
-        success, message = cleaner.delete_index(index_name)
-        if success:
-            logger.info(f"  ✅ {message}")
-            success_count += 1
-        else:
-            logger.error(f"  ❌ {message}")
-            failed_count += 1
+            success, message = cleaner.delete_index(index_name)
+            if success:
+                logger.info(f"  ✅ {message}")
+                success_count += 1
+            else:
+                logger.error(f"  ❌ {message}")
+                failed_count += 1
 
-        # 避免请求过快
-        import time
-        time.sleep(1)
+            # 避免请求过快
+            time.sleep(1)
 
     # 删除完成后的统计
     logger.info("\n" + "=" * 60)
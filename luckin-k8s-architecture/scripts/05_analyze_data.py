@@ -2,15 +2,35 @@
 """
 Luckin Coffee K8s Data Analysis Script
 Parses all collected data and generates structured architecture summary
+
+Large raw dumps (nodes.json, per-namespace pods/deployments) are streamed
+item by item instead of loaded whole, and namespaces are parsed in a
+process pool:
+
+    ./05_analyze_data.py               # one worker per CPU
+    ./05_analyze_data.py --workers 1   # serial, no process pool
+
+Streaming uses ijson when installed (pip install ijson), otherwise a
+built-in incremental decoder.
 """
 
+import argparse
 import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List, Any, Set
+from typing import Dict, List, Any, Set, Iterator
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Read size for the built-in streaming decoder
+STREAM_CHUNK_SIZE = 1 << 20
 
 # ANSI color codes
 class Colors:
@@ -33,11 +53,113 @@ def log_detail(msg: str):
     print(f"{Colors.BLUE}[DETAIL]{Colors.NC} {msg}")
 
 
+def _find_items_array(f, chunk_size: int):
+    """Advance through a kubectl List document until the top-level "items" array opens.
+
+    Returns the unread remainder of the current chunk (just after '['), or None
+    if the document has no top-level items array.
+    """
+    depth = 0
+    in_str = False
+    escaped = False
+    chars: List[str] = []
+    last_string = None
+    current_key = None
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return None
+        for i, ch in enumerate(chunk):
+            if in_str:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_str = False
+                    if depth == 1:
+                        last_string = "".join(chars)
+                    continue
+                if depth == 1:
+                    chars.append(ch)
+            elif ch == '"':
+                in_str = True
+                chars = []
+            elif ch == ":" and depth == 1:
+                current_key = last_string
+            elif ch in "{[":
+                if ch == "[" and depth == 1 and current_key == "items":
+                    return chunk[i + 1:]
+                depth += 1
+            elif ch in "}]":
+                depth -= 1
+            elif ch == ",":
+                current_key = None
+
+
+def _iter_items_builtin(path: Path, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield elements of the top-level "items" array using json.JSONDecoder.raw_decode.
+
+    Only the current element (plus at most one read chunk) is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = _find_items_array(f, chunk_size)
+        if buf is None:
+            return
+        pos = 0
+        eof = False
+        while True:
+            # Skip separators between elements
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            if pos < len(buf):
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                    # A number/literal may be cut off at the chunk boundary
+                    # ("123|45", "2.|5"); only accept it once a delimiter follows
+                    if buf[pos] in '{["' or eof or (end < len(buf) and buf[end] in " \t\r\n,]"):
+                        yield item
+                        pos = end
+                        continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                raise ValueError(f"Unterminated items array in {path}")
+            # Element spans the chunk boundary: drop consumed text and read more
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def iter_items(path: Path) -> Iterator[Any]:
+    """Stream the "items" array of a kubectl JSON List without loading the whole file"""
+    if ijson is not None:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, "items.item", use_float=True)
+    else:
+        yield from _iter_items_builtin(path)
+
+
+def _parse_namespace_worker(task):
+    """Process-pool entry point: parse one namespace directory"""
+    data_dir, ns_name, ns_dir = task
+    analyzer = KubernetesArchitectureAnalyzer(data_dir)
+    return ns_name, analyzer.parse_namespace(ns_name, Path(ns_dir))
+
+
 class KubernetesArchitectureAnalyzer:
     """Analyzes collected Kubernetes and AWS data to generate architecture summary"""
 
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, workers: int = None):
         self.data_dir = Path(data_dir)
+        self.workers = workers or os.cpu_count() or 1
         self.summary = {
             "metadata": {
                 "generated_at": datetime.now().isoformat(),
@@ -101,19 +223,19 @@ class KubernetesArchitectureAnalyzer:
 
                 nodes_file = cluster_dir / "nodes.json"
                 if nodes_file.exists():
-                    with open(nodes_file) as f:
-                        nodes_data = json.load(f)
-                        cluster_info = self.parse_cluster_nodes(cluster_name, nodes_data)
-                        self.summary["clusters"][cluster_name] = cluster_info
-                        self.summary["metadata"]["clusters"].append(cluster_name)
+                    cluster_info = self.parse_cluster_nodes(cluster_name, iter_items(nodes_file))
+                    self.summary["clusters"][cluster_name] = cluster_info
+                    self.summary["metadata"]["clusters"].append(cluster_name)
 
-    def parse_cluster_nodes(self, cluster_name: str, nodes_data: Dict) -> Dict:
-        """Parse node information for a cluster"""
-        nodes = nodes_data.get("items", [])
+    def parse_cluster_nodes(self, cluster_name: str, nodes) -> Dict:
+        """Parse node information for a cluster
 
+        Args:
+            nodes: iterable of node objects (streamed "items" of nodes.json)
+        """
         cluster_info = {
             "name": cluster_name,
-            "node_count": len(nodes),
+            "node_count": 0,
             "nodes": [],
             "total_cpu": 0,
             "total_memory_gb": 0,
@@ -156,6 +278,7 @@ class KubernetesArchitectureAnalyzer:
             }
 
             cluster_info["nodes"].append(node_info)
+            cluster_info["node_count"] += 1
 
             # Group nodes by instance type
             if instance_type not in cluster_info["node_groups"]:
@@ -174,13 +297,29 @@ class KubernetesArchitectureAnalyzer:
             log_warn(f"Namespaces directory not found: {namespaces_dir}")
             return
 
-        for ns_dir in namespaces_dir.iterdir():
-            if ns_dir.is_dir():
-                ns_name = ns_dir.name
-                log_detail(f"  Processing namespace: {ns_name}")
+        tasks = [
+            (str(self.data_dir), ns_dir.name, str(ns_dir))
+            for ns_dir in sorted(namespaces_dir.iterdir())
+            if ns_dir.is_dir()
+        ]
 
-                ns_info = self.parse_namespace(ns_name, ns_dir)
-                self.summary["namespaces"][ns_name] = ns_info
+        if self.workers > 1 and len(tasks) > 1:
+            log_detail(f"  Parsing {len(tasks)} namespaces with {self.workers} worker processes")
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = pool.map(_parse_namespace_worker, tasks)
+                for ns_name, ns_info in results:
+                    self.merge_namespace(ns_name, ns_info)
+        else:
+            for task in tasks:
+                ns_name, ns_info = _parse_namespace_worker(task)
+                self.merge_namespace(ns_name, ns_info)
+
+    def merge_namespace(self, ns_name: str, ns_info: Dict):
+        """Merge one parsed namespace into the summary, including the global services map"""
+        log_detail(f"  Processed namespace: {ns_name}")
+        self.summary["namespaces"][ns_name] = ns_info
+        for svc_info in ns_info["services"]:
+            self.summary["services"][svc_info["dns_name"]] = svc_info
 
     def parse_namespace(self, ns_name: str, ns_dir: Path) -> Dict:
         """Parse all resources in a namespace"""
@@ -202,48 +341,36 @@ class KubernetesArchitectureAnalyzer:
         # Parse deployments
         deployments_file = ns_dir / "deployments.json"
         if deployments_file.exists():
-            with open(deployments_file) as f:
-                deployments_data = json.load(f)
-                for deploy in deployments_data.get("items", []):
-                    deploy_info = self.parse_deployment(deploy)
-                    ns_info["deployments"].append(deploy_info)
+            for deploy in iter_items(deployments_file):
+                deploy_info = self.parse_deployment(deploy)
+                ns_info["deployments"].append(deploy_info)
 
         # Parse statefulsets
         statefulsets_file = ns_dir / "statefulsets.json"
         if statefulsets_file.exists():
-            with open(statefulsets_file) as f:
-                sts_data = json.load(f)
-                for sts in sts_data.get("items", []):
-                    sts_info = self.parse_statefulset(sts)
-                    ns_info["statefulsets"].append(sts_info)
+            for sts in iter_items(statefulsets_file):
+                sts_info = self.parse_statefulset(sts)
+                ns_info["statefulsets"].append(sts_info)
 
         # Parse services
         services_file = ns_dir / "services.json"
+        # (merged into the global services map by merge_namespace)
         if services_file.exists():
-            with open(services_file) as f:
-                services_data = json.load(f)
-                for svc in services_data.get("items", []):
-                    svc_info = self.parse_service(svc, ns_name)
-                    ns_info["services"].append(svc_info)
-                    # Also add to global services map
-                    dns_name = f"{svc_info['name']}.{ns_name}.svc.cluster.local"
-                    self.summary["services"][dns_name] = svc_info
+            for svc in iter_items(services_file):
+                svc_info = self.parse_service(svc, ns_name)
+                ns_info["services"].append(svc_info)
 
         # Parse ingresses
         ingresses_file = ns_dir / "ingresses.json"
         if ingresses_file.exists():
-            with open(ingresses_file) as f:
-                ingresses_data = json.load(f)
-                for ing in ingresses_data.get("items", []):
-                    ing_info = self.parse_ingress(ing, ns_name)
-                    ns_info["ingresses"].append(ing_info)
+            for ing in iter_items(ingresses_file):
+                ing_info = self.parse_ingress(ing, ns_name)
+                ns_info["ingresses"].append(ing_info)
 
         # Parse pods
         pods_file = ns_dir / "pods.json"
         if pods_file.exists():
-            with open(pods_file) as f:
-                pods_data = json.load(f)
-                ns_info["pods_count"] = len(pods_data.get("items", []))
+            ns_info["pods_count"] = sum(1 for _ in iter_items(pods_file))
 
         return ns_info
 
@@ -556,6 +683,11 @@ class KubernetesArchitectureAnalyzer:
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Analyze collected K8s/AWS data")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes for per-namespace parsing (1 = serial)")
+    args = parser.parse_args()
+
     log_info("Luckin Coffee K8s Architecture Data Analysis")
     log_info("=" * 50)
     print("")
@@ -573,7 +705,8 @@ def main():
         return 1
 
     # Run analysis
-    analyzer = KubernetesArchitectureAnalyzer(str(data_dir))
+    log_info(f"JSON streaming: {'ijson' if ijson is not None else 'built-in decoder'}")
+    analyzer = KubernetesArchitectureAnalyzer(str(data_dir), workers=args.workers)
     summary = analyzer.analyze()
 
     # Save summary
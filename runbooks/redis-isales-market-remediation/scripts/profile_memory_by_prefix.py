@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Memory Profiler: estimated bytes / key count / no-TTL share per key prefix
+Cluster: luckyus-isales-market (AWS ElastiCache)
+Purpose: Tell us which key prefix to remediate next without a full MEMORY USAGE
+         walk of the keyspace.
+
+How it works:
+  1. SCAN the keyspace (keys only, cheap) with a configurable COUNT.
+  2. Select each scanned key with probability --sample-rate (Bernoulli sample).
+  3. For the sampled keys, pipeline MEMORY USAGE, TYPE and TTL in one round trip
+     per batch.
+  4. Group keys by prefix (first --depth ':'-separated segments, with ID-like
+     segments collapsed to '*') and scale the sample up to DBSIZE.
+
+Every estimate is reported with a normal-approximation confidence interval
+(finite-population corrected), so a 1% sample is enough to rank prefixes.
+Use --max-scan to stop the SCAN early; SCAN visits hash-table buckets in an
+order unrelated to key names, so a partial walk is still a usable sample.
+
+This script is READ-ONLY. It never modifies keys.
+
+Usage:
+    python profile_memory_by_prefix.py                          # 1% sample, depth 3
+    python profile_memory_by_prefix.py --sample-rate 0.05 --depth 2
+    python profile_memory_by_prefix.py --max-scan 500000 --csv prefixes.csv
+"""
+
+import argparse
+import csv
+import logging
+import math
+import random
+import re
+import time
+from collections import defaultdict
+
+import redis
+
+# ─── Configuration ───────────────────────────────────────────────────────────
+
+REDIS_HOST = "master.luckyus-isales-market.vyllrs.use1.cache.amazonaws.com"
+REDIS_PORT = 6379
+REDIS_DB = 0
+
+DEFAULT_SAMPLE_RATE = 0.01    # measure 1% of scanned keys
+DEFAULT_PREFIX_DEPTH = 3      # MARKETING:COUPON:UNREAD:* -> 3 segments
+SCAN_COUNT = 1000
+PIPELINE_SIZE = 200           # sampled keys per MEMORY USAGE/TYPE/TTL round trip
+MEMORY_USAGE_SAMPLES = 5      # nested-element samples for MEMORY USAGE (Redis default)
+SLEEP_BETWEEN_BATCHES_MS = 20
+LOG_EVERY_N_KEYS = 100000
+Z_95 = 1.96                   # two-sided 95% confidence
+
+# Key segments that are identifiers rather than part of the prefix
+_ID_SEGMENT = re.compile(
+    r"^(?:\d+|[0-9a-fA-F]{8,}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$"
+)
+
+# ─── Setup ───────────────────────────────────────────────────────────────────
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+
+def get_redis_client() -> redis.Redis:
+    """Create a TLS-enabled Redis client for ElastiCache."""
+    return redis.Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        ssl=True,
+        ssl_cert_reqs="required",
+        ssl_ca_certs="/etc/ssl/certs/ca-certificates.crt",  # adjust for your OS
+        decode_responses=True,
+        socket_connect_timeout=10,
+        socket_timeout=10,
+    )
+
+
+def key_prefix(key: str, depth: int) -> str:
+    """Collapse a key to its prefix, e.g. MARKETING:COUPON:UNREAD:123 -> MARKETING:COUPON:UNREAD:*"""
+    parts = key.split(":")
+    head = []
+    for part in parts[:depth]:
+        if _ID_SEGMENT.match(part):
+            head.append("*")
+            break
+        head.append(part)
+    if len(head) < len(parts):
+        if head[-1] != "*":
+            head.append("*")
+    return ":".join(head)
+
+
+class PrefixStats:
+    """Running sums for one prefix; estimates are derived in estimate()."""
+
+    __slots__ = ("sampled", "no_ttl", "bytes_sum", "bytes_sq_sum", "types")
+
+    def __init__(self):
+        self.sampled = 0
+        self.no_ttl = 0
+        self.bytes_sum = 0
+        self.bytes_sq_sum = 0
+        self.types = defaultdict(int)
+
+    def add(self, nbytes: int, key_type: str, ttl: int):
+        self.sampled += 1
+        self.bytes_sum += nbytes
+        self.bytes_sq_sum += nbytes * nbytes
+        self.types[key_type] += 1
+        if ttl == -1:
+            self.no_ttl += 1
+
+
+def _wilson_interval(successes: int, n: int, z: float = Z_95):
+    """Wilson score interval for a proportion (well-behaved for small n)."""
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return p, max(0.0, centre - half), min(1.0, centre + half)
+
+
+def estimate(stats: PrefixStats, n_sampled: int, population: int, z: float = Z_95) -> dict:
+    """Scale one prefix's sample up to the whole keyspace.
+
+    Each sampled key contributes x_i = bytes if it belongs to the prefix else 0,
+    so the prefix total is population * mean(x) with standard error
+    population * sd(x) / sqrt(n) * FPC. Key counts use the same estimator
+    on the 0/1 membership indicator.
+    """
+    n = n_sampled
+    fpc = math.sqrt((population - n) / (population - 1)) if population > n > 0 else 0.0
+
+    share = stats.sampled / n if n else 0.0
+    keys_se = population * math.sqrt(share * (1 - share) / n) * fpc if n else 0.0
+    est_keys = population * share
+
+    mean_x = stats.bytes_sum / n if n else 0.0
+    if n > 1:
+        var_x = max(0.0, (stats.bytes_sq_sum - n * mean_x * mean_x) / (n - 1))
+    else:
+        var_x = 0.0
+    bytes_se = population * math.sqrt(var_x / n) * fpc if n else 0.0
+    est_bytes = population * mean_x
+
+    no_ttl_share, no_ttl_lo, no_ttl_hi = _wilson_interval(stats.no_ttl, stats.sampled, z)
+    dominant_type = max(stats.types.items(), key=lambda kv: kv[1])[0] if stats.types else "-"
+
+    return {
+        "sampled_keys": stats.sampled,
+        "est_keys": est_keys,
+        "est_keys_lo": max(0.0, est_keys - z * keys_se),
+        "est_keys_hi": est_keys + z * keys_se,
+        "est_bytes": est_bytes,
+        "est_bytes_lo": max(0.0, est_bytes - z * bytes_se),
+        "est_bytes_hi": est_bytes + z * bytes_se,
+        "avg_key_bytes": stats.bytes_sum / stats.sampled if stats.sampled else 0.0,
+        "no_ttl_share": no_ttl_share,
+        "no_ttl_lo": no_ttl_lo,
+        "no_ttl_hi": no_ttl_hi,
+        "dominant_type": dominant_type,
+    }
+
+
+def _human_bytes(n: float) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024:
+            return f"{n:.1f}{unit}"
+        n /= 1024.0
+    return f"{n:.1f}T"
+
+
+def _measure(client: redis.Redis, keys: list, depth: int, stats: dict) -> int:
+    """Pipeline MEMORY USAGE + TYPE + TTL for a batch of sampled keys."""
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key, samples=MEMORY_USAGE_SAMPLES)
+        pipe.type(key)
+        pipe.ttl(key)
+    results = pipe.execute(raise_on_error=False)
+
+    measured = 0
+    for i, key in enumerate(keys):
+        nbytes, key_type, ttl = results[3 * i: 3 * i + 3]
+        if isinstance(nbytes, Exception) or isinstance(ttl, Exception):
+            continue
+        if nbytes is None or ttl == -2:
+            # Key expired between SCAN and measurement
+            continue
+        stats[key_prefix(key, depth)].add(int(nbytes), key_type, int(ttl))
+        measured += 1
+    return measured
+
+
+def run(sample_rate: float = DEFAULT_SAMPLE_RATE, depth: int = DEFAULT_PREFIX_DEPTH,
+        max_scan: int = 0, match: str = None, top: int = 30,
+        csv_path: str = None, seed: int = None):
+    """Sample the keyspace and report estimated memory per prefix."""
+    client = get_redis_client()
+
+    try:
+        info = client.info("memory")
+        population = client.dbsize()
+        logger.info(
+            "Connected to Redis. Memory: %s / %s | DBSIZE: %d",
+            info["used_memory_human"], info["maxmemory_human"], population,
+        )
+    except Exception as e:
+        logger.error("Failed to connect to Redis: %s", e)
+        return
+
+    if population == 0:
+        logger.info("Keyspace is empty, nothing to profile")
+        return
+
+    logger.info("Sample rate: %.4f | Prefix depth: %d | Max scan: %s | Match: %s",
+                sample_rate, depth, max_scan or "full", match or "*")
+
+    rng = random.Random(seed)
+    stats = defaultdict(PrefixStats)
+    total_scanned = 0
+    total_measured = 0
+    pending = []
+    cursor = 0
+    next_log = LOG_EVERY_N_KEYS
+    started = time.time()
+
+    while True:
+        cursor, keys = client.scan(cursor=cursor, match=match, count=SCAN_COUNT)
+        total_scanned += len(keys)
+
+        for key in keys:
+            if rng.random() < sample_rate:
+                pending.append(key)
+            if len(pending) >= PIPELINE_SIZE:
+                total_measured += _measure(client, pending, depth, stats)
+                pending = []
+
+        if total_scanned >= next_log:
+            logger.info("Progress: scanned=%d, measured=%d, prefixes=%d",
+                        total_scanned, total_measured, len(stats))
+            next_log += LOG_EVERY_N_KEYS
+
+        if keys:
+            time.sleep(SLEEP_BETWEEN_BATCHES_MS / 1000.0)
+
+        if cursor == 0 or (max_scan and total_scanned >= max_scan):
+            break
+
+    if pending:
+        total_measured += _measure(client, pending, depth, stats)
+
+    if total_measured == 0:
+        logger.warning("No keys were sampled; increase --sample-rate or --max-scan")
+        return
+
+    # With --match, DBSIZE is not the population: scale to the matching keys seen by SCAN
+    # (exact after a full walk, only the scanned subset when --max-scan stopped early)
+    if match:
+        if cursor != 0:
+            logger.warning("--match with --max-scan: estimates cover the scanned keys only")
+        population = total_scanned
+
+    rows = []
+    for prefix, st in stats.items():
+        est = estimate(st, total_measured, population)
+        est["prefix"] = prefix
+        rows.append(est)
+    rows.sort(key=lambda r: r["est_bytes"], reverse=True)
+
+    total_est_bytes = sum(r["est_bytes"] for r in rows)
+    logger.info("=" * 110)
+    logger.info("MEMORY BY PREFIX (estimated, 95%% CI) — %d keys measured of %d scanned, population %d, %.1fs",
+                total_measured, total_scanned, population, time.time() - started)
+    logger.info("%-45s %22s %24s %8s %16s %7s",
+                "PREFIX", "EST KEYS", "EST BYTES", "SHARE", "NO-TTL", "TYPE")
+    for r in rows[:top]:
+        logger.info(
+            "%-45s %10.0f ±%-10.0f %10s (%s-%s) %7.1f%% %5.1f%% (%2.0f-%3.0f) %7s",
+            r["prefix"][:45],
+            r["est_keys"], r["est_keys_hi"] - r["est_keys"],
+            _human_bytes(r["est_bytes"]), _human_bytes(r["est_bytes_lo"]), _human_bytes(r["est_bytes_hi"]),
+            100.0 * r["est_bytes"] / total_est_bytes if total_est_bytes else 0.0,
+            100.0 * r["no_ttl_share"], 100.0 * r["no_ttl_lo"], 100.0 * r["no_ttl_hi"],
+            r["dominant_type"],
+        )
+    if len(rows) > top:
+        logger.info("... %d more prefixes (use --top or --csv)", len(rows) - top)
+    logger.info("-" * 110)
+    logger.info("  Estimated key bytes:  %s (used_memory: %s)",
+                _human_bytes(total_est_bytes), info["used_memory_human"])
+    no_ttl_bytes = sum(r["est_bytes"] * r["no_ttl_share"] for r in rows)
+    logger.info("  Estimated no-TTL bytes: %s (%.1f%%)", _human_bytes(no_ttl_bytes),
+                100.0 * no_ttl_bytes / total_est_bytes if total_est_bytes else 0.0)
+    logger.info("=" * 110)
+
+    if csv_path:
+        fields = ["prefix", "sampled_keys", "est_keys", "est_keys_lo", "est_keys_hi",
+                  "est_bytes", "est_bytes_lo", "est_bytes_hi", "avg_key_bytes",
+                  "no_ttl_share", "no_ttl_lo", "no_ttl_hi", "dominant_type"]
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for r in rows:
+                writer.writerow({k: (round(v, 4) if isinstance(v, float) else v)
+                                 for k, v in r.items() if k in fields})
+        logger.info("Wrote %d prefixes to %s", len(rows), csv_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate Redis memory usage per key prefix (read-only)")
+    parser.add_argument("--sample-rate", type=float, default=DEFAULT_SAMPLE_RATE,
+                        help=f"Fraction of scanned keys to measure (default {DEFAULT_SAMPLE_RATE})")
+    parser.add_argument("--depth", type=int, default=DEFAULT_PREFIX_DEPTH,
+                        help=f"Prefix depth in ':' segments (default {DEFAULT_PREFIX_DEPTH})")
+    parser.add_argument("--max-scan", type=int, default=0,
+                        help="Stop after scanning this many keys (default: full SCAN)")
+    parser.add_argument("--match", type=str, default=None,
+                        help="Only profile keys matching this SCAN pattern")
+    parser.add_argument("--top", type=int, default=30, help="Prefixes to print (default 30)")
+    parser.add_argument("--csv", type=str, default=None, help="Write all prefixes to this CSV file")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible sample")
+    args = parser.parse_args()
+    if not 0 < args.sample_rate <= 1:
+        parser.error("--sample-rate must be in (0, 1]")
+    run(sample_rate=args.sample_rate, depth=args.depth, max_scan=args.max_scan,
+        match=args.match, top=args.top, csv_path=args.csv, seed=args.seed)